@@ -0,0 +1,491 @@
+"""HTTP/JSON API over the appointment store, for tablets and other shop devices.
+
+    python taskmanager.py --serve [--host 0.0.0.0] [--port 8080]
+
+By default the server only listens on this machine; --host 0.0.0.0 opens
+it to the shop network. There is no authentication, so only do that on a
+network the shop controls.
+
+    GET    /weeks/<date>       appointments in the week containing date
+    GET    /search?q=<text>    best matches in name, phone or reason (&limit=n)
+    GET    /availability       next free start times (&from=date &count=n
+                               &duration=minutes &earliest=minute); from
+                               defaults to today, and earliest to now when
+                               from is today
+    GET    /resources          bays and technicians
+    GET    /appointments/<id>
+    POST   /appointments       book; answers 201, or 409 if the time is taken
+    PUT    /appointments/<id>  change the fields given, keeping the rest
+    DELETE /appointments/<id>
+
+Appointments are JSON objects with the Appointment fields plus start_time
+and end_time as text. Requests may give times as start_minute/end_minute
+or as start_time/end_time text such as "9:30 AM" or "14:00".
+
+Reads run on a ReaderPool and writes on a DBExecutor, the same single
+writer thread the window uses, so bookings from the tablets are batched
+and checked for clashes like any other. Week responses carry an ETag and
+stay in memory until a write through the server touches the week or
+another workstation writes to the database, so a tablet polling with
+If-None-Match gets 304 Not Modified without a query.
+"""
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import date as Date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from appointment_store import (BUSINESS_HOURS, CLOSING_MINUTE, DEFAULT_DURATION, SEARCH_LIMIT, SHOP_TIMEZONE,
+                               AppointmentStore, SlotConflictError, appointment_end, format_time, parse_time)
+from db_executor import DBExecutor, ReaderPool
+from instrumentation import timed
+from week_cache import week_start_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+
+# Connections in the read pool
+READERS = 4
+
+# Weeks whose encoded responses are kept for If-None-Match polling
+WEEK_CACHE_SIZE = 64
+
+# Weeks whose last write is remembered for their ETags; older ones share
+# one version, which can only cost a client an unneeded full response
+WEEK_VERSIONS_SIZE = 4096
+
+# How often the database is checked for writes by other workstations
+EXTERNAL_CHANGE_POLL_MS = 2000
+
+# Largest request head and body accepted
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+# Free start times /availability returns at most
+MAX_AVAILABILITY = 100
+
+REASONS = {200: 'OK', 201: 'Created', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required', 413: 'Payload Too Large',
+           431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+TEXT_FIELDS = ('customer_name', 'phone_number', 'reason')
+
+
+class HTTPError(Exception):
+    """Answer the request with status and {"error": message}"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def appointment_json(appt):
+    data = appt._asdict()
+    data['start_time'] = format_time(appt.start_minute)
+    data['end_time'] = format_time(appointment_end(appt))
+    return data
+
+
+def _int_param(query, name, default, low, high):
+    text = query.get(name, [None])[0]
+    if text is None:
+        return default
+    try:
+        value = int(text)
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a whole number") from None
+    if not low <= value <= high:
+        raise HTTPError(400, f"{name} must be between {low} and {high}")
+    return value
+
+
+def _time_field(body, name):
+    """Minutes since midnight from body's <name>_minute or <name>_time, or None if neither is given"""
+    minute = body.get(f'{name}_minute')
+    if minute is not None:
+        if not isinstance(minute, int) or isinstance(minute, bool):
+            raise HTTPError(400, f"{name}_minute must be a whole number")
+        return minute
+    text = body.get(f'{name}_time')
+    if text is None:
+        return None
+    minute = parse_time(str(text))
+    if minute is None:
+        raise HTTPError(400, f"unreadable {name}_time {text!r}")
+    return minute
+
+
+def booking_fields(body):
+    """Appointment fields given in a request body, checked for type but not yet against each other"""
+    if not isinstance(body, dict):
+        raise HTTPError(400, "expected a JSON object")
+    fields = {}
+    for name in TEXT_FIELDS + ('appointment_date',):
+        if name in body:
+            if not isinstance(body[name], str) or not body[name].strip():
+                raise HTTPError(400, f"{name} must be non-empty text")
+            fields[name] = body[name].strip()
+    for name in ('bay_id', 'technician_id'):
+        if name in body:
+            if body[name] is not None and (not isinstance(body[name], int) or isinstance(body[name], bool)):
+                raise HTTPError(400, f"{name} must be a whole number or null")
+            fields[name] = body[name]
+    for name in ('start', 'end'):
+        minute = _time_field(body, name)
+        if minute is not None:
+            fields[f'{name}_minute'] = minute
+    return fields
+
+
+def check_booking(date, start, end):
+    """Raise HTTPError 400 unless the booking form would accept date from start to end"""
+    try:
+        day = Date.fromisoformat(date)
+    except ValueError:
+        raise HTTPError(400, f"unreadable date {date!r}; use YYYY-MM-DD") from None
+    if day.weekday() == 6:
+        raise HTTPError(400, "shop is closed on Sundays")
+    if end <= start:
+        raise HTTPError(400, "an appointment must end after it starts")
+    if start < BUSINESS_HOURS[0] or end > CLOSING_MINUTE:
+        raise HTTPError(400, f"{format_time(start)} to {format_time(end)} is outside opening hours")
+
+
+def add_appointment(store, fields):
+    """Book fields (as from booking_fields) and return the saved Appointment"""
+    missing = [name for name in TEXT_FIELDS + ('appointment_date', 'start_minute') if name not in fields]
+    if missing:
+        raise HTTPError(400, f"missing {', '.join(missing)}")
+    start = fields['start_minute']
+    end = fields.get('end_minute', start + DEFAULT_DURATION)
+    check_booking(fields['appointment_date'], start, end)
+    appointment_id = store.add_appointment(fields['customer_name'], fields['phone_number'], fields['reason'],
+                                           fields['appointment_date'], start, fields.get('bay_id'),
+                                           fields.get('technician_id'), end)
+    return store.get_appointment(appointment_id)
+
+
+def update_appointment(store, appointment_id, fields):
+    """(old, new) Appointment after applying fields, or (None, None) if there is no such appointment
+
+    A new start time without an end keeps the appointment's length, and
+    with no bay_id it stays in its bay if that is free at the new time.
+    """
+    old = store.get_appointment(appointment_id)
+    if old is None:
+        return None, None
+    values = old._asdict()
+    if 'start_minute' in fields and 'end_minute' not in fields:
+        values['end_minute'] = fields['start_minute'] + (appointment_end(old) - old.start_minute)
+    values.update(fields)
+    check_booking(values['appointment_date'], values['start_minute'], values['end_minute'])
+    new = store.update_appointment(appointment_id, values['customer_name'], values['phone_number'],
+                                   values['reason'], values['appointment_date'], values['start_minute'],
+                                   fields.get('bay_id'), values['technician_id'], values['end_minute'])
+    return old, new
+
+
+def resources(store):
+    return {'bays': [bay._asdict() for bay in store.bays],
+            'technicians': [technician._asdict() for technician in store.technicians]}
+
+
+ROUTES = [
+    (re.compile(r'/weeks/([^/]+)'), {'GET': 'get_week'}),
+    (re.compile(r'/search'), {'GET': 'search'}),
+    (re.compile(r'/availability'), {'GET': 'availability'}),
+    (re.compile(r'/resources'), {'GET': 'list_resources'}),
+    (re.compile(r'/appointments'), {'POST': 'create'}),
+    (re.compile(r'/appointments/(\d+)'), {'GET': 'show', 'PUT': 'update', 'DELETE': 'delete'}),
+]
+
+
+class AppointmentServer:
+    """asyncio HTTP server answering ROUTES from one database
+
+    Everything but the database jobs runs on the event loop's thread, so
+    the week cache needs no lock.
+    """
+
+    def __init__(self, db_path, wal=False, readers=READERS):
+        self.db = DBExecutor(lambda: AppointmentStore(db_path, wal=wal))
+        self.readers = ReaderPool(lambda: AppointmentStore(db_path, wal=wal), readers)
+        # Part of every ETag so tags from before a restart never match
+        self.instance = f'{time.time_ns():x}'
+        self.epoch = 0  # bumped when another workstation writes
+        self.writes = 0  # writes through this server, numbering week versions
+        self.week_versions = OrderedDict()  # week start -> number of the last write touching it
+        self.forgotten_version = 0  # newest version dropped from week_versions, for weeks not in it
+        self.weeks = OrderedDict()  # week start -> (version, ETag, encoded body)
+        self.data_version = None
+        self.server = None
+        self.watcher = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        self.watcher = asyncio.create_task(self.watch_for_external_changes())
+        return self.server
+
+    async def close(self):
+        if self.watcher is not None:
+            self.watcher.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.readers.shutdown()
+        self.db.shutdown()
+
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def read(self, fn, *args):
+        return await asyncio.wrap_future(self.readers.submit(fn, *args))
+
+    async def write(self, fn, *args):
+        return await asyncio.wrap_future(self.db.submit(fn, *args, write=True))
+
+    async def watch_for_external_changes(self):
+        """Drop every cached week when another workstation writes
+
+        data_version is read on the writer's connection, whose own writes
+        do not change it.
+        """
+        while True:
+            try:
+                version = await asyncio.wrap_future(self.db.submit(AppointmentStore.data_version))
+                if self.data_version is not None and version != self.data_version:
+                    # The writer's SlotIndex may be missing the other bookings
+                    self.db.submit(AppointmentStore.reload_resources)
+                    self.epoch += 1
+                    self.weeks.clear()
+                    # Every old tag has the previous epoch, so the versions can start over
+                    self.week_versions.clear()
+                    self.forgotten_version = 0
+                self.data_version = version
+            except Exception as e:
+                logger.error("Error checking for database changes: %s", e)
+            await asyncio.sleep(EXTERNAL_CHANGE_POLL_MS / 1000)
+
+    def touched(self, *appointments):
+        """Invalidate the cached weeks of appointments written through the server"""
+        for appt in appointments:
+            if appt is None:
+                continue
+            try:
+                week_start = week_start_for(appt.appointment_date)
+            except ValueError:
+                continue
+            self.writes += 1
+            self.week_versions[week_start] = self.writes
+            self.week_versions.move_to_end(week_start)
+            if len(self.week_versions) > WEEK_VERSIONS_SIZE:
+                # The oldest entry has the lowest version, so every week it covered
+                # gets a version above the tags clients may still hold for it
+                _, self.forgotten_version = self.week_versions.popitem(last=False)
+            self.weeks.pop(week_start, None)
+
+    def week_version(self, week_start):
+        """(epoch, version) that changes whenever the week's appointments may have"""
+        return self.epoch, self.week_versions.get(week_start, self.forgotten_version)
+
+    async def handle_connection(self, reader, writer):
+        """Answer requests on one connection until the client closes it or asks to"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.LimitOverrunError:
+                    writer.write(self.response(431, {'error': "request head too large"}, keep_alive=False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    writer.write(self.response(400, {'error': "malformed request line"}, keep_alive=False))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+                if 'transfer-encoding' in headers:
+                    writer.write(self.response(411, {'error': "send a Content-Length"}, keep_alive=False))
+                    break
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    writer.write(self.response(413, {'error': "bad or too large Content-Length"}, keep_alive=False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, extra, payload = await self.dispatch(method, target, headers, body)
+                writer.write(self.response(status, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def response(status, payload=None, extra=None, keep_alive=True):
+        """Encoded HTTP/1.1 response; payload is encoded bytes or an object to encode as JSON"""
+        body = b'' if status == 304 else payload if isinstance(payload, bytes) else encode(payload)
+        head = [f'HTTP/1.1 {status} {REASONS[status]}']
+        if body or status != 304:
+            head += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        head += [f'{name}: {value}' for name, value in (extra or {}).items()]
+        if not keep_alive:
+            head.append('Connection: close')
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+    async def dispatch(self, method, target, headers, body):
+        """(status, extra headers, payload) for one request"""
+        url = urlsplit(target)
+        for pattern, handlers in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            handler = handlers.get(method)
+            if handler is None:
+                return 405, {'Allow': ', '.join(handlers)}, {'error': f"{method} not allowed here"}
+            try:
+                with timed(f'http.{handler}'):
+                    return await getattr(self, handler)(*match.groups(), query=parse_qs(url.query),
+                                                        headers=headers, body=body)
+            except HTTPError as e:
+                return e.status, None, {'error': str(e)}
+            except SlotConflictError as e:
+                return 409, None, {'error': str(e)}
+            except sqlite3.IntegrityError as e:
+                # e.g. a bay_id or technician_id that does not exist
+                return 400, None, {'error': str(e)}
+            except Exception:
+                logger.exception("Error answering %s %s", method, target)
+                return 500, None, {'error': "internal error"}
+        return 404, None, {'error': f"no such resource {url.path}"}
+
+    @staticmethod
+    def json_body(body):
+        try:
+            return json.loads(body or b'null')
+        except ValueError as e:
+            raise HTTPError(400, f"body is not JSON: {e}") from None
+
+    async def get_week(self, date, query, headers, body):
+        try:
+            week_start = week_start_for(date)
+        except ValueError:
+            raise HTTPError(400, f"unreadable date {date!r}; use YYYY-MM-DD") from None
+        version = self.week_version(week_start)
+        cached = self.weeks.get(week_start)
+        if cached is None or cached[0] != version:
+            week_end = (Date.fromisoformat(week_start) + timedelta(days=6)).isoformat()
+            appointments = await self.read(AppointmentStore.appointments_between, week_start, week_end)
+            cached = (version, f'"{self.instance}-{version[0]}-{version[1]}"',
+                      encode({'week_start': week_start, 'appointments': [appointment_json(a) for a in appointments]}))
+            # A write while it was loading has already moved the week on;
+            # this response still goes out with the older tag
+            if version == self.week_version(week_start):
+                self.weeks[week_start] = cached
+                if len(self.weeks) > WEEK_CACHE_SIZE:
+                    self.weeks.popitem(last=False)
+        else:
+            self.weeks.move_to_end(week_start)
+        _, etag, encoded = cached
+        extra = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        wanted = headers.get('if-none-match', '')
+        if wanted == '*' or etag in (tag.strip().removeprefix('W/') for tag in wanted.split(',')):
+            return 304, extra, None
+        return 200, extra, encoded
+
+    async def search(self, query, headers, body):
+        text = query.get('q', [''])[0]
+        limit = _int_param(query, 'limit', SEARCH_LIMIT, 1, SEARCH_LIMIT)
+        appointments = await self.read(AppointmentStore.search, text, limit)
+        return 200, None, [appointment_json(appt) for appt in appointments]
+
+    async def availability(self, query, headers, body):
+        now = datetime.now(SHOP_TIMEZONE)
+        start_date = query.get('from', [now.date().isoformat()])[0]
+        try:
+            Date.fromisoformat(start_date)
+        except ValueError:
+            raise HTTPError(400, f"unreadable date {start_date!r}; use YYYY-MM-DD") from None
+        count = _int_param(query, 'count', 8, 1, MAX_AVAILABILITY)
+        duration = _int_param(query, 'duration', DEFAULT_DURATION, 1, CLOSING_MINUTE - BUSINESS_HOURS[0])
+        # Today's slots that have already started are not on offer
+        current_minute = now.hour * 60 + now.minute if start_date == now.date().isoformat() else 0
+        earliest = _int_param(query, 'earliest', current_minute, 0, 24 * 60)
+        # On the writer's connection, whose SlotIndex has every booking made through it
+        slots = await asyncio.wrap_future(
+            self.db.submit(AppointmentStore.next_free_slots, start_date, count, earliest, duration))
+        return 200, None, [{'appointment_date': date, 'start_minute': minute, 'start_time': format_time(minute),
+                            'end_time': format_time(minute + duration), 'bay_id': bay_id}
+                           for date, minute, bay_id in slots]
+
+    async def list_resources(self, query, headers, body):
+        return 200, None, await asyncio.wrap_future(self.db.submit(resources))
+
+    async def show(self, appointment_id, query, headers, body):
+        appt = await self.read(AppointmentStore.get_appointment, int(appointment_id))
+        if appt is None:
+            raise HTTPError(404, f"no appointment {appointment_id}")
+        return 200, None, appointment_json(appt)
+
+    async def create(self, query, headers, body):
+        fields = booking_fields(self.json_body(body))
+        appt = await self.write(add_appointment, fields)
+        self.touched(appt)
+        return 201, {'Location': f'/appointments/{appt.id}'}, appointment_json(appt)
+
+    async def update(self, appointment_id, query, headers, body):
+        fields = booking_fields(self.json_body(body))
+        old, new = await self.write(update_appointment, int(appointment_id), fields)
+        if old is None:
+            raise HTTPError(404, f"no appointment {appointment_id}")
+        self.touched(old, new)
+        return 200, None, appointment_json(new)
+
+    async def delete(self, appointment_id, query, headers, body):
+        appt = await self.write(AppointmentStore.delete_appointment, int(appointment_id))
+        if appt is None:
+            raise HTTPError(404, f"no appointment {appointment_id}")
+        self.touched(appt)
+        return 200, None, appointment_json(appt)
+
+
+async def _serve(db_path, host, port, wal, readers):
+    server = AppointmentServer(db_path, wal, readers)
+    await server.start(host, port)
+    logger.info("Serving appointments on http://%s:%d", host, server.port())
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def serve(db_path, host=DEFAULT_HOST, port=DEFAULT_PORT, wal=False, readers=READERS):
+    """Run the API server until interrupted with Ctrl+C"""
+    try:
+        asyncio.run(_serve(db_path, host, port, wal, readers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,345 @@
+"""Import and export appointments as CSV or iCalendar files.
+
+Files are streamed through generators and imported in chunks, one
+transaction per chunk, so memory stays flat however big the file is.
+Imported rows get the same checks as the booking form: not on a Sunday,
+within opening hours, and from today on, not overlapping a booking in
+every bay (in the database or earlier in the file). Like the database's
+own triggers, clashes on past dates are kept, so old history imports
+as it was.
+
+    python appointment_io.py import old_system.csv
+    python appointment_io.py export week.ics --from 2025-03-03 --to 2025-03-08
+"""
+import argparse
+import csv
+import heapq
+import sqlite3
+import sys
+import time
+from datetime import date as Date, datetime, timedelta, timezone
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from appointment_store import (BUSINESS_HOURS, CLOSING_MINUTE, DEFAULT_DURATION, SHOP_TIMEZONE, AppointmentStore,
+                               appointment_end, format_time, parse_time)
+
+# Rows per transaction when importing
+CHUNK_SIZE = 5000
+
+# Rejected rows printed before the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+CSV_COLUMNS = ['customer_name', 'phone_number', 'reason', 'appointment_date', 'appointment_time']
+
+# Written on export; rows without it last DEFAULT_DURATION
+OPTIONAL_CSV_COLUMNS = ['end_time']
+
+
+class RejectedRow(Exception):
+    """A row that cannot be imported, with the line it came from"""
+
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+
+
+def read_csv(path):
+    """(line, record) for each row of a CSV file with CSV_COLUMNS headers"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise SystemExit(f"{path}: missing columns {', '.join(sorted(missing))}")
+        for record in reader:
+            yield reader.line_num, record
+
+
+def write_csv(path, appointments):
+    """Write appointments to path, yielding each one once it is written"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS + OPTIONAL_CSV_COLUMNS)
+        for appt in appointments:
+            writer.writerow([appt.customer_name, appt.phone_number, appt.reason, appt.appointment_date,
+                             format_time(appt.start_minute), format_time(appointment_end(appt))])
+            yield appt
+
+
+def _ics_unescape(text):
+    out = []
+    chars = iter(text)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            out.append('\n' if char in 'nN' else char)
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def _ics_escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_lines(f):
+    """(line number, unfolded content line) from an iCalendar file"""
+    current = None
+    start = 0
+    for number, raw in enumerate(f, 1):
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and current is not None:
+            current += raw[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = raw, number
+    if current is not None:
+        yield start, current
+
+
+def _ics_local_time(value, params):
+    """Naive shop-local datetime for a DTSTART or DTEND value"""
+    if 'T' not in value:
+        raise ValueError("all-day event")
+    parsed = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    elif 'TZID' in params:
+        parsed = parsed.replace(tzinfo=ZoneInfo(params['TZID']))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(SHOP_TIMEZONE).replace(tzinfo=None)
+    return parsed
+
+
+def read_ics(path):
+    """(line, record) for each VEVENT of an iCalendar file
+
+    SUMMARY is the reason and CONTACT is "name, phone", as written by
+    write_ics.
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        event = None
+        for line, content in _ics_lines(f):
+            name, _, value = content.partition(':')
+            name, *param_list = name.split(';')
+            name = name.upper()
+            params = dict(p.split('=', 1) for p in param_list if '=' in p)
+            if name == 'BEGIN' and value.upper() == 'VEVENT':
+                event = {'line': line}
+            elif event is None:
+                continue
+            elif name == 'END' and value.upper() == 'VEVENT':
+                yield event.pop('line'), event
+                event = None
+            elif name == 'SUMMARY':
+                event['reason'] = _ics_unescape(value)
+            elif name == 'CONTACT':
+                contact = _ics_unescape(value)
+                customer, _, phone = contact.rpartition(',')
+                event['customer_name'] = customer.strip() if phone else contact.strip()
+                event['phone_number'] = phone.strip()
+            elif name == 'DTSTART':
+                try:
+                    start = _ics_local_time(value, params)
+                except (ValueError, KeyError) as e:
+                    event['appointment_date'] = value
+                    event['appointment_time'] = f"unreadable ({e})"
+                else:
+                    event['appointment_date'] = start.date().isoformat()
+                    event['appointment_time'] = start.strftime('%H:%M')
+            elif name == 'DTEND':
+                try:
+                    event['end_time'] = _ics_local_time(value, params).strftime('%H:%M')
+                except (ValueError, KeyError) as e:
+                    event['end_time'] = f"unreadable ({e})"
+
+
+def _fold(line):
+    """Split a content line into 75-character pieces as RFC 5545 asks"""
+    while len(line) > 75:
+        yield line[:75]
+        line = ' ' + line[75:]
+    yield line
+
+
+def write_ics(path, appointments):
+    """Write appointments to path as events, yielding each one once it is written"""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Mechanic Shop Task Manager//EN\r\n')
+        for appt in appointments:
+            midnight = datetime.combine(Date.fromisoformat(appt.appointment_date), datetime.min.time())
+            start = midnight + timedelta(minutes=appt.start_minute)
+            end = midnight + timedelta(minutes=appointment_end(appt))
+            lines = [
+                'BEGIN:VEVENT',
+                f'UID:appointment-{appt.id}@mechanic-shop',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART;TZID={SHOP_TIMEZONE.key}:{start:%Y%m%dT%H%M%S}',
+                f'DTEND;TZID={SHOP_TIMEZONE.key}:{end:%Y%m%dT%H%M%S}',
+                f'SUMMARY:{_ics_escape(appt.reason)}',
+                f'CONTACT:{_ics_escape(appt.customer_name)}\\, {_ics_escape(appt.phone_number)}',
+                'END:VEVENT',
+            ]
+            for line in lines:
+                f.write('\r\n'.join(_fold(line)) + '\r\n')
+            yield appt
+        f.write('END:VCALENDAR\r\n')
+
+
+READERS = {'csv': read_csv, 'ics': read_ics}
+WRITERS = {'csv': write_csv, 'ics': write_ics}
+
+
+def validated(records, store, reject):
+    """(line, (name, phone, reason, date, start minute, bay id, end minute)) for rows that pass the booking rules
+
+    reject(error) is called with a RejectedRow for the others. Each row
+    gets the first bay free at its time in the store's SlotIndex, and is
+    booked there so later rows of the file cannot take the same bay.
+    Past rows with no bay free go in the first bay.
+    """
+    slots = store.slots
+    today = datetime.now(SHOP_TIMEZONE).date()
+    for line, record in records:
+        try:
+            values = [(record.get(column) or '').strip() for column in CSV_COLUMNS]
+            name, phone, reason, date, time_text = values
+            if not (name and phone and reason):
+                raise RejectedRow(line, "name, phone and reason are required")
+            try:
+                day = Date.fromisoformat(date)
+            except ValueError:
+                raise RejectedRow(line, f"unreadable date {date!r}") from None
+            if day.weekday() == 6:
+                raise RejectedRow(line, f"{date} is a Sunday")
+            minute = parse_time(time_text)
+            if minute is None:
+                raise RejectedRow(line, f"unreadable time {time_text!r}")
+            end_text = (record.get('end_time') or '').strip()
+            end = parse_time(end_text) if end_text else minute + DEFAULT_DURATION
+            if end is None:
+                raise RejectedRow(line, f"unreadable end time {end_text!r}")
+            if end <= minute:
+                raise RejectedRow(line, f"ends at {format_time(end)}, before it starts")
+            if minute < BUSINESS_HOURS[0] or end > CLOSING_MINUTE:
+                raise RejectedRow(line, f"{format_time(minute)} to {format_time(end)} is outside opening hours")
+            bay = slots.free_bay(date, minute, end)
+            if bay is None and day < today:
+                bay = 0
+            elif bay is None:
+                raise RejectedRow(line, f"{date} at {format_time(minute)} is already booked in every bay")
+            slots.occupy(date, minute, end, bay)
+        except RejectedRow as e:
+            reject(e)
+            continue
+        yield line, (name, phone, reason, date, minute, store.bays[bay].id, end)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _is_slot_conflict(error):
+    return isinstance(error, sqlite3.IntegrityError) and 'slot conflict' in str(error)
+
+
+def add_each(store, chunk, reject):
+    """Add (line, row) pairs one savepoint at a time, rejecting those that clash; returns how many were added"""
+    added = 0
+    with store.transaction():
+        for line, row in chunk:
+            try:
+                store.add_appointments([row])
+                added += 1
+            except sqlite3.IntegrityError as e:
+                if not _is_slot_conflict(e):
+                    raise
+                reject(RejectedRow(line, f"{row[3]} at {format_time(row[4])} was booked on another "
+                                         "workstation during the import"))
+    return added
+
+
+def import_file(store, path, file_format, chunk_size=CHUNK_SIZE):
+    """Import path into store; returns (rows imported, rows skipped)
+
+    The first MAX_REPORTED_ERRORS skipped rows are printed to stderr. If
+    another workstation books a slot of a chunk while it is checked, the
+    chunk is added again row by row and only the clashing rows are skipped.
+    """
+    imported = skipped = 0
+
+    def reject(error):
+        nonlocal skipped
+        skipped += 1
+        if skipped <= MAX_REPORTED_ERRORS:
+            print(f"Skipped {error}", file=sys.stderr)
+
+    rows = validated(READERS[file_format](path), store, reject)
+    for chunk in chunks(rows, chunk_size):
+        try:
+            store.add_appointments([row for _, row in chunk])
+            imported += len(chunk)
+        except sqlite3.IntegrityError as e:
+            if not _is_slot_conflict(e):
+                raise
+            imported += add_each(store, chunk, reject)
+    return imported, skipped
+
+
+def export_file(store, path, file_format, start_date=None, end_date=None):
+    """Write appointments (all, or between the dates) to path, archived ones included; returns how many"""
+    appointments = heapq.merge(store.iter_archived(start_date, end_date),
+                               store.iter_appointments(start_date, end_date),
+                               key=lambda appt: (appt.appointment_date, appt.start_minute, appt.id))
+    return sum(1 for _ in WRITERS[file_format](path, appointments))
+
+
+def file_format_for(path, given):
+    file_format = given or path.rsplit('.', 1)[-1].lower()
+    if file_format not in READERS:
+        raise SystemExit(f"{path}: unknown format; use --format csv or --format ics")
+    return file_format
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export mechanic shop appointments")
+    parser.add_argument('--db', default='mechanic_appointments.db', help="database file")
+    parser.add_argument('--wal', action='store_true', help="open the database in WAL mode")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="add appointments from a CSV or iCalendar file")
+    importer.add_argument('path')
+    importer.add_argument('--format', choices=sorted(READERS))
+    importer.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="rows per transaction")
+
+    exporter = commands.add_parser('export', help="write appointments to a CSV or iCalendar file")
+    exporter.add_argument('path')
+    exporter.add_argument('--format', choices=sorted(WRITERS))
+    exporter.add_argument('--from', dest='start_date', help="first date, YYYY-MM-DD")
+    exporter.add_argument('--to', dest='end_date', help="last date, YYYY-MM-DD")
+
+    args = parser.parse_args(argv)
+    file_format = file_format_for(args.path, args.format)
+    store = AppointmentStore(args.db, wal=args.wal)
+    start = time.perf_counter()
+    try:
+        if args.command == 'import':
+            count, skipped = import_file(store, args.path, file_format, args.chunk_size)
+            verb = 'Imported'
+        else:
+            count = export_file(store, args.path, file_format, args.start_date, args.end_date)
+            skipped = 0
+            verb = 'Exported'
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+    print(f"{verb} {count} appointments in {elapsed:.1f} s ({count / elapsed if elapsed else 0:.0f} rows/s), "
+          f"{skipped} skipped")
+
+
+if __name__ == '__main__':
+    main()
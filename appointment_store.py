@@ -0,0 +1,1322 @@
+"""SQLite storage for mechanic shop appointments.
+
+This module has no tkinter dependency so it can be used by scripts and
+benchmarks that run without a display.
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date as Date, datetime, timedelta
+from typing import Iterator, NamedTuple, Optional
+from zoneinfo import ZoneInfo
+
+from customer_index import normalise_phone
+from slot_index import SlotIndex
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+# Display text for every minute of the day, e.g. 780 -> '01:00 PM'.
+# Times are stored as minutes since midnight and only turned into text here.
+TIME_LABELS = [
+    f"{(minute // 60 + 11) % 12 + 1:02d}:{minute % 60:02d} {'AM' if minute < 12 * 60 else 'PM'}"
+    for minute in range(MINUTES_PER_DAY)
+]
+
+_MINUTE_OF_LABEL = {label: minute for minute, label in enumerate(TIME_LABELS)}
+
+# Bookable appointment start times in minutes since midnight, one per
+# weekly grid row: 08:00 AM to 07:00 PM
+BUSINESS_HOURS = [hour * 60 for hour in range(8, 20)]
+
+# When the last grid row ends, and how long an appointment lasts if no
+# end time is given
+CLOSING_MINUTE = BUSINESS_HOURS[-1] + 60
+DEFAULT_DURATION = 60
+
+# Where the shop is: "today" and times in calendar files are taken in this zone
+SHOP_TIMEZONE = ZoneInfo("America/Toronto")
+
+
+def format_time(minute: int) -> str:
+    """'01:00 PM' style text for minutes since midnight"""
+    return TIME_LABELS[minute % MINUTES_PER_DAY]
+
+
+def parse_time(text: str) -> Optional[int]:
+    """Minutes since midnight for '01:00 PM', '1:00 pm' or '13:00', or None if unreadable"""
+    text = text.strip().upper()
+    minute = _MINUTE_OF_LABEL.get(text)
+    if minute is not None:
+        return minute
+    # 24-hour times are common in imported files; strptime is slow
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', text)
+    if match and int(match[1]) < 24 and int(match[2]) < 60:
+        return int(match[1]) * 60 + int(match[2])
+    for fmt in ('%I:%M %p', '%I:%M%p', '%H:%M'):
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.hour * 60 + parsed.minute
+    return None
+
+
+class SlotConflictError(Exception):
+    """The requested date and time is already booked"""
+
+    def __init__(self, date, time):
+        super().__init__(f"{date} at {format_time(time)} is already booked")
+        self.date = date
+        self.time = time
+
+
+class Appointment(NamedTuple):
+    id: int
+    customer_name: str
+    phone_number: str
+    reason: str
+    appointment_date: str
+    start_minute: int  # minutes since midnight; format_time() for display
+    bay_id: Optional[int] = None  # None for archived rows, which keep no bay
+    technician_id: Optional[int] = None
+    end_minute: Optional[int] = None  # the minute it ends, after start_minute
+    customer_id: Optional[int] = None  # None until link_customers has seen it
+
+
+APPOINTMENT_COLUMNS = ('id, customer_name, phone_number, reason, appointment_date, start_minute, '
+                       'bay_id, technician_id, end_minute, customer_id')
+
+
+def appointment_end(appt: Appointment) -> int:
+    """Minute appt ends; archived rows from before end times were kept last DEFAULT_DURATION"""
+    return appt.end_minute if appt.end_minute is not None else appt.start_minute + DEFAULT_DURATION
+
+
+class Resource(NamedTuple):
+    """A service bay or a technician"""
+    id: int
+    name: str
+
+
+class Customer(NamedTuple):
+    id: int
+    name: str  # as on their latest booking
+    phone_number: str  # as typed on their latest booking
+    phone_e164: Optional[str]  # None if the phone could not be normalised
+
+
+def _migrate_1(conn):
+    """Base tables plus indexes for the week, list and customer lookups"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            appointment_date TEXT NOT NULL,
+            appointment_time TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS repair_reasons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reason TEXT UNIQUE NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_appointments_date_time
+        ON appointments (appointment_date, appointment_time)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_appointments_customer_name ON appointments (customer_name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_appointments_phone_number ON appointments (phone_number)')
+
+
+def _migrate_2(conn):
+    """Index matching the appointment list order for keyset pagination"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_appointments_list_order
+        ON appointments (appointment_date DESC, appointment_time, id)
+    ''')
+
+
+def _digits_sql(column):
+    """SQL expression stripping the usual phone punctuation from column"""
+    expr = column
+    for char in (' ', '-', '(', ')', '.', '+', '/'):
+        expr = f"REPLACE({expr}, '{char}', '')"
+    return expr
+
+
+# Shortest tail of a phone number that a search can start from, e.g. the last four digits
+PHONE_SUFFIX_MIN = 4
+
+# Longest E.164 number; later starting points are never PHONE_SUFFIX_MIN long
+PHONE_MAX_DIGITS = 15
+
+
+def _phone_tokens_sql(column):
+    """SQL expression for phone_digits: the digits of column, then each shorter tail of them
+
+    With every tail indexed as its own word, a prefix search finds the
+    number from any digit on, so "5550199" finds "(416) 555-0199".
+    """
+    tails = ' '.join(f"|| CASE WHEN length(d) >= {start + PHONE_SUFFIX_MIN - 1} THEN ' ' || substr(d, {start}) "
+                     "ELSE '' END"
+                     for start in range(2, PHONE_MAX_DIGITS - PHONE_SUFFIX_MIN + 2))
+    return f"(SELECT d {tails} FROM (SELECT {_digits_sql(column)} AS d))"
+
+
+def _create_search_triggers(conn):
+    """Keep appointments_fts in step with appointments"""
+    new_row = f"new.id, new.customer_name, new.phone_number, new.reason, {_phone_tokens_sql('new.phone_number')}"
+    old_row = f"old.id, old.customer_name, old.phone_number, old.reason, {_phone_tokens_sql('old.phone_number')}"
+    columns = 'rowid, customer_name, phone_number, reason, phone_digits'
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS appointments_fts_insert AFTER INSERT ON appointments BEGIN
+            INSERT INTO appointments_fts ({columns}) VALUES ({new_row});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS appointments_fts_delete AFTER DELETE ON appointments BEGIN
+            INSERT INTO appointments_fts (appointments_fts, {columns}) VALUES ('delete', {old_row});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS appointments_fts_update
+        AFTER UPDATE OF customer_name, phone_number, reason ON appointments BEGIN
+            INSERT INTO appointments_fts (appointments_fts, {columns}) VALUES ('delete', {old_row});
+            INSERT INTO appointments_fts ({columns}) VALUES ({new_row});
+        END
+    ''')
+
+
+def _migrate_3(conn):
+    """Full-text index over name, phone and reason for the search bar
+
+    The index is contentless: rows are looked up in appointments by rowid.
+    phone_digits holds the phone number with punctuation removed so
+    "4165551234" finds "(416) 555-1234".
+    """
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS appointments_fts USING fts5(
+            customer_name, phone_number, reason, phone_digits,
+            content='', prefix='1 2 3'
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO appointments_fts (rowid, customer_name, phone_number, reason, phone_digits)
+        SELECT id, customer_name, phone_number, reason, {_digits_sql('phone_number')}
+        FROM appointments
+    ''')
+    _create_search_triggers(conn)
+
+
+def _migrate_4(conn):
+    """Refuse a second booking of the same date and time
+
+    Backs up the in-memory SlotIndex check for writes from other
+    workstations. Only today and later are checked so older history,
+    including clashes already in the file, can still be kept and imported.
+    """
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS appointments_slot_insert
+        BEFORE INSERT ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND appointment_time = NEW.appointment_time
+            );
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS appointments_slot_update
+        BEFORE UPDATE OF appointment_date, appointment_time ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+            AND (NEW.appointment_date != OLD.appointment_date OR NEW.appointment_time != OLD.appointment_time)
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND appointment_time = NEW.appointment_time
+                    AND id != NEW.id
+            );
+        END
+    ''')
+
+
+def _create_slot_triggers(conn):
+    """Refuse a second booking of the same date and start minute, from today on"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS appointments_slot_insert
+        BEFORE INSERT ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND start_minute = NEW.start_minute
+            );
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS appointments_slot_update
+        BEFORE UPDATE OF appointment_date, start_minute ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+            AND (NEW.appointment_date != OLD.appointment_date OR NEW.start_minute != OLD.start_minute)
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND start_minute = NEW.start_minute
+                    AND id != NEW.id
+            );
+        END
+    ''')
+
+
+def _migrate_5(conn):
+    """Store the start time as minutes since midnight instead of '01:00 PM' text
+
+    Text times sorted 01:00 PM before 08:00 AM. SQLite cannot change a
+    column's type in place, so the table is rebuilt and its indexes and
+    triggers recreated on the integer column. Times that cannot be read
+    are kept as midnight and reported.
+    """
+    unreadable = []
+
+    def to_minute(row_id, text):
+        minute = parse_time(text or '')
+        if minute is None:
+            unreadable.append((row_id, text))
+            return 0
+        return minute
+
+    conn.create_function('to_minute', 2, to_minute, deterministic=True)
+    conn.execute('''
+        CREATE TABLE appointments_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            appointment_date TEXT NOT NULL,
+            start_minute INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO appointments_new
+            (id, customer_name, phone_number, reason, appointment_date, start_minute, created_at)
+        SELECT id, customer_name, phone_number, reason, appointment_date,
+               to_minute(id, appointment_time), created_at
+        FROM appointments
+    ''')
+    conn.create_function('to_minute', 2, None)
+    # Dropping the old table also drops its indexes and triggers
+    conn.execute('DROP TABLE appointments')
+    conn.execute('ALTER TABLE appointments_new RENAME TO appointments')
+    conn.execute('CREATE INDEX idx_appointments_date_time ON appointments (appointment_date, start_minute)')
+    conn.execute('CREATE INDEX idx_appointments_customer_name ON appointments (customer_name)')
+    conn.execute('CREATE INDEX idx_appointments_phone_number ON appointments (phone_number)')
+    conn.execute('''
+        CREATE INDEX idx_appointments_list_order
+        ON appointments (appointment_date DESC, start_minute, id)
+    ''')
+    _create_search_triggers(conn)
+    _create_slot_triggers(conn)
+    for row_id, text in unreadable:
+        logger.warning("Appointment %s: unreadable time %r stored as 12:00 AM", row_id, text)
+
+
+def _migrate_6(conn):
+    """Count how often each saved reason was used by archived appointments"""
+    conn.execute('ALTER TABLE repair_reasons ADD COLUMN uses INTEGER NOT NULL DEFAULT 0')
+
+
+def _migrate_7(conn):
+    """Service bays and technicians, with each appointment booked into a bay
+
+    Existing appointments go into the first bay. Double booking is now
+    refused per bay, and per technician when one is assigned, so the shop
+    can take as many jobs at a time as it has bays.
+    """
+    conn.execute('CREATE TABLE bays (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)')
+    conn.execute('CREATE TABLE technicians (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)')
+    conn.execute("INSERT INTO bays (name) VALUES ('Bay 1')")
+    conn.execute('ALTER TABLE appointments ADD COLUMN bay_id INTEGER REFERENCES bays (id)')
+    conn.execute('ALTER TABLE appointments ADD COLUMN technician_id INTEGER REFERENCES technicians (id)')
+    conn.execute('UPDATE appointments SET bay_id = (SELECT MIN(id) FROM bays)')
+    conn.execute('CREATE INDEX idx_appointments_bay ON appointments (bay_id, appointment_date, start_minute)')
+    conn.execute('''
+        CREATE INDEX idx_appointments_technician
+        ON appointments (technician_id, appointment_date, start_minute)
+    ''')
+    conn.execute('DROP TRIGGER IF EXISTS appointments_slot_insert')
+    conn.execute('DROP TRIGGER IF EXISTS appointments_slot_update')
+    # A NULL bay comes from an older copy of the app, which knew only one
+    # bay, so it clashes with other NULL bays
+    conn.execute('''
+        CREATE TRIGGER appointments_slot_insert
+        BEFORE INSERT ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND start_minute = NEW.start_minute
+                    AND (bay_id IS NEW.bay_id OR technician_id = NEW.technician_id)
+            );
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER appointments_slot_update
+        BEFORE UPDATE OF appointment_date, start_minute, bay_id, technician_id ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+            AND (NEW.appointment_date != OLD.appointment_date OR NEW.start_minute != OLD.start_minute
+                 OR NEW.bay_id IS NOT OLD.bay_id OR NEW.technician_id IS NOT OLD.technician_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE appointment_date = NEW.appointment_date AND start_minute = NEW.start_minute
+                    AND (bay_id IS NEW.bay_id OR technician_id = NEW.technician_id)
+                    AND id != NEW.id
+            );
+        END
+    ''')
+
+
+def _migrate_8(conn):
+    """Store when each appointment ends, so a job can take more or less than an hour
+
+    Existing appointments last an hour. The clash triggers now refuse any
+    overlap in the same bay or with the same technician; the range scan
+    on (appointment_date, start_minute) stays within one day.
+    """
+    conn.execute('ALTER TABLE appointments ADD COLUMN end_minute INTEGER NOT NULL DEFAULT 0')
+    conn.execute('UPDATE appointments SET end_minute = start_minute + ?', (DEFAULT_DURATION,))
+    # Covers the clash check and SlotIndex's week loads without touching the table
+    conn.execute('DROP INDEX idx_appointments_date_time')
+    conn.execute('''
+        CREATE INDEX idx_appointments_date_time
+        ON appointments (appointment_date, start_minute, end_minute, bay_id, technician_id)
+    ''')
+    # Older copies of the app do not write end_minute; give their
+    # appointments the usual length
+    for event, columns in (('INSERT', ''), ('UPDATE', 'OF start_minute, end_minute ')):
+        conn.execute(f'''
+            CREATE TRIGGER appointments_default_end_{event.lower()}
+            AFTER {event} {columns}ON appointments
+            WHEN NEW.end_minute <= NEW.start_minute
+            BEGIN
+                UPDATE appointments SET end_minute = NEW.start_minute + {DEFAULT_DURATION} WHERE id = NEW.id;
+            END
+        ''')
+    new_end = f'(CASE WHEN NEW.end_minute > NEW.start_minute THEN NEW.end_minute ' \
+              f'ELSE NEW.start_minute + {DEFAULT_DURATION} END)'
+    clash = f'''
+        SELECT RAISE(ABORT, 'slot conflict') WHERE EXISTS (
+            SELECT 1 FROM appointments
+            WHERE appointment_date = NEW.appointment_date
+                AND start_minute < {new_end} AND end_minute > NEW.start_minute
+                AND (bay_id IS NEW.bay_id OR technician_id = NEW.technician_id)
+                AND id IS NOT NEW.id
+        );
+    '''
+    conn.execute('DROP TRIGGER appointments_slot_insert')
+    conn.execute('DROP TRIGGER appointments_slot_update')
+    conn.execute(f'''
+        CREATE TRIGGER appointments_slot_insert
+        BEFORE INSERT ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+        BEGIN {clash} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER appointments_slot_update
+        BEFORE UPDATE OF appointment_date, start_minute, end_minute, bay_id, technician_id ON appointments
+        WHEN NEW.appointment_date >= date('now', 'localtime')
+            AND (NEW.appointment_date != OLD.appointment_date OR NEW.start_minute != OLD.start_minute
+                 OR NEW.end_minute != OLD.end_minute
+                 OR NEW.bay_id IS NOT OLD.bay_id OR NEW.technician_id IS NOT OLD.technician_id)
+        BEGIN {clash} END
+    ''')
+
+
+def _migrate_9(conn):
+    """Customers, linked from their appointments, so repeat visits can be found by id
+
+    Customers are told apart by their phone in E.164 form; phones that
+    cannot be normalised fall back to the exact name and phone. Existing
+    appointments are linked afterwards by AppointmentStore.link_customers,
+    a batch at a time, rather than holding the write lock for the whole
+    table here.
+    """
+    conn.execute('''
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            phone_e164 TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_customers_phone_number ON customers (phone_number)')
+    conn.execute('ALTER TABLE appointments ADD COLUMN customer_id INTEGER REFERENCES customers (id)')
+    # A customer's history newest first; also finds the rows still to link
+    conn.execute('''
+        CREATE INDEX idx_appointments_customer
+        ON appointments (customer_id, appointment_date DESC, start_minute)
+    ''')
+
+
+def _migrate_10(conn):
+    """Index every tail of the phone digits, so a number typed without its area code is found"""
+    for trigger in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER appointments_fts_{trigger}')
+    conn.execute("INSERT INTO appointments_fts (appointments_fts) VALUES ('delete-all')")
+    conn.execute(f'''
+        INSERT INTO appointments_fts (rowid, customer_name, phone_number, reason, phone_digits)
+        SELECT id, customer_name, phone_number, reason, {_phone_tokens_sql('phone_number')}
+        FROM appointments
+    ''')
+    _create_search_triggers(conn)
+
+
+# Schema migrations, applied in order. The position in this list (starting
+# at 1) is the schema version recorded in PRAGMA user_version.
+MIGRATIONS = [
+    _migrate_1,
+    _migrate_2,
+    _migrate_3,
+    _migrate_4,
+    _migrate_5,
+    _migrate_6,
+    _migrate_7,
+    _migrate_8,
+    _migrate_9,
+    _migrate_10,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _user_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database schema up to SCHEMA_VERSION"""
+    version = _user_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        # Another workstation may be migrating the same file; the write lock
+        # serialises us and the version is re-read under it
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if _user_version(conn) < number:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return version
+
+
+# Most rows a search returns
+SEARCH_LIMIT = 100
+
+# Newest matches considered for ranking
+SEARCH_CANDIDATES = 500
+
+
+def fts_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression for what the user typed, or None if there is nothing to search
+
+    Every word must match the start of a word in name, phone or reason.
+    Input that looks like a phone number is matched against the phone
+    digits instead, from any digit on, so "555-0199" and the last four
+    digits find "416-555-0199" too.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    digits = re.sub(r'\D', '', text)
+    if digits and not re.search(r'[^\d\s\-().+/]', text):
+        return f'phone_digits : "{digits}"* OR phone_number : "{digits}"*'
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+
+# How long a connection waits for another writer's lock before giving up
+# with "database is locked"
+BUSY_TIMEOUT_MS = 10000
+
+# Memory-mapped I/O size used in WAL mode
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def connect(db_path: str, wal: bool = False) -> sqlite3.Connection:
+    """Open db_path with the pragmas shared by every connection
+
+    wal switches the database to write-ahead logging, which lets readers
+    keep going while another workstation writes. The journal mode is stored
+    in the file, so every instance picks it up once one has set it. WAL
+    needs all processes on the same host or a filesystem with working
+    shared memory; it is not safe on network shares.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA foreign_keys = ON')
+    if wal:
+        conn.execute('PRAGMA journal_mode = WAL')
+        # Durable at checkpoints; a power cut can lose only the last commits
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    return conn
+
+
+# Rows moved to the archive per batch, and how long one call to
+# archive_old_appointments keeps starting new batches
+ARCHIVE_BATCH_SIZE = 200
+ARCHIVE_TIME_BUDGET = 0.05
+
+
+# Appointments linked to customers per link_customers batch
+CUSTOMER_BATCH_SIZE = 1000
+
+# Most visits customer_history returns
+HISTORY_LIMIT = 500
+
+# Most customer ids kept in memory; the cache starts over when it is full,
+# so imports of any size keep memory flat
+CUSTOMER_CACHE_SIZE = 10_000
+
+
+def archive_path_for(db_path: str) -> str:
+    """Archive file kept beside db_path, e.g. shop_archive.db for shop.db"""
+    if db_path == ':memory:':
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def _archive_partition(date_str):
+    """Archive table holding appointments of date_str's month"""
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', date_str):
+        return f"appointments_{date_str[:4]}_{date_str[5:7]}"
+    return 'appointments_undated'
+
+
+def _create_archive_schema(conn):
+    """Reason dictionary shared by the monthly archive tables
+
+    Monthly tables made before appointments had end times or customers
+    get end_minute and customer_id columns, left NULL for the rows
+    already in them.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.reasons (
+            id INTEGER PRIMARY KEY,
+            reason TEXT UNIQUE NOT NULL
+        )
+    ''')
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM archive.sqlite_master WHERE type = 'table' AND name GLOB 'appointments_*'"
+    )]
+    for table in tables:
+        columns = {row[1] for row in conn.execute(f'PRAGMA archive.table_info({table})')}
+        for column in ('end_minute', 'customer_id'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE archive.{table} ADD COLUMN {column} INTEGER')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS archive.{table}_customer ON {table} (customer_id)')
+
+
+def _create_archive_partition(conn, table):
+    """Monthly archive table, clustered by date and time
+
+    Reasons are stored as ids into archive.reasons since most archived
+    rows repeat a handful of them, and WITHOUT ROWID keeps the rows in
+    the primary key's b-tree instead of a second one. The customer index
+    serves customer_history.
+    """
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS archive.{table} (
+            id INTEGER NOT NULL,
+            customer_name TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            reason_id INTEGER NOT NULL,
+            appointment_date TEXT NOT NULL,
+            start_minute INTEGER NOT NULL,
+            created_at TIMESTAMP,
+            end_minute INTEGER,
+            customer_id INTEGER,
+            PRIMARY KEY (appointment_date, start_minute, id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS archive.{table}_customer ON {table} (customer_id)')
+
+
+class AppointmentStore:
+    """Repository for the appointments and repair_reasons tables
+
+    Old appointments are moved to an attached archive database, one table
+    per month, by archive_old_appointments and read back with the
+    archived_* methods.
+    """
+
+    def __init__(self, db_path: str, wal: bool = False, archive_path: Optional[str] = None):
+        self.db_path = db_path
+        self.archive_path = archive_path or archive_path_for(db_path)
+        self.conn = connect(db_path, wal)
+        self._transaction_depth = 0
+        self._moving_id = None  # appointment left out of SlotIndex while it is being moved
+        self._customer_ids = {}  # E.164 phone, or (name, phone) if it has none -> customer id
+        migrate(self.conn)
+        self.conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        if wal:
+            self.conn.execute('PRAGMA archive.journal_mode = WAL')
+        _create_archive_schema(self.conn)
+        self.reload_resources()
+
+    def reload_resources(self) -> None:
+        """Re-read the bays and technicians, e.g. after another workstation added one
+
+        SlotIndex keeps a bit per bay, so it is rebuilt as well.
+        """
+        self.bays = [Resource(*row) for row in self.conn.execute('SELECT id, name FROM bays ORDER BY id')]
+        self.technicians = [Resource(*row) for row in
+                            self.conn.execute('SELECT id, name FROM technicians ORDER BY name')]
+        self.bay_position = {bay.id: position for position, bay in enumerate(self.bays)}
+        # Bookings seen through this connection; cleared when other
+        # workstations write (see data_version) or a transaction rolls back
+        self.slots = SlotIndex(BUSINESS_HOURS, self._booked_in_week, bays=max(len(self.bays), 1),
+                               closing=CLOSING_MINUTE)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Commit everything inside the block at once
+
+        Nested blocks become savepoints, so an error inside one rolls back
+        only that block's changes.
+        """
+        depth = self._transaction_depth
+        if depth == 0:
+            self.conn.execute('BEGIN IMMEDIATE')
+        else:
+            self.conn.execute(f'SAVEPOINT nested_{depth}')
+        self._transaction_depth += 1
+        try:
+            yield
+            # Inside the try: a COMMIT that fails on a lock must still roll back
+            if depth == 0:
+                self.conn.commit()
+            else:
+                self.conn.execute(f'RELEASE nested_{depth}')
+        except BaseException:
+            self.slots.clear()
+            # Customers added inside the block are gone
+            self._customer_ids.clear()
+            if depth == 0:
+                self.conn.rollback()
+            else:
+                self.conn.execute(f'ROLLBACK TO nested_{depth}')
+                self.conn.execute(f'RELEASE nested_{depth}')
+            raise
+        finally:
+            self._transaction_depth = depth
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits to the database
+
+        Commits made through this connection do not change it, so polling it
+        from the writing connection detects only other workstations.
+        """
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _fetch_appointments(self, sql: str, params=()) -> list[Appointment]:
+        return [Appointment(*row) for row in self.conn.execute(sql, params)]
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM appointments').fetchone()[0]
+
+    def _booked_in_week(self, week_start):
+        """(date, start, end, bay position) of every appointment in the week, for SlotIndex"""
+        week_end = (Date.fromisoformat(week_start) + timedelta(days=6)).isoformat()
+        return [(date, start, end, self.bay_position.get(bay_id)) for date, start, end, bay_id in self.conn.execute('''
+            SELECT appointment_date, start_minute, end_minute, bay_id
+            FROM appointments
+            WHERE appointment_date BETWEEN ? AND ? AND id IS NOT ?
+        ''', (week_start, week_end, self._moving_id))]
+
+    def _execute_write(self, sql, params, date, time):
+        try:
+            return self.conn.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            if 'slot conflict' in str(e):
+                raise SlotConflictError(date, time) from e
+            raise
+
+    def add_bay(self, name: str) -> Resource:
+        """Add a service bay; existing bookings keep their bays"""
+        with self.transaction():
+            cursor = self.conn.execute('INSERT INTO bays (name) VALUES (?)', (name,))
+        self.reload_resources()
+        return Resource(cursor.lastrowid, name)
+
+    def add_technician(self, name: str) -> Resource:
+        with self.transaction():
+            cursor = self.conn.execute('INSERT INTO technicians (name) VALUES (?)', (name,))
+        self.reload_resources()
+        return Resource(cursor.lastrowid, name)
+
+    def _choose_bay(self, date: str, time: int, end_time: int, bay_id: Optional[int] = None,
+                    prefer: Optional[int] = None) -> int:
+        """bay_id if it is free from time to end_time, or else the preferred or first free bay
+
+        Raises SlotConflictError if the bay asked for, or every bay, is
+        taken. Sundays are not tracked by SlotIndex and are left to the
+        database trigger.
+        """
+        if bay_id is not None and bay_id not in self.bay_position:
+            # Added by another workstation since we last looked
+            self.reload_resources()
+        if bay_id is not None:
+            if not self.slots.is_free(date, time, end_time, self.bay_position.get(bay_id)):
+                raise SlotConflictError(date, time)
+            return bay_id
+        if prefer in self.bay_position and self.slots.is_free(date, time, end_time, self.bay_position[prefer]):
+            return prefer
+        position = self.slots.free_bay(date, time, end_time)
+        if position is not None:
+            return self.bays[position].id
+        if not self.slots.is_free(date, time, end_time):
+            raise SlotConflictError(date, time)
+        return prefer or self.bays[0].id
+
+    def add_appointment(self, name: str, phone: str, reason: str, date: str, time: int,
+                        bay_id: Optional[int] = None, technician_id: Optional[int] = None,
+                        end_time: Optional[int] = None) -> int:
+        """Insert an appointment from time to end_time (minutes since midnight) and return its id
+
+        end_time defaults to DEFAULT_DURATION after time. With no bay_id the
+        first bay free for the whole appointment is used. Raises
+        SlotConflictError if the bay, every bay, or the technician is
+        already booked for part of it.
+        """
+        if end_time is None:
+            end_time = time + DEFAULT_DURATION
+        with self.transaction():
+            bay_id = self._choose_bay(date, time, end_time, bay_id)
+            customer_id = self._booking_customer(name, phone)
+            cursor = self._execute_write('''
+                INSERT INTO appointments (customer_name, phone_number, reason, appointment_date,
+                                          start_minute, end_minute, bay_id, technician_id, customer_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, phone, reason, date, time, end_time, bay_id, technician_id, customer_id), date, time)
+            self.slots.occupy(date, time, end_time, self.bay_position.get(bay_id))
+        return cursor.lastrowid
+
+    def add_appointments(self, rows) -> int:
+        """Insert many (name, phone, reason, date, start minute[, bay id[, end minute]]) rows at once
+
+        Rows without a bay go into the first one and rows without an end
+        last DEFAULT_DURATION. Each row is linked to its customer, who is
+        added if new. Returns how many were inserted. The search
+        index is filled with one INSERT ... SELECT after the rows are in
+        rather than by the per-row trigger, which makes bulk loads about
+        three times faster. The trigger is dropped and recreated inside
+        the transaction, so other connections never see it missing.
+        """
+        with self.transaction():
+            rows = [tuple(row) + (None,) * (7 - len(row)) for row in rows]
+            rows = [row + (self._customer_id(row[0], row[1]),) for row in rows]
+            last_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM appointments').fetchone()[0]
+            self.conn.execute('DROP TRIGGER appointments_fts_insert')
+            cursor = self.conn.executemany(f'''
+                INSERT INTO appointments (customer_name, phone_number, reason, appointment_date,
+                                          start_minute, bay_id, end_minute, customer_id)
+                VALUES (?1, ?2, ?3, ?4, ?5, COALESCE(?6, (SELECT MIN(id) FROM bays)),
+                        COALESCE(?7, ?5 + {DEFAULT_DURATION}), ?8)
+            ''', rows)
+            self.conn.execute(f'''
+                INSERT INTO appointments_fts (rowid, customer_name, phone_number, reason, phone_digits)
+                SELECT id, customer_name, phone_number, reason, {_phone_tokens_sql('phone_number')}
+                FROM appointments
+                WHERE id > ?
+            ''', (last_id,))
+            _create_search_triggers(self.conn)
+            self.slots.clear()
+        return cursor.rowcount
+
+    def update_appointment(self, appointment_id: int, name: str, phone: str, reason: str,
+                           date: str, time: int, bay_id: Optional[int] = None,
+                           technician_id: Optional[int] = None,
+                           end_time: Optional[int] = None) -> Optional[Appointment]:
+        """Update one appointment by id; returns it as saved, or None if it no longer exists
+
+        With no end_time it keeps its length, and with no bay_id its bay
+        if that is still free. Raises SlotConflictError if it is moved onto
+        a booked bay or technician.
+        """
+        with self.transaction():
+            old = self.get_appointment(appointment_id)
+            if old is None:
+                return None
+            if end_time is None:
+                end_time = time + (old.end_minute - old.start_minute)
+            old_place = (old.appointment_date, old.start_minute, old.end_minute)
+            if (date, time, end_time) == old_place and bay_id in (None, old.bay_id):
+                bay_id = old.bay_id
+            else:
+                # The week is reloaded without this appointment, so its
+                # current booking does not count against it
+                self._moving_id = appointment_id
+                self.slots.forget_week(date)
+                try:
+                    bay_id = self._choose_bay(date, time, end_time, bay_id, prefer=old.bay_id)
+                finally:
+                    self._moving_id = None
+                    self.slots.forget_week(date)
+            customer_id = self._booking_customer(name, phone)
+            self._execute_write('''
+                UPDATE appointments
+                SET customer_name=?, phone_number=?, reason=?, appointment_date=?, start_minute=?,
+                    end_minute=?, bay_id=?, technician_id=?, customer_id=?
+                WHERE id=?
+            ''', (name, phone, reason, date, time, end_time, bay_id, technician_id, customer_id, appointment_id),
+                date, time)
+            if (date, time, end_time, bay_id) != old_place + (old.bay_id,):
+                self.slots.forget_week(old.appointment_date)
+                self.slots.forget_week(date)
+        return Appointment(appointment_id, name, phone, reason, date, time, bay_id, technician_id, end_time,
+                           customer_id)
+
+    def delete_appointments(self, appointment_ids) -> list[Appointment]:
+        """Delete appointments by id in one transaction; returns the rows deleted"""
+        deleted = []
+        ids = list(appointment_ids)
+        with self.transaction():
+            # Chunked to stay under SQLite's limit on bound parameters
+            for first in range(0, len(ids), 500):
+                chunk = ids[first:first + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                deleted += self._fetch_appointments(
+                    f'SELECT {APPOINTMENT_COLUMNS} FROM appointments WHERE id IN ({placeholders})', chunk
+                )
+                self.conn.execute(f'DELETE FROM appointments WHERE id IN ({placeholders})', chunk)
+            for appt in deleted:
+                self.slots.forget_week(appt.appointment_date)
+        return deleted
+
+    def delete_appointment(self, appointment_id: int) -> Optional[Appointment]:
+        """Delete one appointment by id; returns it, or None if it was already gone"""
+        deleted = self.delete_appointments([appointment_id])
+        return deleted[0] if deleted else None
+
+    def delete_day(self, date: str) -> list[Appointment]:
+        """Delete every appointment on date, e.g. when the shop has to close; returns them"""
+        with self.transaction():
+            deleted = self._fetch_appointments(
+                f'SELECT {APPOINTMENT_COLUMNS} FROM appointments WHERE appointment_date=?', (date,)
+            )
+            self.conn.execute('DELETE FROM appointments WHERE appointment_date=?', (date,))
+            self.slots.forget_week(date)
+        return deleted
+
+    def reschedule_appointments(self, appointment_ids, date: str) -> list[tuple[Appointment, Appointment]]:
+        """Move appointments to date, keeping their times and if possible their bays, all or none
+
+        Returns (old, new) pairs. Raises SlotConflictError, and moves
+        nothing, if any of them would land on a booked slot.
+        """
+        changes = []
+        with self.transaction():
+            for appointment_id in appointment_ids:
+                old = self.get_appointment(appointment_id)
+                if old is None or old.appointment_date == date:
+                    continue
+                new = self.update_appointment(appointment_id, old.customer_name, old.phone_number,
+                                              old.reason, date, old.start_minute,
+                                              technician_id=old.technician_id, end_time=old.end_minute)
+                changes.append((old, new))
+        return changes
+
+    def next_free_slots(self, start_date: str, count: int, earliest: int = 0,
+                        duration: int = DEFAULT_DURATION) -> list[tuple[str, int, int]]:
+        """Up to count (date, start minute, bay id) with a bay free for duration minutes, earliest first
+
+        earliest skips start times before that minute on start_date.
+        """
+        return [(date, minute, self.bays[position].id)
+                for date, minute, position in self.slots.next_free(start_date, count, earliest, duration)]
+
+    def free_gaps(self, date: str, bay_id: int) -> list[tuple[int, int]]:
+        """(start, end) minutes of the free periods in a bay's opening hours on date"""
+        return self.slots.gaps(date, self.bay_position[bay_id])
+
+    def _customer_id(self, name: str, phone: str) -> int:
+        """Id of the customer with this phone, or this exact name and phone if it cannot be normalised
+
+        The customer is added if new. Up to CUSTOMER_CACHE_SIZE ids are kept
+        in a dict, so bulk loads and link_customers query the table mostly
+        for customers they have not seen lately.
+        """
+        name, phone = name.strip(), phone.strip()
+        e164 = normalise_phone(phone)
+        key = e164 or (name, phone)
+        customer_id = self._customer_ids.get(key)
+        if customer_id is None:
+            if e164 is not None:
+                row = self.conn.execute('SELECT id FROM customers WHERE phone_e164 = ?', (e164,)).fetchone()
+            else:
+                row = self.conn.execute('''
+                    SELECT id FROM customers WHERE phone_number = ? AND name = ? AND phone_e164 IS NULL
+                ''', (phone, name)).fetchone()
+            if row is not None:
+                customer_id = row[0]
+            else:
+                customer_id = self.conn.execute(
+                    'INSERT INTO customers (name, phone_number, phone_e164) VALUES (?, ?, ?)', (name, phone, e164)
+                ).lastrowid
+            if len(self._customer_ids) >= CUSTOMER_CACHE_SIZE:
+                self._customer_ids.clear()
+            self._customer_ids[key] = customer_id
+        return customer_id
+
+    def _booking_customer(self, name: str, phone: str) -> int:
+        """_customer_id for a booking made now, keeping the name and phone as typed this time"""
+        customer_id = self._customer_id(name, phone)
+        self.conn.execute('''
+            UPDATE customers SET name = ?, phone_number = ?
+            WHERE id = ? AND (name != ? OR phone_number != ?)
+        ''', (name.strip(), phone.strip(), customer_id, name.strip(), phone.strip()))
+        return customer_id
+
+    def link_customers(self, batch_size: int = CUSTOMER_BATCH_SIZE,
+                       time_budget: float = ARCHIVE_TIME_BUDGET) -> int:
+        """Link appointments that have no customer yet, current ones newest first; returns how many
+
+        Covers appointments from before there were customers, archived ones
+        included, and bookings made by older copies of the app. Repeat
+        visits with the same phone, however it was typed, end up on one
+        customer. Works a batch at a time like archive_old_appointments;
+        call again until it returns 0.
+        """
+        linked = 0
+        deadline = time.perf_counter() + time_budget
+        while True:
+            table, batch = self._unlinked(batch_size)
+            if not batch:
+                return linked
+            with self.transaction():
+                self._link(batch, table)
+            linked += len(batch)
+            if time.perf_counter() >= deadline:
+                return linked
+
+    def _unlinked(self, limit):
+        """(table, rows for _link) of up to limit appointments with no customer, current ones first"""
+        # In the order of idx_appointments_customer, so nothing is sorted
+        rows = self.conn.execute('''
+            SELECT customer_name, phone_number, id FROM appointments
+            WHERE customer_id IS NULL
+            ORDER BY appointment_date DESC, start_minute
+            LIMIT ?
+        ''', (limit,)).fetchall()
+        if rows:
+            return 'main.appointments', rows
+        for month in reversed(self.archive_months()):
+            table = 'archive.appointments_' + month.replace('-', '_')
+            rows = self.conn.execute(f'''
+                SELECT customer_name, phone_number, appointment_date, start_minute, id FROM {table}
+                WHERE customer_id IS NULL
+                LIMIT ?
+            ''', (limit,)).fetchall()
+            if rows:
+                return table, rows
+        return None, []
+
+    def _link(self, rows, table='main.appointments'):
+        """Set customer_id on (name, phone, id) rows of table
+
+        Archive tables are WITHOUT ROWID, so their rows are found by their
+        primary key: (name, phone, date, start minute, id).
+        """
+        key = 'id = ?' if table == 'main.appointments' else 'appointment_date = ? AND start_minute = ? AND id = ?'
+        self.conn.executemany(f'UPDATE {table} SET customer_id = ? WHERE {key}',
+                              [(self._customer_id(name, phone),) + tuple(rest) for name, phone, *rest in rows])
+
+    def get_customer(self, customer_id: int) -> Optional[Customer]:
+        row = self.conn.execute('SELECT id, name, phone_number, phone_e164 FROM customers WHERE id = ?',
+                                (customer_id,)).fetchone()
+        return Customer(*row) if row else None
+
+    def find_customer(self, phone: str, name: str = '') -> Optional[Customer]:
+        """Customer with this phone however it is typed, or with this name and phone if it cannot be normalised"""
+        e164 = normalise_phone(phone)
+        if e164 is not None:
+            row = self.conn.execute('SELECT id, name, phone_number, phone_e164 FROM customers WHERE phone_e164 = ?',
+                                    (e164,)).fetchone()
+        else:
+            row = self.conn.execute('''
+                SELECT id, name, phone_number, phone_e164 FROM customers
+                WHERE phone_number = ? AND name = ? AND phone_e164 IS NULL
+            ''', (phone.strip(), name.strip())).fetchone()
+        return Customer(*row) if row else None
+
+    def customer_names(self) -> list[tuple[int, str, str]]:
+        """(id, name, E.164 phone) of every customer with a readable phone, for CustomerIndex"""
+        return self.conn.execute('SELECT id, name, phone_e164 FROM customers WHERE phone_e164 IS NOT NULL').fetchall()
+
+    def customer_history(self, customer_id: int, limit: int = HISTORY_LIMIT) -> list[Appointment]:
+        """A customer's appointments, archived ones included, newest first
+
+        Each query is a lookup on a customer_id index: idx_appointments_customer
+        for current appointments and one index per archived month.
+        """
+        history = self._fetch_appointments(f'''
+            SELECT {APPOINTMENT_COLUMNS}
+            FROM appointments
+            WHERE customer_id = ?
+            ORDER BY appointment_date DESC, start_minute
+            LIMIT ?
+        ''', (customer_id, limit))
+        for month in reversed(self.archive_months()):
+            if len(history) >= limit:
+                break
+            history += self._fetch_appointments(
+                self._archive_select(month) + '''
+                WHERE a.customer_id = ?
+                ORDER BY a.appointment_date DESC, a.start_minute
+                LIMIT ?
+            ''', (customer_id, limit - len(history)))
+        return history
+
+    def get_appointment(self, appointment_id: int) -> Optional[Appointment]:
+        rows = self._fetch_appointments(f'SELECT {APPOINTMENT_COLUMNS} FROM appointments WHERE id=?',
+                                        (appointment_id,))
+        return rows[0] if rows else None
+
+    def appointments_between(self, start_date: str, end_date: str) -> list[Appointment]:
+        """Appointments with start_date <= appointment_date <= end_date"""
+        return self._fetch_appointments(f'''
+            SELECT {APPOINTMENT_COLUMNS}
+            FROM appointments
+            WHERE appointment_date BETWEEN ? AND ?
+            ORDER BY appointment_date, start_minute
+        ''', (start_date, end_date))
+
+    def iter_appointments(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> Iterator[Appointment]:
+        """Every appointment, or those between the dates, in date and time order
+
+        Rows are read from the cursor as they are consumed, so exporting a
+        large table does not hold it all in memory.
+        """
+        cursor = self.conn.execute(f'''
+            SELECT {APPOINTMENT_COLUMNS}
+            FROM appointments
+            WHERE appointment_date BETWEEN ? AND ?
+            ORDER BY appointment_date, start_minute, id
+        ''', (start_date or '', end_date or '\uffff'))
+        for row in cursor:
+            yield Appointment(*row)
+
+    def recent_appointments(self, limit: int = 1000) -> list[Appointment]:
+        """Most recent appointments, newest date first"""
+        return self._fetch_appointments(f'''
+            SELECT {APPOINTMENT_COLUMNS}
+            FROM appointments
+            ORDER BY appointment_date DESC, start_minute, id
+            LIMIT ?
+        ''', (limit,))
+
+    def appointments_page(self, after: Optional[Appointment] = None, limit: int = 200) -> list[Appointment]:
+        """Next page of the appointment list after the given row
+
+        The list is ordered newest date first, then by time and id, which is
+        the order of idx_appointments_list_order. Pages are found by key
+        rather than OFFSET so fetching a deep page costs the same as the first.
+        """
+        if after is None:
+            return self._fetch_appointments(f'''
+                SELECT {APPOINTMENT_COLUMNS}
+                FROM appointments
+                ORDER BY appointment_date DESC, start_minute, id
+                LIMIT ?
+            ''', (limit,))
+
+        # Rest of the same day first, then the days before it
+        page = self._fetch_appointments(f'''
+            SELECT {APPOINTMENT_COLUMNS}
+            FROM appointments
+            WHERE appointment_date = ? AND (start_minute, id) > (?, ?)
+            ORDER BY start_minute, id
+            LIMIT ?
+        ''', (after.appointment_date, after.start_minute, after.id, limit))
+        if len(page) < limit:
+            page += self._fetch_appointments(f'''
+                SELECT {APPOINTMENT_COLUMNS}
+                FROM appointments
+                WHERE appointment_date < ?
+                ORDER BY appointment_date DESC, start_minute, id
+                LIMIT ?
+            ''', (after.appointment_date, limit - len(page)))
+        return page
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[Appointment]:
+        """Best matches for text in name, phone or reason, at most limit rows
+
+        Ranking every match of a short prefix such as "o" is what makes
+        search slow on a big table, so only the newest SEARCH_CANDIDATES
+        matches are ranked; the index hands those out in rowid order
+        without looking at the rest.
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        return self._fetch_appointments(f'''
+            SELECT {", ".join("a." + column for column in APPOINTMENT_COLUMNS.split(", "))}
+            FROM (
+                SELECT rowid, rank FROM appointments_fts
+                WHERE appointments_fts MATCH ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            ) f
+            JOIN appointments a ON a.id = f.rowid
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, SEARCH_CANDIDATES, limit))
+
+    def reason_counts(self) -> list[tuple[str, int]]:
+        """(reason, times used) for every reason in appointments, saved repair_reasons and the archive"""
+        return self.conn.execute('''
+            SELECT reason, SUM(uses) FROM (
+                SELECT reason, COUNT(*) AS uses FROM appointments GROUP BY reason
+                UNION ALL
+                SELECT reason, uses FROM repair_reasons
+            )
+            GROUP BY reason
+        ''').fetchall()
+
+    def archive_old_appointments(self, cutoff_date: str, batch_size: int = ARCHIVE_BATCH_SIZE,
+                                 time_budget: float = ARCHIVE_TIME_BUDGET) -> list[Appointment]:
+        """Move appointments before cutoff_date to the archive, oldest first; returns them
+
+        Works a batch at a time and starts no new batch once time_budget
+        seconds have passed, so the write lock is never held for long. Call
+        again until it returns nothing. Reasons are kept in repair_reasons
+        for the dropdown.
+        """
+        moved = []
+        deadline = time.perf_counter() + time_budget
+        while True:
+            batch = self._fetch_appointments(f'''
+                SELECT {APPOINTMENT_COLUMNS}
+                FROM appointments
+                WHERE appointment_date < ?
+                ORDER BY appointment_date, start_minute, id
+                LIMIT ?
+            ''', (cutoff_date, batch_size))
+            if batch:
+                self._archive_batch(batch)
+                moved += batch
+            if len(batch) < batch_size or time.perf_counter() >= deadline:
+                return moved
+
+    def _archive_batch(self, batch):
+        ids = [appt.id for appt in batch]
+        placeholders = ', '.join('?' * len(ids))
+        partitions = {}
+        for appt in batch:
+            partitions.setdefault(_archive_partition(appt.appointment_date), []).append(appt.id)
+        with self.transaction():
+            # Archived rows keep their customer, so the history still finds them
+            self._link([(appt.customer_name, appt.phone_number, appt.id)
+                        for appt in batch if appt.customer_id is None])
+            for table in ('archive.reasons', 'main.repair_reasons'):
+                self.conn.execute(f'''
+                    INSERT OR IGNORE INTO {table} (reason)
+                    SELECT DISTINCT reason FROM main.appointments WHERE id IN ({placeholders})
+                ''', ids)
+            self.conn.executemany('UPDATE main.repair_reasons SET uses = uses + ? WHERE reason = ?',
+                                  [(uses, reason) for reason, uses in Counter(a.reason for a in batch).items()])
+            for table, table_ids in partitions.items():
+                _create_archive_partition(self.conn, table)
+                # OR IGNORE: a batch copied before a crash may be copied again
+                self.conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.{table}
+                        (id, customer_name, phone_number, reason_id, appointment_date, start_minute,
+                         end_minute, customer_id, created_at)
+                    SELECT a.id, a.customer_name, a.phone_number, r.id, a.appointment_date, a.start_minute,
+                           a.end_minute, a.customer_id, a.created_at
+                    FROM main.appointments a JOIN archive.reasons r ON r.reason = a.reason
+                    WHERE a.id IN ({', '.join('?' * len(table_ids))})
+                ''', table_ids)
+            self.conn.execute(f'DELETE FROM main.appointments WHERE id IN ({placeholders})', ids)
+            for appt in batch:
+                self.slots.forget_week(appt.appointment_date)
+
+    def archive_months(self) -> list[str]:
+        """Months held in the archive as 'YYYY-MM', oldest first ('undated' last)"""
+        rows = self.conn.execute('''
+            SELECT name FROM archive.sqlite_master
+            WHERE type = 'table' AND name GLOB 'appointments_*'
+            ORDER BY name
+        ''')
+        return [row[0][len('appointments_'):].replace('_', '-') for row in rows]
+
+    def _archive_select(self, month):
+        table = 'appointments_' + month.replace('-', '_')
+        return f'''
+            SELECT a.id, a.customer_name, a.phone_number, r.reason, a.appointment_date, a.start_minute,
+                   NULL, NULL, a.end_minute, a.customer_id
+            FROM archive.{table} a JOIN archive.reasons r ON r.id = a.reason_id
+        '''
+
+    def archived_between(self, start_date: str, end_date: str) -> list[Appointment]:
+        """Archived appointments with start_date <= appointment_date <= end_date
+
+        Only the monthly tables the range overlaps are read.
+        """
+        return list(self.iter_archived(start_date, end_date))
+
+    def iter_archived(self, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> Iterator[Appointment]:
+        """Every archived appointment, or those between the dates, in date and time order
+
+        Read a month at a time from the cursor like iter_appointments, so
+        exporting years of archive does not hold it in memory.
+        """
+        start_date, end_date = start_date or '', end_date or '\uffff'
+        for month in self.archive_months():
+            if start_date[:7] <= month <= end_date[:7]:
+                cursor = self.conn.execute(self._archive_select(month) + '''
+                    WHERE a.appointment_date BETWEEN ? AND ?
+                    ORDER BY a.appointment_date, a.start_minute, a.id
+                ''', (start_date, end_date))
+                for row in cursor:
+                    yield Appointment(*row)
+
+    def search_archive(self, text: str, limit: int = SEARCH_LIMIT) -> list[Appointment]:
+        """Archived appointments whose name, phone or reason contains text, newest month first
+
+        The archive has no full-text index; it is read rarely enough that
+        scanning the monthly tables is fine.
+        """
+        pattern = f"%{text.strip()}%"
+        found = []
+        for month in reversed(self.archive_months()):
+            found += self._fetch_appointments(
+                self._archive_select(month) + '''
+                WHERE a.customer_name LIKE ? OR a.phone_number LIKE ? OR r.reason LIKE ?
+                ORDER BY a.appointment_date DESC, a.start_minute, a.id
+                LIMIT ?
+            ''', (pattern, pattern, pattern, limit - len(found)))
+            if len(found) >= limit:
+                break
+        return found
@@ -0,0 +1,87 @@
+"""First-open-bay lookups and overlap checks with 1, 10 and 40 bays.
+
+Books the next eight weeks about 90% full, spread over the bays, then
+times next_free_slots for one- and three-hour jobs with the weeks warm
+and cold (reloaded from the database), a single booking through
+add_appointment, and the in-memory overlap check for a random
+90-minute job in the busy month, in microseconds.
+
+    python benchmarks/bench_availability.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date as Date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import BUSINESS_HOURS, AppointmentStore  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+BAY_COUNTS = [1, 10, 40]
+WEEKS = 8
+FULL = 0.9
+REPEATS = 20
+OVERLAP_CHECKS = 100_000
+
+
+def booked_rows(store, first_day, rng):
+    bay_ids = [bay.id for bay in store.bays]
+    for offset in range(WEEKS * 7):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() == 6:
+            continue
+        for minute in BUSINESS_HOURS:
+            for bay_id in bay_ids:
+                if rng.random() < FULL:
+                    yield (f'Customer {offset}', '416-555-0000', 'Oil change', day.isoformat(), minute, bay_id)
+
+
+def main():
+    rng = random.Random(16)
+    # Next Monday, so every booking is in the future and checked by the triggers
+    today = Date.today()
+    first_day = today + timedelta(days=7 - today.weekday())
+    print(f"{'bays':>5} {'rows':>7} {'next free':>10} {'3-hour job':>11} {'cold week':>10} {'book':>8}   (best ms)"
+          f"  {'overlap':>8} (mean us)")
+    for bays in BAY_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AppointmentStore(os.path.join(tmp, 'bench.db'))
+            for n in range(2, bays + 1):
+                store.add_bay(f'Bay {n}')
+            store.add_appointments(list(booked_rows(store, first_day, rng)))
+            start = first_day.isoformat()
+            store.next_free_slots(start, 8)  # load the weeks
+
+            next_free = best_ms(lambda: store.next_free_slots(start, 8), REPEATS)
+            long_job = best_ms(lambda: store.next_free_slots(start, 8, duration=180), REPEATS)
+
+            def cold():
+                store.slots.clear()
+                store.next_free_slots(start, 8)
+
+            cold_week = best_ms(cold, REPEATS)
+
+            def book():
+                day, minute, bay_id = store.next_free_slots(start, 1)[0]
+                store.add_appointment('Bench', '416-555-0000', 'Brakes', day, minute, bay_id)
+
+            booking = best_ms(book, REPEATS)
+
+            # Random 90-minute jobs in random bays over the first four weeks
+            month = [(first_day + timedelta(days=offset)).isoformat() for offset in range(28) if offset % 7 != 6]
+            checks = [(rng.choice(month), rng.randrange(BUSINESS_HOURS[0], BUSINESS_HOURS[-1], 15),
+                       rng.randrange(bays)) for _ in range(OVERLAP_CHECKS)]
+            began = time.perf_counter()
+            for day, minute, bay in checks:
+                store.slots.is_free(day, minute, minute + 90, bay)
+            overlap = (time.perf_counter() - began) / OVERLAP_CHECKS * 1e6
+            print(f"{bays:>5} {store.count():>7} {next_free:>10.3f} {long_job:>11.3f} {cold_week:>10.3f} "
+                  f"{booking:>8.3f}  {overlap:>8.2f}")
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""pytest-benchmark suite for the query paths behind the window, on synthetic shops.
+
+Covers what refresh_appointments, update_weekly_view, search_appointments
+and archive_old_appointments run, against shops made by synthetic_shop
+(10k and 100k appointments unless BENCH_ROWS says otherwise). Generated
+databases are kept in BENCH_SHOP_DIR (a temp directory by default) and
+reused for the rest of the day. The list refresh through a real Treeview
+needs a display and is skipped without one; run under xvfb-run to
+include it. Needs pytest-benchmark, and is only run when named:
+
+    pytest benchmarks/bench_queries.py --benchmark-json=before.json
+    BENCH_ROWS=10000,1000000 pytest benchmarks/bench_queries.py --benchmark-autosave
+    pytest benchmarks/bench_queries.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+--benchmark-autosave keeps each run's JSON under .benchmarks/ with the
+commit it ran on, so --benchmark-compare shows regressions between commits.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date as Date, timedelta
+from itertools import count
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from appointment_store import SCHEMA_VERSION, AppointmentStore, archive_path_for  # noqa: E402
+from synthetic_shop import build_shop  # noqa: E402
+from week_cache import week_start_for  # noqa: E402
+
+ROWS = [int(rows) for rows in os.environ.get('BENCH_ROWS', '10000,100000').split(',')]
+SEED = 19
+SHOP_DIR = os.environ.get('BENCH_SHOP_DIR') or os.path.join(tempfile.gettempdir(), 'mechanic_shop_bench')
+
+# Prefixes as typed into the search bar, one per keystroke
+TYPED = ['Sm', 'Smith', 'Priya Pat', 'brak', 'winter t', '416', '416-55', '4165551', 'xyzzy']
+
+# Days kept in the main table when archiving, as in the window
+HOT_DAYS = 14
+
+
+def shop_path(rows):
+    """Database holding the synthetic shop of rows appointments, made if not there yet"""
+    os.makedirs(SHOP_DIR, exist_ok=True)
+    path = os.path.join(SHOP_DIR, f'shop-{rows}-{SEED}-v{SCHEMA_VERSION}-{Date.today()}.db')
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        for leftover in (partial, archive_path_for(partial)):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        build_shop(partial, rows, SEED).close()
+        # Still empty; whoever opens the shop gets an archive of their own
+        os.remove(archive_path_for(partial))
+        os.replace(partial, path)
+    return path
+
+
+@pytest.fixture(scope='module', params=ROWS, ids=lambda rows: f'{rows}rows')
+def shop(request):
+    return request.param, shop_path(request.param)
+
+
+@pytest.fixture(scope='module')
+def store(shop):
+    store = AppointmentStore(shop[1])
+    yield store
+    store.close()
+
+
+@pytest.fixture(autouse=True)
+def rows_info(benchmark, shop):
+    benchmark.extra_info['rows'] = shop[0]
+
+
+def next_monday():
+    today = Date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+@pytest.mark.benchmark(group='refresh_appointments')
+def test_first_page(benchmark, store):
+    page = benchmark(store.appointments_page, None, 200)
+    assert len(page) == 200
+
+
+@pytest.mark.benchmark(group='refresh_appointments')
+def test_deep_page(benchmark, shop, store):
+    # As if scrolled halfway down the list
+    after = store.appointments_page(None, shop[0] // 2)[-1]
+    benchmark(store.appointments_page, after, 200)
+
+
+@pytest.mark.benchmark(group='refresh_appointments')
+def test_list_reload(benchmark, store):
+    tk = pytest.importorskip('tkinter')
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display; run under xvfb-run")
+    from tkinter import ttk
+    from taskmanager import VirtualAppointmentList
+    root.withdraw()
+    tree = ttk.Treeview(root, columns=('Name', 'Phone', 'Reason', 'Date', 'Time'), show='headings')
+    view = VirtualAppointmentList(tree, store)
+    view.reload()
+
+    def reload():
+        view.reload()
+        tree.update_idletasks()
+
+    benchmark(reload)
+    root.destroy()
+
+
+@pytest.mark.benchmark(group='update_weekly_view')
+def test_busy_week(benchmark, store):
+    week_start = next_monday().isoformat()
+    week_end = (next_monday() + timedelta(days=6)).isoformat()
+    week = benchmark(store.appointments_between, week_start, week_end)
+    assert week and week_start_for(week[0].appointment_date) == week_start
+
+
+@pytest.mark.benchmark(group='update_weekly_view')
+def test_cold_week_slots(benchmark, store):
+    start = next_monday().isoformat()
+
+    def cold():
+        store.slots.clear()
+        return store.next_free_slots(start, 8)
+
+    benchmark(cold)
+
+
+@pytest.mark.benchmark(group='update_weekly_view')
+def test_next_free_three_hours(benchmark, store):
+    benchmark(store.next_free_slots, next_monday().isoformat(), 8, 0, 180)
+
+
+@pytest.mark.benchmark(group='search_appointments')
+@pytest.mark.parametrize('typed', TYPED)
+def test_search(benchmark, store, typed):
+    benchmark(store.search, typed)
+
+
+@pytest.mark.benchmark(group='archive_old_appointments')
+def test_archive_call(benchmark, shop, tmp_path):
+    """One call of the window's archiving loop: a batch at a time for up to ARCHIVE_TIME_BUDGET"""
+    cutoff = (Date.today() - timedelta(days=HOT_DAYS)).isoformat()
+    copies = count()
+    stores = []
+
+    def fresh_copy():
+        path = tmp_path / f'copy{next(copies)}.db'
+        shutil.copyfile(shop[1], path)
+        stores.append(AppointmentStore(str(path)))
+        return (stores[-1], cutoff), {}
+
+    def archive(store, cutoff):
+        return len(store.archive_old_appointments(cutoff))
+
+    moved = benchmark.pedantic(archive, setup=fresh_copy, rounds=5)
+    benchmark.extra_info['moved'] = moved
+    for copy in stores:
+        copy.close()
+    assert moved
@@ -0,0 +1,93 @@
+"""Appointment list refresh latency at 1k, 10k and 100k appointments.
+
+Runs on shops made by synthetic_shop. Compares the old full rebuild (delete every row, insert the newest 1000)
+with the paged list's first load, no-op reload, single-row upsert and
+next-page fetch. Needs a display; on a headless machine run it under
+xvfb-run:
+
+    xvfb-run python benchmarks/bench_refresh.py
+"""
+import os
+import random
+import sys
+import tempfile
+import tkinter as tk
+from datetime import timedelta
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_shop import REASONS, build_shop, customer, shop_size  # noqa: E402
+from taskmanager import VirtualAppointmentList  # noqa: E402
+from timing import best_ms  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def bench_size(root, count):
+    rng = random.Random(count)
+    first, last, _ = shop_size(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_shop(os.path.join(tmp, 'bench.db'), count, seed=count)
+
+        tree = ttk.Treeview(root, columns=('Name', 'Phone', 'Reason', 'Date', 'Time'), show='headings')
+
+        def full_rebuild():
+            for item in tree.get_children():
+                tree.delete(item)
+            for appt in store.recent_appointments(1000):
+                tree.insert('', tk.END, values=appt[1:])
+            tree.update_idletasks()
+
+        results = {'full rebuild (1000 rows)': best_ms(full_rebuild)}
+        tree.delete(*tree.get_children())
+
+        view = VirtualAppointmentList(tree, store)
+
+        def first_load():
+            view._clear()
+            view.reload()
+            tree.update_idletasks()
+
+        results['paged first load'] = best_ms(first_load)
+
+        def reload():
+            view.reload()
+            tree.update_idletasks()
+
+        results['paged reload, no changes'] = best_ms(reload)
+
+        def upsert():
+            # SlotIndex refuses clashes on past dates too, so book the first free slot from a random day
+            name, phone = customer(rng.randrange(count))
+            day = first + timedelta(days=rng.randrange((last - first).days))
+            date, minute, bay_id = store.next_free_slots(day.isoformat(), 1)[0]
+            appointment_id = store.add_appointment(name, phone, rng.choice(REASONS)[0], date, minute, bay_id)
+            view.upsert(store.get_appointment(appointment_id))
+            tree.update_idletasks()
+
+        results['single upsert'] = best_ms(upsert)
+
+        def next_page():
+            view.load_more()
+            tree.update_idletasks()
+
+        results['next page'] = best_ms(next_page)
+
+        tree.destroy()
+        store.close()
+    return results
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+    for count in SIZES:
+        print(f'{count:>7} appointments')
+        for name, ms in bench_size(root, count).items():
+            print(f'    {name:<28} {ms:8.2f} ms')
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
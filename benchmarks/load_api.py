@@ -0,0 +1,187 @@
+"""Requests per second the HTTP API answers for a shop full of tablets.
+
+Starts the server in its own process on a fresh database booked about
+70% full for the next few weeks, unless --url points at one already
+running. Each client holds one keep-alive connection and sends a mix
+weighted like bay tablets polling their week with If-None-Match, plus
+searches, availability lookups and bookings. Reports requests per
+second overall and p50/p95 latency and status codes per kind.
+
+    python benchmarks/load_api.py [--clients 20] [--seconds 10] [--wal]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date as Date, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server  # noqa: E402
+from appointment_store import BUSINESS_HOURS, AppointmentStore  # noqa: E402
+
+BAYS = 6
+WEEKS = 4
+FULL = 0.7
+
+# Share of each kind of request
+MIX = {'poll week': 74, 'load week': 8, 'search': 10, 'availability': 7, 'book': 1}
+
+SEARCHES = ['Smith', 'oil', 'brake pa', '416-555', 'Chen', 'winter', 'xyzzy']
+
+
+def seed(db_path, wal, first_day, rng):
+    store = AppointmentStore(db_path, wal=wal)
+    for n in range(2, BAYS + 1):
+        store.add_bay(f'Bay {n}')
+    rows = []
+    for offset in range(WEEKS * 7):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() == 6:
+            continue
+        for minute in BUSINESS_HOURS:
+            for bay in store.bays:
+                if rng.random() < FULL:
+                    rows.append((f'Customer {rng.choice(["Smith", "Chen", "Patel", "Roy"])} {offset}',
+                                 f'416-555-{rng.randint(0, 9999):04d}',
+                                 rng.choice(['Oil change', 'Brake pads', 'Winter tires', 'Alignment']),
+                                 day.isoformat(), minute, bay.id))
+    store.add_appointments(rows)
+    store.close()
+    return len(rows)
+
+
+def run_server(db_path, wal, port):
+    api_server.serve(db_path, port=port, wal=wal)
+
+
+async def request(reader, writer, host, method, path, body=None, headers=None):
+    """(status, response headers, body bytes) over an open keep-alive connection"""
+    data = json.dumps(body).encode() if body is not None else b''
+    head = [f'{method} {path} HTTP/1.1', f'Host: {host}', f'Content-Length: {len(data)}']
+    head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + data)
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    received = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name:
+            received[name.strip().lower()] = value.strip()
+    length = int(received.get('content-length', 0))
+    return status, received, await reader.readexactly(length) if length else b''
+
+
+async def client(host, port, first_day, seconds, rng, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    kinds = list(MIX)
+    weights = list(MIX.values())
+    etags = {}
+    days = [(first_day + timedelta(days=offset)).isoformat() for offset in range(WEEKS * 7) if offset % 7 != 6]
+    weeks = [f'/weeks/{(first_day + timedelta(weeks=n)).isoformat()}' for n in range(WEEKS)]
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        day = rng.choice(days)
+        method, body, headers = 'GET', None, None
+        if kind in ('poll week', 'load week'):
+            path = rng.choice(weeks)
+            if kind == 'poll week' and path in etags:
+                headers = {'If-None-Match': etags[path]}
+        elif kind == 'search':
+            path = f'/search?q={rng.choice(SEARCHES).replace(" ", "+")}'
+        elif kind == 'availability':
+            path = f'/availability?from={day}&count=8&duration={rng.choice([60, 90, 180])}'
+        else:
+            method, path = 'POST', '/appointments'
+            body = {'customer_name': 'Load Test', 'phone_number': '416-555-0000', 'reason': 'Oil change',
+                    'appointment_date': day, 'start_minute': rng.choice(BUSINESS_HOURS)}
+        start = time.perf_counter()
+        status, received, _ = await request(reader, writer, host, method, path, body, headers)
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+        statuses[kind][status] += 1
+        if 'etag' in received:
+            etags[path] = received['etag']
+    writer.close()
+
+
+async def load(host, port, first_day, clients, seconds, seed_value):
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    began = time.perf_counter()
+    await asyncio.gather(*(client(host, port, first_day, seconds, random.Random(seed_value + n),
+                                  latencies, statuses) for n in range(clients)))
+    return latencies, statuses, time.perf_counter() - began
+
+
+async def wait_for_server(host, port, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20, help="concurrent keep-alive connections")
+    parser.add_argument('--seconds', type=float, default=10, help="how long to keep sending")
+    parser.add_argument('--url', help="server already running, e.g. http://127.0.0.1:8080")
+    parser.add_argument('--port', type=int, default=8765, help="port for the server this script starts")
+    parser.add_argument('--wal', action='store_true', help="open the database in WAL mode")
+    args = parser.parse_args()
+
+    rng = random.Random(18)
+    today = Date.today()
+    first_day = today + timedelta(days=7 - today.weekday())
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = '127.0.0.1', args.port
+            db_path = os.path.join(tmp, 'load.db')
+            rows = seed(db_path, args.wal, first_day, rng)
+            print(f"seeded {rows} appointments in {BAYS} bays over {WEEKS} weeks")
+            server = multiprocessing.Process(target=run_server, args=(db_path, args.wal, port), daemon=True)
+            server.start()
+        try:
+            asyncio.run(wait_for_server(host, port))
+            latencies, statuses, elapsed = asyncio.run(load(host, port, first_day, args.clients, args.seconds, 18))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.join()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{args.clients} clients, {elapsed:.1f} s: {total} requests, {total / elapsed:.0f} req/s")
+    print(f"{'kind':<14} {'count':>7} {'p50 ms':>8} {'p95 ms':>8}  statuses")
+    for kind in MIX:
+        samples = latencies.get(kind)
+        if not samples:
+            continue
+        if len(samples) > 1:
+            cuts = statistics.quantiles(samples, n=20, method='inclusive')
+            p50, p95 = cuts[9], cuts[18]
+        else:
+            p50 = p95 = samples[0]
+        codes = ' '.join(f"{status}:{count}" for status, count in sorted(statuses[kind].items()))
+        print(f"{kind:<14} {len(samples):>7} {p50:>8.2f} {p95:>8.2f}  {codes}")
+
+
+if __name__ == '__main__':
+    main()
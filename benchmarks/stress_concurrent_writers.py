@@ -0,0 +1,110 @@
+"""Several processes writing to one appointments database at once.
+
+Each writer process inserts appointments in small transactions while a
+reader process keeps running week queries, the way the front desk and
+the service bay share mechanic_appointments.db. Reports throughput,
+"database is locked" failures and checks that every committed row is
+there at the end.
+
+    python benchmarks/stress_concurrent_writers.py --processes 4 --writes 500 --wal
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import AppointmentStore  # noqa: E402
+
+
+def writer(db_path, wal, worker, writes, batch, results):
+    store = AppointmentStore(db_path, wal=wal)
+    committed = locked = 0
+    start = time.perf_counter()
+    for first in range(0, writes, batch):
+        rows = [(f'Writer {worker} #{n}', f'416-555-{n:04d}', 'Stress test',
+                 f'2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}', 9 * 60)
+                for n in range(first, min(first + batch, writes))]
+        try:
+            store.add_appointments(rows)
+            committed += len(rows)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put(('writer', worker, committed, locked, time.perf_counter() - start))
+    store.close()
+
+
+def reader(db_path, wal, stop, results):
+    store = AppointmentStore(db_path, wal=wal)
+    queries = locked = 0
+    versions = set()
+    while not stop.is_set():
+        try:
+            store.appointments_between('2025-03-03', '2025-03-08')
+            versions.add(store.data_version())
+            queries += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put(('reader', 0, queries, locked, len(versions)))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4, help="writer processes")
+    parser.add_argument('--writes', type=int, default=500, help="appointments per writer")
+    parser.add_argument('--batch', type=int, default=5, help="appointments per transaction")
+    parser.add_argument('--wal', action='store_true', help="open the database in WAL mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stress.db')
+        AppointmentStore(db_path, wal=args.wal).close()
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        read_proc = multiprocessing.Process(target=reader, args=(db_path, args.wal, stop, results))
+        writers = [multiprocessing.Process(target=writer,
+                                           args=(db_path, args.wal, n, args.writes, args.batch, results))
+                   for n in range(args.processes)]
+
+        start = time.perf_counter()
+        read_proc.start()
+        for proc in writers:
+            proc.start()
+        reports = [results.get() for _ in writers]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        reports.append(results.get())
+        for proc in writers + [read_proc]:
+            proc.join()
+
+        store = AppointmentStore(db_path)
+        final_count = store.count()
+        store.close()
+
+    committed = sum(r[2] for r in reports if r[0] == 'writer')
+    print(f"journal mode: {'WAL' if args.wal else 'rollback'}, {args.processes} writers, "
+          f"{args.writes} rows each in batches of {args.batch}")
+    for kind, worker, done, locked, extra in sorted(reports):
+        if kind == 'writer':
+            print(f"  writer {worker}: {done} rows in {extra:.2f} s, {locked} locked failures")
+        else:
+            print(f"  reader: {done} week queries, {locked} locked failures, "
+                  f"{extra} data_version values seen")
+    print(f"  {committed / elapsed:.0f} rows/s overall")
+    print(f"  rows in database: {final_count} (committed {committed})")
+    if final_count != committed:
+        sys.exit("row count does not match committed writes")
+
+
+if __name__ == '__main__':
+    main()
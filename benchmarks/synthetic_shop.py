@@ -0,0 +1,200 @@
+"""Seeded synthetic shops for benchmarks, from 10k to 10M appointments.
+
+A shop gets years of history up to a few weeks ahead, busier in recent
+years as it grew. Reasons are skewed the way a real shop's are (mostly
+oil changes and tires, winter tires in the autumn), each with a typical
+length. Customers come back: a small share of them make most of the
+visits, always with the same name and phone number. Each bay's day is
+packed without overlaps, and enough bays are added for the rows asked
+for, so the biggest sizes look more like a chain than a corner garage.
+
+History is laid out relative to today, so the upcoming weeks are
+always booked; the same rows and seed give the same database on the
+same day.
+
+    python benchmarks/synthetic_shop.py shop.db --rows 1000000 [--seed 19] [--wal]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date as Date, timedelta
+from itertools import accumulate, islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import BUSINESS_HOURS, CLOSING_MINUTE, AppointmentStore  # noqa: E402
+
+YEARS = 5
+WEEKS_AHEAD = 4
+
+# Appointments in one bay on an average day, which sets how many bays a size needs
+JOBS_PER_BAY_DAY = 5
+
+# Visits per customer on average; the most loyal make far more
+VISITS_PER_CUSTOMER = 5
+
+# Higher means more of the visits come from the most regular customers
+LOYALTY_SKEW = 2.5
+
+# Rows per add_appointments transaction
+CHUNK_SIZE = 50_000
+
+# reason, relative frequency, lengths in minutes it takes
+REASONS = [
+    ('Oil change', 30, [30]),
+    ('Tire rotation', 12, [30, 60]),
+    ('Brake pads replaced', 9, [90]),
+    ('Safety inspection', 7, [60]),
+    ('Check engine light', 6, [60, 90]),
+    ('Battery replacement', 5, [30]),
+    ('Alignment', 4, [60]),
+    ('AC recharge', 3, [60]),
+    ('Transmission fluid flush', 2, [90, 120]),
+    ('Timing belt', 1, [180, 240]),
+    ('Suspension work', 1, [120, 180]),
+    ('Engine diagnostics', 1, [120]),
+]
+SEASONAL_REASONS = {
+    'Winter tires installed': ({10, 11, 12}, 25, [60]),
+    'Winter tires removed': ({4, 5}, 25, [60]),
+}
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'Samir', 'Sadaf', 'Wei', 'Priya', 'Mohammed', 'Olivia', 'Lucas', 'Emma',
+               'Noah', 'Chloe', 'Arjun', 'Fatima', 'Liam', 'Sofia', 'Daniel', 'Aisha', 'Ethan', 'Mei']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Bani',
+              'Chen', 'Patel', 'Singh', 'Nguyen', 'Tremblay', 'Roy', 'Gagnon', 'Wilson', 'Martin',
+              'Lee', 'Khan', 'Côté', 'Bouchard', 'Ali', 'Wong', 'Campbell', 'Anderson', 'Taylor']
+AREA_CODES = ['416', '647', '905']
+
+# Distinct phone numbers customer() can hand out: area code, exchange 200-999, line
+PHONE_SPACE = len(AREA_CODES) * 800 * 10_000
+
+
+def customer(index):
+    """(name, phone) of customer number index, the same every time
+
+    Phones are a permutation of PHONE_SPACE, so no two customers share one.
+    """
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES) + index * 7) % len(LAST_NAMES)]
+    number = (index * 7919 + 104_729) % PHONE_SPACE
+    area, rest = AREA_CODES[number % len(AREA_CODES)], number // len(AREA_CODES)
+    return f'{first} {last}', f'{area}-{200 + rest % 800}-{rest // 800:04d}'
+
+
+def _reason_table(month):
+    """(reasons, cumulative weights) for a month of the year"""
+    reasons = [(reason, lengths) for reason, _, lengths in REASONS]
+    weights = [weight for _, weight, _ in REASONS]
+    for reason, (months, weight, lengths) in SEASONAL_REASONS.items():
+        if month in months:
+            reasons.append((reason, lengths))
+            weights.append(weight)
+    return reasons, list(accumulate(weights))
+
+
+def working_days(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() != 6:
+            yield day
+        day += timedelta(days=1)
+
+
+def shop_size(rows, years=YEARS):
+    """(first day, last day, bays) for a shop of rows appointments"""
+    last = Date.today() + timedelta(weeks=WEEKS_AHEAD)
+    first = last - timedelta(days=round(365.25 * years))
+    days = sum(1 for _ in working_days(first, last))
+    return first, last, max(1, math.ceil(rows / days / JOBS_PER_BAY_DAY))
+
+
+def _bay_day(rng, jobs, table):
+    """(start, end, reason) for up to jobs appointments packed into one bay's day, in order"""
+    reasons, cum_weights = table
+    picked = []
+    booked = 0
+    for reason, lengths in rng.choices(reasons, cum_weights=cum_weights, k=jobs):
+        length = rng.choice(lengths)
+        if booked + length > CLOSING_MINUTE - BUSINESS_HOURS[0]:
+            break
+        picked.append((reason, length))
+        booked += length
+    # Spread the idle half hours between the jobs
+    idle = (CLOSING_MINUTE - BUSINESS_HOURS[0] - booked) // 30
+    gaps = sorted(rng.randint(0, idle) for _ in picked)
+    cursor, previous = BUSINESS_HOURS[0], 0
+    for (reason, length), gap in zip(picked, gaps):
+        cursor += (gap - previous) * 30
+        previous = gap
+        yield cursor, cursor + length, reason
+        cursor += length
+
+
+def synthetic_appointments(rows, seed, bay_ids, first, last):
+    """(name, phone, reason, date, start, bay id, end) rows for add_appointments, oldest first
+
+    Stops at rows, running past last if the random days came out quiet.
+    """
+    rng = random.Random(seed)
+    customers = max(50, rows // VISITS_PER_CUSTOMER)
+    span = (last - first).days or 1
+    per_bay = rows / sum(1 for _ in working_days(first, last)) / len(bay_ids)
+    tables = {month: _reason_table(month) for month in range(1, 13)}
+    made = 0
+    day = first
+    while made < rows:
+        if day.weekday() != 6:
+            # A third as busy at the start of the history as at the end
+            target = per_bay * (0.5 + min((day - first).days / span, 1))
+            date = day.isoformat()
+            for bay_id in bay_ids:
+                jobs = int(target) + (rng.random() < target % 1)
+                for start, end, reason in _bay_day(rng, jobs, tables[day.month]):
+                    name, phone = customer(int(customers * rng.random() ** LOYALTY_SKEW))
+                    yield name, phone, reason, date, start, bay_id, end
+                    made += 1
+                    if made == rows:
+                        return
+        day += timedelta(days=1)
+
+
+def build_shop(db_path, rows, seed=19, years=YEARS, wal=False):
+    """Create db_path holding a synthetic shop of rows appointments; returns its AppointmentStore"""
+    first, last, bays = shop_size(rows, years)
+    store = AppointmentStore(db_path, wal=wal)
+    for n in range(len(store.bays) + 1, bays + 1):
+        store.add_bay(f'Bay {n}')
+    appointments = synthetic_appointments(rows, seed, [bay.id for bay in store.bays], first, last)
+    while chunk := list(islice(appointments, CHUNK_SIZE)):
+        store.add_appointments(chunk)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="database to create; must not exist yet")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=19)
+    parser.add_argument('--years', type=float, default=YEARS, help="length of the history")
+    parser.add_argument('--wal', action='store_true', help="open the database in WAL mode")
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        sys.exit(f"{args.path} already exists")
+
+    start = time.perf_counter()
+    store = build_shop(args.path, args.rows, args.seed, args.years, args.wal)
+    first, last = store.conn.execute(
+        'SELECT MIN(appointment_date), MAX(appointment_date) FROM appointments').fetchone()
+    customers = store.conn.execute('SELECT COUNT(DISTINCT phone_number) FROM appointments').fetchone()[0]
+    print(f"{store.count()} appointments from {first} to {last} in {len(store.bays)} bays, "
+          f"{customers} customers, {time.perf_counter() - start:.1f} s")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
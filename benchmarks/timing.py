@@ -0,0 +1,12 @@
+"""Timing helper shared by the benchmark scripts."""
+import time
+
+
+def best_ms(func, repeats=5):
+    """Best wall time of func() over repeats calls, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
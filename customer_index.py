@@ -0,0 +1,66 @@
+"""Phone numbers in E.164 form and an in-memory customer lookup by phone.
+
+Phones are typed every which way ("(416) 555-0199", "416.555.0199 x12",
+"+1 416 555 0199"), so they are compared in E.164 form: a plus sign,
+the country code and the number, e.g. +14165550199. Numbers typed
+without a country code are taken to be local to the shop.
+"""
+import re
+
+# Country code of numbers typed without one; 1 is North America
+DEFAULT_COUNTRY_CODE = '1'
+
+_EXTENSION = re.compile(r'\s*(?:ext\.?|extension|x|#)\s*\d+\s*$', re.IGNORECASE)
+
+
+def normalise_phone(text, country_code=DEFAULT_COUNTRY_CODE):
+    """E.164 form of a phone number as typed, or None if it cannot be one
+
+    Extensions are dropped. North American numbers need all ten digits;
+    elsewhere a leading trunk 0 is dropped.
+    """
+    text = _EXTENSION.sub('', text or '').strip()
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('+'):
+        number = digits
+    elif digits.startswith('011'):  # dialled from North America
+        number = digits[3:]
+    elif digits.startswith('00'):  # dialled from most other countries
+        number = digits[2:]
+    elif country_code == '1':
+        number = digits if len(digits) == 11 and digits[0] == '1' else '1' + digits
+    else:
+        number = country_code + digits.lstrip('0')
+    if number.startswith('1') and (len(number) != 11 or number[1] in '01'):
+        return None
+    if not 8 <= len(number) <= 15 or number[0] == '0':
+        return None
+    return '+' + number
+
+
+class CustomerIndex:
+    """E.164 phone -> (customer id, name), for filling in the name as a phone is typed"""
+
+    def __init__(self, customers=()):
+        self.by_phone = {}
+        self.load(customers)
+
+    def load(self, customers):
+        """Replace the contents with (id, name, phone) rows, e.g. from AppointmentStore.customer_names"""
+        self.by_phone = {}
+        for customer_id, name, phone in customers:
+            self.add(customer_id, name, phone)
+
+    def add(self, customer_id, name, phone):
+        """Remember or update a customer; phones that cannot be normalised are ignored"""
+        key = normalise_phone(phone)
+        if key is not None and customer_id is not None:
+            self.by_phone[key] = (customer_id, name)
+
+    def lookup(self, phone):
+        """(customer id, name) for a phone as typed, or None if it is not a known customer's"""
+        key = normalise_phone(phone)
+        return self.by_phone.get(key) if key is not None else None
+
+    def __len__(self):
+        return len(self.by_phone)
@@ -0,0 +1,192 @@
+"""Database work on a dedicated thread, with results handed back to Tk.
+
+The executor's thread owns its AppointmentStore connection. Jobs are
+functions called as fn(store, *args) and submit() returns a
+concurrent.futures.Future. Writes that are queued back to back are
+committed together in one transaction, each inside its own savepoint so
+one failing write does not undo the others.
+
+ReaderPool runs read-only jobs the same way on several threads, each
+with its own connection, so slow reads such as searches do not queue
+behind each other or behind the writes.
+
+Every job is timed as db.<function name>, and the time it spent queued
+behind other jobs as db.queue_wait.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+
+from instrumentation import timed, timings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _job_name(fn):
+    return 'db.' + getattr(fn, '__qualname__', repr(fn)).replace('.<locals>', '')
+
+
+def _run_job(store, job):
+    future, fn, args, _, submitted = job
+    if not future.set_running_or_notify_cancel():
+        return
+    timings.record('db.queue_wait', (perf_counter() - submitted) * 1000)
+    try:
+        with timed(_job_name(fn)):
+            result = fn(store, *args)
+        future.set_result(result)
+    except BaseException as e:
+        future.set_exception(e)
+
+
+class DBExecutor:
+    """Single thread that runs every job against one AppointmentStore"""
+
+    def __init__(self, open_store):
+        self._open_store = open_store
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-executor', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, write=False):
+        """Run fn(store, *args) on the database thread"""
+        future = Future()
+        self._queue.put((future, fn, args, write, perf_counter()))
+        return future
+
+    def shutdown(self, wait=True):
+        """Finish queued jobs, then close the connection"""
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        store = self._open_store()
+        held = None
+        while True:
+            job = held if held is not None else self._queue.get()
+            held = None
+            if job is _STOP:
+                break
+            if not job[3]:
+                _run_job(store, job)
+                continue
+
+            # Merge every write already waiting behind this one
+            writes = [job]
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP or not job[3]:
+                    held = job
+                    break
+                writes.append(job)
+            self._run_writes(store, writes)
+        store.close()
+
+    def _run_writes(self, store, writes):
+        outcomes = []
+        try:
+            with timed('db.write_transaction'), store.transaction():
+                for future, fn, args, _, submitted in writes:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    timings.record('db.queue_wait', (perf_counter() - submitted) * 1000)
+                    try:
+                        with timed(_job_name(fn)), store.transaction():
+                            outcomes.append((future, fn(store, *args), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # The transaction could not begin or commit, so none of the writes
+            # took effect; fail them all, including any not yet started
+            for future, *_ in writes:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+class ReaderPool:
+    """Threads that each own an AppointmentStore connection and take read jobs from one queue
+
+    Jobs must not write: SlotIndex and the other in-memory state of a
+    pooled store do not see writes made through the DBExecutor.
+    """
+
+    def __init__(self, open_store, size=4):
+        self._open_store = open_store
+        self._queue = queue.Queue()
+        self._threads = [threading.Thread(target=self._run, name=f'db-reader-{n}', daemon=True)
+                         for n in range(size)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args):
+        """Run fn(store, *args) on the first free reader thread"""
+        future = Future()
+        self._queue.put((future, fn, args, False, perf_counter()))
+        return future
+
+    def shutdown(self, wait=True):
+        """Finish queued jobs, then close the connections"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _run(self):
+        store = self._open_store()
+        while (job := self._queue.get()) is not _STOP:
+            _run_job(store, job)
+        store.close()
+
+
+class TkDispatcher:
+    """Runs callbacks for finished futures on the Tk main loop
+
+    Tk must only be touched from its own thread, so finished futures are
+    queued and a root.after poll picks them up.
+    """
+
+    def __init__(self, root, interval=15):
+        self.root = root
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._poll()
+
+    def then(self, future, on_success=None, on_error=None):
+        """Call on_success(result) or on_error(exception) on the Tk thread when future is done"""
+        future.add_done_callback(lambda done: self._queue.put((done, on_success, on_error)))
+
+    def _poll(self):
+        while True:
+            try:
+                future, on_success, on_error = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled():
+                continue
+            error = future.exception()
+            try:
+                if error is None:
+                    if on_success is not None:
+                        on_success(future.result())
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    logger.error("Database error: %s", error, exc_info=error)
+            except Exception:
+                logger.exception("Error in database callback")
+        self.root.after(self.interval, self._poll)
@@ -0,0 +1,114 @@
+"""Latency timing for database jobs and view refreshes.
+
+    with timed('view.render_cells'):
+        ...
+
+Each name keeps a rolling window of its most recent durations, from which
+count, percentiles and a histogram are worked out on demand. Every timing
+is logged at DEBUG and anything slower than SLOW_MS at WARNING, so turning
+on debug logging on a shop PC shows where the time goes.
+"""
+import json
+import logging
+import statistics
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Durations kept per name
+WINDOW = 1000
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket
+# holds everything slower
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+# Timings at or above this are logged as warnings
+SLOW_MS = 200
+
+
+class Timings:
+    """Rolling latency samples by name, safe to record from any thread"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, ms):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = 0
+            samples.append(ms)
+            self.totals[name] += 1
+        if ms >= SLOW_MS:
+            logger.warning("%s took %.1f ms", name, ms)
+        else:
+            logger.debug("%s took %.2f ms", name, ms)
+
+    @contextmanager
+    def timed(self, name):
+        """Record how long the block takes under name, even if it raises"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (perf_counter() - start) * 1000)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+
+    def snapshot(self):
+        """name -> summary of its recent samples, slowest p95 first"""
+        with self.lock:
+            recent = {name: list(samples) for name, samples in self.samples.items()}
+            totals = dict(self.totals)
+        summaries = {}
+        for name, samples in recent.items():
+            buckets = [0] * (len(BUCKETS_MS) + 1)
+            for ms in samples:
+                buckets[next((i for i, bound in enumerate(BUCKETS_MS) if ms < bound), len(BUCKETS_MS))] += 1
+            if len(samples) > 1:
+                cuts = statistics.quantiles(samples, n=20, method='inclusive')
+                p50, p95 = cuts[9], cuts[18]
+            else:
+                p50 = p95 = samples[0]
+            summaries[name] = {
+                'count': totals[name],
+                'window': len(samples),
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'max_ms': max(samples),
+                'histogram': dict(zip([f'<{bound}ms' for bound in BUCKETS_MS] + [f'>={BUCKETS_MS[-1]}ms'],
+                                      buckets)),
+            }
+        return dict(sorted(summaries.items(), key=lambda item: -item[1]['p95_ms']))
+
+    def report(self):
+        """Plain-text table of snapshot(), for the diagnostics window"""
+        lines = [f"{'name':<44} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  histogram"]
+        for name, summary in self.snapshot().items():
+            bars = ' '.join(f"{bucket}:{count}" for bucket, count in summary['histogram'].items() if count)
+            lines.append(f"{name:<44} {summary['count']:>7} {summary['p50_ms']:>8.2f} "
+                         f"{summary['p95_ms']:>8.2f} {summary['max_ms']:>8.2f}  {bars}")
+        return '\n'.join(lines)
+
+    def dump(self, path, extra=None):
+        """Write snapshot() and any extra sections to path as JSON"""
+        data = {'timings': self.snapshot()}
+        data.update(extra or {})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        logger.info("Wrote timings to %s", path)
+
+
+# Shared by the whole application
+timings = Timings()
+timed = timings.timed
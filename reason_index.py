@@ -0,0 +1,135 @@
+"""In-memory autocomplete index for repair reasons.
+
+Reasons are kept in a sorted list of normalised keys so every reason
+starting with what the user typed is one bisect range, plus a sorted list
+of the words in them so typing any word of a reason finds it too. Each
+reason carries a usage count and suggestions come most used first. When
+nothing matches, typos are forgiven by comparing the typed word against
+known words with the same first letter.
+"""
+import heapq
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+
+# Suggestions shown in the dropdown
+SUGGESTIONS = 20
+
+# How close a misspelt word must be to a known one (difflib ratio)
+FUZZY_CUTOFF = 0.75
+
+
+def normalise(reason):
+    """Key for a reason: case and repeated or trailing spaces ignored"""
+    return ' '.join(reason.split()).casefold()
+
+
+class ReasonIndex:
+    def __init__(self, counts=()):
+        """counts are (reason, times used) pairs, e.g. from AppointmentStore.reason_counts"""
+        self.keys = []      # normalised reasons, sorted
+        self.words = []     # distinct words of all reasons, sorted
+        self.keys_with_word = {}  # word -> keys containing it
+        self.text = {}      # key -> reason as first written
+        self.count = {}     # key -> times used
+        self.top = []       # the SUGGESTIONS most used keys, shown before anything is typed
+        self.load(counts)
+
+    def load(self, counts):
+        """Replace the index contents"""
+        self.text = {}
+        self.count = {}
+        self.keys_with_word = {}
+        for reason, used in counts:
+            key = normalise(reason)
+            if not key:
+                continue
+            self.text.setdefault(key, ' '.join(reason.split()))
+            self.count[key] = self.count.get(key, 0) + used
+        for key in self.text:
+            for word in key.split():
+                self.keys_with_word.setdefault(word, set()).add(key)
+        self.keys = sorted(self.text)
+        self.words = sorted(self.keys_with_word)
+        self.top = self._most_used(self.keys, SUGGESTIONS)
+
+    def add(self, reason, used=1):
+        """Count a use of reason, adding it if it is new"""
+        key = normalise(reason)
+        if not key:
+            return
+        if key not in self.text:
+            self.text[key] = ' '.join(reason.split())
+            self.count[key] = 0
+            insort(self.keys, key)
+            for word in key.split():
+                if word not in self.keys_with_word:
+                    self.keys_with_word[word] = set()
+                    insort(self.words, word)
+                self.keys_with_word[word].add(key)
+        self.count[key] += used
+        # Counts only grow, so only the reason just used can join the top
+        if len(self.top) < SUGGESTIONS or key in self.top or self.count[key] >= self.count[self.top[-1]]:
+            self.top = self._most_used(set(self.top) | {key}, SUGGESTIONS)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _prefix_range(sorted_list, prefix):
+        start = bisect_left(sorted_list, prefix)
+        # Everything starting with prefix sorts below prefix + the highest character
+        return sorted_list[start:bisect_left(sorted_list, prefix + '\U0010ffff', start)]
+
+    def _with_word_starting(self, prefix):
+        keys = set()
+        for word in self._prefix_range(self.words, prefix):
+            keys |= self.keys_with_word[word]
+        return keys
+
+    def _fuzzy(self, typed_word):
+        """Keys with a word starting like typed_word, allowing a typo or two
+
+        Only words with the same first letter are compared, which keeps
+        this quick however many reasons there are.
+        """
+        found = set()
+        if len(typed_word) < 3:
+            return found
+        matcher = SequenceMatcher(b=typed_word, autojunk=False)
+        for word in self._prefix_range(self.words, typed_word[0]):
+            # Compare with as much of the word as has been typed, plus one
+            # letter in case one was left out
+            matcher.set_seq1(word[:len(typed_word) + 1])
+            if matcher.quick_ratio() >= FUZZY_CUTOFF and matcher.ratio() >= FUZZY_CUTOFF:
+                found |= self.keys_with_word[word]
+        return found
+
+    def _most_used(self, keys, limit):
+        return heapq.nlargest(limit, keys, key=lambda key: (self.count[key], -len(key)))
+
+    def suggest(self, typed, limit=SUGGESTIONS):
+        """Reasons matching what has been typed so far, most used first
+
+        Reasons starting with the text come first, then reasons with words
+        starting with each typed word, then near misses of the last word.
+        """
+        typed = normalise(typed)
+        if not typed:
+            top = self.top if limit <= SUGGESTIONS else self._most_used(self.keys, limit)
+            return [self.text[key] for key in top[:limit]]
+
+        results = self._most_used(self._prefix_range(self.keys, typed), limit)
+        if len(results) < limit:
+            typed_words = typed.split()
+            matches = None
+            for word in typed_words:
+                keys = self._with_word_starting(word)
+                matches = keys if matches is None else matches & keys
+            if not matches:
+                # Forgive a typo in the last word
+                matches = self._fuzzy(typed_words[-1])
+                for word in typed_words[:-1]:
+                    matches &= self._with_word_starting(word)
+            chosen = set(results)
+            results += self._most_used([key for key in matches if key not in chosen], limit - len(results))
+        return [self.text[key] for key in results]
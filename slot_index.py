@@ -0,0 +1,213 @@
+"""In-memory bookings per day and bay, for overlap and free-gap queries.
+
+A day's bookings in one bay are kept as [start, end) minute intervals
+sorted by start, alongside the running maximum of their ends. Only
+intervals starting before a new booking ends can overlap it, and of those
+the one reaching furthest decides, so an overlap check is one bisect
+however busy the month is. Weeks are loaded from the database the first
+time they are needed.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, timedelta
+from itertools import accumulate
+
+DAYS_PER_WEEK = 6  # closed on Sundays
+
+# How far ahead next_free looks before giving up
+SEARCH_WEEKS = 52
+
+
+class Intervals:
+    """[start, end) intervals sorted by start; they may overlap each other"""
+
+    __slots__ = ('starts', 'ends', 'reach')
+
+    def __init__(self, pairs=()):
+        """pairs are (start, end) in any order"""
+        pairs = sorted(pairs)
+        self.starts = [start for start, _ in pairs]
+        self.ends = [end for _, end in pairs]
+        self.reach = list(accumulate(self.ends, max))  # reach[i] is the latest end of the first i + 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.reach[i:] = list(accumulate(self.ends[i:], max, initial=self.reach[i - 1] if i else end))[1:]
+
+    def overlaps(self, start, end):
+        """True if any interval overlaps [start, end)"""
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.reach[i - 1] > start
+
+    def gaps(self, opening, closing):
+        """Free (start, end) periods between opening and closing, in order"""
+        cursor = opening
+        for start, end in zip(self.starts, self.ends):
+            if start >= closing:
+                break
+            if start > cursor:
+                yield cursor, start
+            cursor = max(cursor, end)
+        if cursor < closing:
+            yield cursor, closing
+
+
+class SlotIndex:
+    def __init__(self, slots, load_week, bays=1, closing=None):
+        """slots are the grid's start minutes in day order; the day runs from the
+        first to closing, by default an hour after the last. load_week(week_start)
+        returns (date, start minute, end minute, bay) for each booking that week,
+        bay being the bay's position (0 to bays - 1) or None if not known"""
+        self.slots = list(slots)
+        self.opening = self.slots[0]
+        self.closing = closing if closing is not None else self.slots[-1] + 60
+        self.load_week = load_week
+        self.bays = bays
+        self.weeks = {}  # week start -> {(date, bay position): Intervals}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _week_start(date_str):
+        """Monday of date_str's week, or None for unreadable dates and Sundays"""
+        try:
+            day = Date.fromisoformat(date_str)
+        except ValueError:
+            return None
+        if day.weekday() >= DAYS_PER_WEEK:
+            return None
+        return (day - timedelta(days=day.weekday())).isoformat()
+
+    def _week(self, week_start):
+        week = self.weeks.get(week_start)
+        if week is None:
+            placed = {}
+            unplaced = []
+            for date_str, start, end, bay in self.load_week(week_start):
+                if bay is not None and 0 <= bay < self.bays:
+                    placed.setdefault((date_str, bay), []).append((start, end))
+                else:
+                    unplaced.append((date_str, start, end))
+            week = {key: Intervals(pairs) for key, pairs in placed.items()}
+            # Bookings with no known bay take the first one free
+            for date_str, start, end in unplaced:
+                bay = self._free_in(week, date_str, start, end)
+                week.setdefault((date_str, bay or 0), Intervals()).add(start, end)
+            self.weeks[week_start] = week
+        return week
+
+    def _free_in(self, week, date_str, start, end):
+        for bay in range(self.bays):
+            intervals = week.get((date_str, bay))
+            if intervals is None or not intervals.overlaps(start, end):
+                return bay
+        return None
+
+    def is_free(self, date_str, start, end, bay=None):
+        """True if bay (a position), or else some bay, is free from start to end on date_str
+
+        Unreadable dates and Sundays count as free.
+        """
+        week_start = self._week_start(date_str)
+        if week_start is None:
+            return True
+        with self.lock:
+            week = self._week(week_start)
+            if bay is None:
+                return self._free_in(week, date_str, start, end) is not None
+            intervals = week.get((date_str, bay))
+            return intervals is None or not intervals.overlaps(start, end)
+
+    def free_bay(self, date_str, start, end):
+        """Position of the first bay free from start to end on date_str, or None
+
+        Unreadable dates and Sundays have no bays to offer.
+        """
+        week_start = self._week_start(date_str)
+        if week_start is None:
+            return None
+        with self.lock:
+            return self._free_in(self._week(week_start), date_str, start, end)
+
+    def occupy(self, date_str, start, end, bay=None):
+        """Book bay (a position), or the first free bay, from start to end on date_str
+
+        Returns False if it was already taken.
+        """
+        week_start = self._week_start(date_str)
+        if week_start is None:
+            return True
+        with self.lock:
+            week = self._week(week_start)
+            if bay is None:
+                bay = self._free_in(week, date_str, start, end)
+                if bay is None:
+                    return False
+            elif (date_str, bay) in week and week[(date_str, bay)].overlaps(start, end):
+                return False
+            week.setdefault((date_str, bay), Intervals()).add(start, end)
+            return True
+
+    def gaps(self, date_str, bay):
+        """Free (start, end) periods of bay (a position) during opening hours on date_str"""
+        week_start = self._week_start(date_str)
+        if week_start is None:
+            return []
+        with self.lock:
+            intervals = self._week(week_start).get((date_str, bay))
+        if intervals is None:
+            return [(self.opening, self.closing)]
+        return list(intervals.gaps(self.opening, self.closing))
+
+    def forget_week(self, date_str):
+        """Reload the week containing date_str from the database next time it is needed"""
+        try:
+            day = Date.fromisoformat(date_str)
+        except ValueError:
+            return
+        with self.lock:
+            self.weeks.pop((day - timedelta(days=day.weekday())).isoformat(), None)
+
+    def clear(self):
+        with self.lock:
+            self.weeks.clear()
+
+    def next_free(self, start_date, count, earliest=0, duration=60):
+        """Up to count (date, start minute, bay position) with a bay free for duration minutes
+
+        Searches from start_date onwards, earliest first. Start times are
+        the grid's slots plus the end of each booking, so the gap left
+        after a short job is offered too. earliest skips start times before
+        that minute on start_date itself, e.g. ones already past today.
+        """
+        day = Date.fromisoformat(start_date)
+        found = []
+        with self.lock:
+            for _ in range(SEARCH_WEEKS * 7):
+                if day.weekday() < DAYS_PER_WEEK:
+                    date_str = day.isoformat()
+                    week = self._week((day - timedelta(days=day.weekday())).isoformat())
+                    first_bay = {}  # start minute -> first bay free from then
+                    for bay in range(self.bays):
+                        intervals = week.get((date_str, bay))
+                        gaps = intervals.gaps(self.opening, self.closing) if intervals else \
+                            [(self.opening, self.closing)]
+                        for gap_start, gap_end in gaps:
+                            first, last = max(gap_start, earliest), gap_end - duration
+                            if first > last:
+                                continue
+                            if gap_start >= earliest:
+                                first_bay.setdefault(gap_start, bay)
+                            for start in self.slots[bisect_left(self.slots, first):bisect_right(self.slots, last)]:
+                                first_bay.setdefault(start, bay)
+                    for start in sorted(first_bay):
+                        found.append((date_str, start, first_bay[start]))
+                        if len(found) == count:
+                            return found
+                day += timedelta(days=1)
+                earliest = 0
+        return found
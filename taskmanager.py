@@ -1,11 +1,29 @@
+# Taken before the other imports so --startup-timing can report how long they take
+from time import perf_counter
+STARTED_AT = perf_counter()
+
+import argparse
+import logging
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
-from datetime import datetime, timedelta
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, datetime, timedelta
 import os
-from zoneinfo import ZoneInfo
+import re
 import sys
 
+from appointment_store import (BUSINESS_HOURS, CLOSING_MINUTE, DEFAULT_DURATION, HISTORY_LIMIT, SHOP_TIMEZONE,
+                               AppointmentStore, SlotConflictError, appointment_end, format_time, parse_time)
+from customer_index import CustomerIndex
+from db_executor import DBExecutor, TkDispatcher
+from instrumentation import timed, timings
+from reason_index import ReasonIndex
+from week_cache import WeekCache, neighbour_weeks, week_start_for
+
+IMPORTED_AT = perf_counter()
+
+logger = logging.getLogger(__name__)
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
@@ -15,34 +33,241 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# Pause in typing before the search bar runs its query
+SEARCH_DEBOUNCE_MS = 200
+
+# Free slots offered in the "Next free" dropdown
+NEXT_FREE_SLOTS = 8
+
+# How often to check whether another workstation has written to the database
+EXTERNAL_CHANGE_POLL_MS = 2000
+
+# Appointments older than this many days move to the archive
+HOT_DAYS = 14
+
+# Pause between archive batches, so other database work gets a turn
+ARCHIVE_PAUSE_MS = 200
+
+# Launch to interactive window, reported by --startup-timing
+STARTUP_TARGET_MS = 500
+
+# Refresh interval of the diagnostics window
+DIAGNOSTICS_REFRESH_MS = 1000
+
+# Weekly view layouts: a column per day with every bay stacked in each
+# cell, or a column per bay for one day
+STACKED_LAYOUT = 'Stacked'
+BY_BAY_LAYOUT = 'By bay'
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+
+# Lengths offered in the duration fields, in minutes
+DURATIONS = [30, 60, 90, 120, 180, 240, 360, 480]
+
+# First entries of the bay and technician fields
+ANY_BAY = 'Any bay'
+NO_TECHNICIAN = '(none)'
+
+
+def list_sort_key(appt):
+    """Sort key matching the appointment list order (newest date first)"""
+    try:
+        day = Date.fromisoformat(appt.appointment_date).toordinal()
+    except ValueError:
+        day = 0
+    return (-day, appt.start_minute, appt.id)
+
+
+def format_duration(minutes):
+    """'1 h 30 min' style text for a length in minutes"""
+    hours, minutes = divmod(minutes, 60)
+    return ' '.join(part for part in (f"{hours} h" if hours else '', f"{minutes} min" if minutes else '') if part)
+
+
+def parse_duration(text):
+    """Minutes for '1 h 30 min' style text, or None if unreadable"""
+    match = re.fullmatch(r'\s*(?:(\d+)\s*h)?\s*(?:(\d+)\s*min)?\s*', text)
+    if not match or not any(match.groups()):
+        return None
+    return int(match[1] or 0) * 60 + int(match[2] or 0)
+
+
+def list_values(appt):
+    """Treeview column values for an appointment"""
+    return (appt.customer_name, appt.phone_number, appt.reason, appt.appointment_date,
+            f"{format_time(appt.start_minute)} - {format_time(appointment_end(appt))}")
+
+
+class VirtualAppointmentList:
+    """Treeview that loads appointments a page at a time as the user scrolls
+
+    Each row's iid is the appointment id. Rows are kept in list order so a
+    single change can be patched in place instead of reloading the list.
+    """
+
+    def __init__(self, tree, store, page_size=200, wait_for_first_page=False, run_db=None):
+        """wait_for_first_page leaves the list empty until append_page delivers
+        the first page, e.g. one fetched on the database thread
+
+        run_db(fn, *args, then=callback) runs fn(store, *args) and hands the
+        result to callback on the Tk thread, like TaskManager.run_db; without
+        it pages are read from store directly.
+        """
+        self.tree = tree
+        self.store = store
+        self.run_db = run_db or (lambda fn, *args, then: then(fn(store, *args)))
+        self.page_size = page_size
+        self.keys = []        # sort keys of the loaded rows, in display order
+        self.rows = {}        # iid -> (sort key, appointment)
+        self.exhausted = False
+        self.paging = True    # False while showing search results
+        self._generation = 0  # bumped by reload and show_results, so late reloads are dropped
+        self.scrollbar = None
+        self._load_pending = wait_for_first_page
+        self.tree.configure(yscrollcommand=self._on_yscroll)
+
+    def _on_yscroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        # Fetch the next page once the user scrolls near the bottom
+        if self.paging and not self.exhausted and not self._load_pending and float(last) > 0.9:
+            self._load_pending = True
+            self.tree.after_idle(self.load_more)
+
+    def _clear(self):
+        self.tree.delete(*self.tree.get_children())
+        self.keys = []
+        self.rows = {}
+
+    def _insert(self, index, appt, key):
+        iid = str(appt.id)
+        self.tree.insert('', index, iid=iid, values=list_values(appt))
+        self.keys.insert(index, key)
+        self.rows[iid] = (key, appt)
+
+    def _remove(self, iid):
+        del self.keys[self.tree.index(iid)]
+        del self.rows[iid]
+        self.tree.delete(iid)
+
+    def load_more(self):
+        """Fetch the next page of appointments on the database thread and append it"""
+        if self.exhausted or not self.paging:
+            self._load_pending = False
+            return
+        # _load_pending stays set until the page arrives, so scrolling asks only once
+        self._load_pending = True
+        last = self.rows[self.tree.get_children()[-1]][1] if self.keys else None
+        self.run_db(AppointmentStore.appointments_page, last, self.page_size, then=self.append_page)
+
+    @timed('list.append_page')
+    def append_page(self, page):
+        """Add a page of appointments after the loaded rows"""
+        self._load_pending = False
+        if not self.paging:
+            # Search results went up while the page was loading
+            return
+        for appt in page:
+            # A reload may have got here first
+            if str(appt.id) not in self.rows:
+                self._insert(len(self.keys), appt, list_sort_key(appt))
+        self.exhausted = len(page) < self.page_size
+
+    def reload(self):
+        """Re-read the loaded part of the list on the database thread and apply only the differences"""
+        self._generation += 1
+        generation = self._generation
+        wanted = max(len(self.keys) if self.paging else 0, self.page_size)
+
+        def loaded(fresh):
+            if generation == self._generation:
+                self._apply_reload(fresh, wanted)
+
+        self.run_db(AppointmentStore.appointments_page, None, wanted, then=loaded)
+
+    @timed('list.reload')
+    def _apply_reload(self, fresh, wanted):
+        if not self.paging:
+            self._clear()
+            self.paging = True
+        fresh_iids = {str(appt.id) for appt in fresh}
+
+        for iid in [iid for iid in self.rows if iid not in fresh_iids]:
+            self._remove(iid)
+
+        self.keys = []
+        for index, appt in enumerate(fresh):
+            iid = str(appt.id)
+            key = list_sort_key(appt)
+            self.keys.append(key)
+            if iid not in self.rows:
+                self.tree.insert('', index, iid=iid, values=list_values(appt))
+            elif self.rows[iid][1] != appt:
+                self.tree.item(iid, values=list_values(appt))
+            self.rows[iid] = (key, appt)
+
+        order = tuple(str(appt.id) for appt in fresh)
+        if self.tree.get_children() != order:
+            for index, iid in enumerate(order):
+                self.tree.move(iid, '', index)
+        self.exhausted = len(fresh) < wanted
+
+    @timed('list.upsert')
+    def upsert(self, appt):
+        """Place a new or changed appointment at its position in the list"""
+        iid = str(appt.id)
+        if not self.paging:
+            # Search results keep their order; a shown row is updated where it is
+            if iid in self.rows:
+                self.tree.item(iid, values=list_values(appt))
+                self.rows[iid] = (None, appt)
+            return
+        if iid in self.rows:
+            self._remove(iid)
+        key = list_sort_key(appt)
+        index = bisect_left(self.keys, key)
+        # Rows past the loaded window arrive with a later page
+        if index < len(self.keys) or self.exhausted:
+            self._insert(index, appt, key)
+
+    def remove(self, appointment_id):
+        iid = str(appointment_id)
+        if iid in self.rows:
+            self._remove(iid)
+
+    @timed('list.show_results')
+    def show_results(self, appointments):
+        """Replace the paged list with a fixed set of rows until reload()"""
+        self._generation += 1
+        self._clear()
+        self.paging = False
+        for appt in appointments:
+            self._insert(len(self.keys), appt, None)
+
+
 class TaskManager:
-    def __init__(self):
+    def __init__(self, wal=False, startup_timing=False, timings_file=None):
+        self.wal = wal
+        self.startup_timing = startup_timing
+        self.timings_file = timings_file
+        self.startup_marks = [('import', IMPORTED_AT)]
         self.root = tk.Tk()
         self.root.title("Mechanic Shop Task Manager")
         self.root.geometry("1000x700")
 
-        # Set timezone for Toronto
-        self.timezone = ZoneInfo("America/Toronto")
+        # The shop's timezone
+        self.timezone = SHOP_TIMEZONE
         
-        # Business hours in 12-hour format with leading zeros to match database
-        self.business_hours = [
-            '08:00 AM',
-            '09:00 AM',
-            '10:00 AM',
-            '11:00 AM',
-            '12:00 PM',
-            '01:00 PM',
-            '02:00 PM',
-            '03:00 PM',
-            '04:00 PM',
-            '05:00 PM',
-            '06:00 PM',
-            '07:00 PM'
-        ]
+        # Business hours as minutes since midnight, and as shown in the time fields
+        self.business_hours = BUSINESS_HOURS
+        self.time_labels = [format_time(minute) for minute in self.business_hours]
+        self.slot_index = {minute: i for i, minute in enumerate(self.business_hours)}
+        self.weekly_layout = STACKED_LAYOUT
+        self.layout_day = 0  # weekday shown by the By bay layout
         
         # Initialize database first
         self.init_database()
-        
+        self.mark_startup('database open')
+
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(expand=True, fill='both', padx=5, pady=5)
@@ -53,17 +278,106 @@ class TaskManager:
         
         self.notebook.add(self.schedule_tab, text='Schedule Appointment')
         self.notebook.add(self.weekly_tab, text='Weekly View')
-        
+        # The weekly grid is built the first time its tab is opened
+        self.weekly_built = False
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
         # Initialize current week BEFORE creating GUI
         today = datetime.now(self.timezone)
         self.current_week_start = today - timedelta(days=today.weekday())
         
         # Create GUI elements
         self.create_schedule_gui()
-        self.create_weekly_gui()
         
         # Start time updates
         self.update_time()
+        self.mark_startup('widget build')
+
+        # Hidden diagnostics window with query and refresh latencies
+        self.diagnostics_window = None
+        self.root.bind('<Control-D>', self.show_diagnostics)
+
+        self.data_version = None
+        self._archive_cutoff = None
+        # Idle callbacks run in order, so this one runs after Tk's own
+        # geometry and redraw work for the first frame
+        self.root.after_idle(self.after_first_paint)
+
+    def mark_startup(self, phase):
+        self.startup_marks.append((phase, perf_counter()))
+
+    def after_first_paint(self):
+        """Start the work that does not need to hold up the window appearing"""
+        self.root.update_idletasks()
+        self.mark_startup('first paint')
+        if self.startup_timing:
+            self.report_startup()
+
+        # First page of the list, and this week for when the Weekly View opens
+        self.run_db(AppointmentStore.appointments_page, None, self.appointment_list.page_size,
+                    then=self.appointment_list.append_page)
+        self.week_cache.prefetch([self.current_week_start.strftime('%Y-%m-%d')])
+
+        # Pick up bookings made on other workstations
+        self.watch_for_external_changes()
+
+        # Move old appointments to the archive in the background
+        self.root.after(ARCHIVE_PAUSE_MS, self.archive_old_appointments)
+
+        # Tie appointments booked before the customers table to their customers
+        self.root.after(ARCHIVE_PAUSE_MS, self.link_customers)
+
+    def report_startup(self):
+        """Print how long each startup phase took"""
+        previous = STARTED_AT
+        phases = []
+        for phase, at in self.startup_marks:
+            phases.append(f"{phase} {(at - previous) * 1000:.0f} ms")
+            previous = at
+        total = (previous - STARTED_AT) * 1000
+        verdict = 'within' if total < STARTUP_TARGET_MS else 'over'
+        logger.info("Startup: %s; %.0f ms to first paint, %s the %d ms target",
+                    ', '.join(phases), total, verdict, STARTUP_TARGET_MS)
+
+    def diagnostics(self):
+        """Sections of the diagnostics window and timings dump besides the timings"""
+        return {'week_cache': self.week_cache.stats(), 'list_rows': len(self.appointment_list.rows)}
+
+    def show_diagnostics(self, event=None):
+        """Ctrl+Shift+D: latency histograms and cache counters, refreshed while open"""
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        window = self.diagnostics_window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.geometry("900x400")
+        text = tk.Text(window, wrap='none', font=('Courier', 9))
+        text.pack(fill='both', expand=True)
+
+        def save():
+            path = filedialog.asksaveasfilename(parent=window, defaultextension='.json',
+                                                initialfile='timings.json')
+            if path:
+                timings.dump(path, self.diagnostics())
+
+        buttons = ttk.Frame(window)
+        buttons.pack(fill='x')
+        ttk.Button(buttons, text="Save...", command=save).pack(side='left', padx=5, pady=5)
+        ttk.Button(buttons, text="Reset", command=timings.clear).pack(side='left', padx=5, pady=5)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            extra = '\n'.join(f"{name}: {value}" for name, value in self.diagnostics().items())
+            text.delete('1.0', tk.END)
+            text.insert('1.0', f"{timings.report()}\n\n{extra}")
+            window.after(DIAGNOSTICS_REFRESH_MS, refresh)
+
+        refresh()
+
+    def on_tab_changed(self, event=None):
+        if not self.weekly_built and self.notebook.select() == str(self.weekly_tab):
+            self.create_weekly_gui()
 
     def update_time(self):
         """Update current time display"""
@@ -74,59 +388,97 @@ class TaskManager:
 
     def init_database(self):
         db_path = resource_path('mechanic_appointments.db')
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        
-        # Create appointments table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS appointments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_name TEXT NOT NULL,
-                phone_number TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                appointment_date TEXT NOT NULL,
-                appointment_time TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Opening the store creates the tables and applies schema migrations.
+        # This connection is only used for quick reads on the Tk thread.
+        self.store = AppointmentStore(db_path, wal=self.wal)
 
-        # Create repair_reasons table to store unique reasons
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS repair_reasons (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reason TEXT UNIQUE NOT NULL
-            )
-        ''')
-        
-        self.conn.commit()
-        
-        # Clean old appointments automatically
-        self.clean_old_appointments()
+        # Writes and week loads run on the executor's own connection, and
+        # their results come back to the Tk thread through the dispatcher
+        self.db = DBExecutor(lambda: AppointmentStore(db_path, wal=self.wal))
+        self.dispatcher = TkDispatcher(self.root)
+        self.root.protocol('WM_DELETE_WINDOW', self.close)
 
-    def clean_old_appointments(self):
-        """Clean appointments older than 2 weeks but save unique reasons"""
-        try:
-            # Get current date in the shop's timezone
+        # Week snapshots for the weekly view
+        self.week_cache = WeekCache(self.fetch_week, self.db.submit)
+
+    def run_db(self, fn, *args, write=False, then=None):
+        """Run fn(store, *args) on the database thread and call then(result) on the Tk thread"""
+        future = self.db.submit(fn, *args, write=write)
+        self.dispatcher.then(future, then, self.show_db_error)
+        return future
+
+    def show_db_error(self, error):
+        messagebox.showerror("Database Error", str(error))
+
+    def watch_for_external_changes(self):
+        """Refresh the views when another workstation has written to the database
+
+        data_version is read on the executor's connection, whose own writes
+        do not change it, so our own edits never trigger a refresh.
+        """
+        def checked(version):
+            if self.data_version is not None and version != self.data_version:
+                # The executor's slot bitmaps may be missing the other
+                # bookings, and bays or technicians may have been added
+                self.db.submit(AppointmentStore.reload_resources)
+                self.store.reload_resources()
+                self.refresh_resources()
+                self.reload_from_database()
+            self.data_version = version
+            self.root.after(EXTERNAL_CHANGE_POLL_MS, self.watch_for_external_changes)
+
+        def failed(error):
+            logger.error("Error checking for database changes: %s", error)
+            self.root.after(EXTERNAL_CHANGE_POLL_MS, self.watch_for_external_changes)
+
+        future = self.db.submit(AppointmentStore.data_version)
+        self.dispatcher.then(future, checked, failed)
+
+    def reload_from_database(self):
+        """Drop cached data and re-read everything shown"""
+        self.week_cache.invalidate_all()
+        self.refresh_appointments()
+        self.update_weekly_view()
+        self.load_reasons()
+        self.load_customers()
+        self.update_free_slots()
+
+    def archive_old_appointments(self):
+        """Move appointments older than HOT_DAYS to the archive, one short batch at a time"""
+        if self._archive_cutoff is None:
+            # Fixed for the whole run so the batches agree on what is old
             current_date = datetime.now(self.timezone)
-            two_weeks_ago = (current_date - timedelta(days=14)).strftime('%Y-%m-%d')
-            
-            # First, save any unique reasons to repair_reasons table
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO repair_reasons (reason)
-                SELECT DISTINCT reason FROM appointments 
-                WHERE appointment_date < ?
-            ''', (two_weeks_ago,))
-            
-            # Then delete old appointments
-            self.cursor.execute('''
-                DELETE FROM appointments 
-                WHERE appointment_date < ?
-            ''', (two_weeks_ago,))
-            
-            self.conn.commit()
-            print(f"Cleaned appointments older than {two_weeks_ago}")
-        except Exception as e:
-            print(f"Error cleaning appointments: {e}")
+            self._archive_cutoff = (current_date - timedelta(days=HOT_DAYS)).strftime('%Y-%m-%d')
+
+        def archived(moved):
+            for old in moved:
+                self.appointment_list.remove(old.id)
+            if moved:
+                self.invalidate_weeks(moved)
+                self.root.after(ARCHIVE_PAUSE_MS, self.archive_old_appointments)
+            else:
+                logger.info("Archived appointments older than %s", self._archive_cutoff)
+
+        def failed(error):
+            logger.error("Error archiving appointments: %s", error)
+
+        future = self.db.submit(AppointmentStore.archive_old_appointments, self._archive_cutoff, write=True)
+        self.dispatcher.then(future, archived, failed)
+
+    def link_customers(self, linked_so_far=0):
+        """Merge appointments into customer records, one short batch at a time"""
+        def linked(count):
+            if count:
+                self.root.after(ARCHIVE_PAUSE_MS, self.link_customers, linked_so_far + count)
+            elif linked_so_far:
+                logger.info("Linked %d appointments to their customers", linked_so_far)
+                self.load_customers()
+
+        def failed(error):
+            logger.error("Error linking customers: %s", error)
+
+        future = self.db.submit(AppointmentStore.link_customers, write=True)
+        self.dispatcher.then(future, linked, failed)
 
     def create_schedule_gui(self):
         # Time display
@@ -145,11 +497,18 @@ class TaskManager:
         ttk.Label(info_frame, text="Phone Number:").grid(row=1, column=0, sticky="w")
         self.phone_entry = ttk.Entry(info_frame, width=30)
         self.phone_entry.grid(row=1, column=1, padx=5, pady=2)
+        ttk.Button(info_frame, text="History...", command=self.show_phone_history).grid(row=1, column=2, padx=5)
+        self.customer_index = CustomerIndex()
+        self._autofilled_name = None
+        self.phone_entry.bind('<KeyRelease>', self.autofill_name)
+        self.load_customers()
 
         ttk.Label(info_frame, text="Reason:").grid(row=2, column=0, sticky="w")
         self.reason_entry = ttk.Combobox(info_frame, width=27)
         self.reason_entry.grid(row=2, column=1, padx=5, pady=2)
-        self.update_reason_dropdown()
+        self.reason_index = ReasonIndex()
+        self.autocomplete_reasons(self.reason_entry)
+        self.load_reasons()
 
         ttk.Label(info_frame, text="Date (YYYY-MM-DD):").grid(row=3, column=0, sticky="w")
         self.date_entry = ttk.Entry(info_frame, width=30)
@@ -157,27 +516,75 @@ class TaskManager:
         self.date_entry.insert(0, datetime.now(self.timezone).strftime('%Y-%m-%d'))
 
         ttk.Label(info_frame, text="Time:").grid(row=4, column=0, sticky="w")
-        self.time_entry = ttk.Combobox(info_frame, width=27, values=self.business_hours)
+        self.time_entry = ttk.Combobox(info_frame, width=27, values=self.time_labels)
         self.time_entry.grid(row=4, column=1, padx=5, pady=2)
-        self.time_entry.set(self.business_hours[0])
+        self.time_entry.set(self.time_labels[0])
+
+        ttk.Label(info_frame, text="Duration:").grid(row=5, column=0, sticky="w")
+        self.duration_entry = ttk.Combobox(info_frame, width=27, state='readonly',
+                                           values=[format_duration(minutes) for minutes in DURATIONS])
+        self.duration_entry.grid(row=5, column=1, padx=5, pady=2)
+        self.duration_entry.set(format_duration(DEFAULT_DURATION))
+        self.duration_entry.bind('<<ComboboxSelected>>', self.schedule_free_slots)
 
-        ttk.Button(info_frame, text="Set Appointment", command=self.add_appointment).grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Label(info_frame, text="Bay:").grid(row=6, column=0, sticky="w")
+        self.bay_entry = ttk.Combobox(info_frame, width=27, state='readonly')
+        self.bay_entry.grid(row=6, column=1, padx=5, pady=2)
+        ttk.Button(info_frame, text="Add Bay...", command=self.add_bay).grid(row=6, column=2, padx=5)
+
+        ttk.Label(info_frame, text="Technician:").grid(row=7, column=0, sticky="w")
+        self.technician_entry = ttk.Combobox(info_frame, width=27, state='readonly')
+        self.technician_entry.grid(row=7, column=1, padx=5, pady=2)
+        ttk.Button(info_frame, text="Add Technician...", command=self.add_technician).grid(row=7, column=2, padx=5)
+        self.refresh_resources()
+
+        ttk.Label(info_frame, text="Next free:").grid(row=8, column=0, sticky="w")
+        self.next_free_entry = ttk.Combobox(info_frame, width=27, state='readonly')
+        self.next_free_entry.grid(row=8, column=1, padx=5, pady=2)
+        self.next_free_entry.bind('<<ComboboxSelected>>', self.use_free_slot)
+        self.date_entry.bind('<KeyRelease>', self.schedule_free_slots)
+        self._free_slots_after = None
+        self.free_slots = []
+        self.update_free_slots()
+
+        ttk.Button(info_frame, text="Set Appointment", command=self.add_appointment).grid(row=9, column=0, columnspan=2, pady=10)
+
+        # Search bar; results replace the list until the search is cleared
+        search_frame = ttk.Frame(self.schedule_tab)
+        search_frame.pack(fill='x', padx=10, pady=(5, 0))
+        ttk.Label(search_frame, text="Search (name, phone or reason):").pack(side='left')
+        self.search_entry = ttk.Entry(search_frame, width=40)
+        self.search_entry.pack(side='left', padx=5)
+        self.search_entry.bind('<KeyRelease>', self.schedule_search)
+        self._search_after = None
+        self._search_generation = 0
 
         # Appointments Display
-        self.tree = ttk.Treeview(self.schedule_tab, columns=('Name', 'Phone', 'Reason', 'Date', 'Time'), show='headings')
-        self.tree.pack(fill='both', expand=True, padx=10, pady=5)
+        list_frame = ttk.Frame(self.schedule_tab)
+        list_frame.pack(fill='both', expand=True, padx=10, pady=5)
+        self.tree = ttk.Treeview(list_frame, columns=('Name', 'Phone', 'Reason', 'Date', 'Time'), show='headings')
+        self.tree.pack(side='left', fill='both', expand=True)
 
         for col in ['Name', 'Phone', 'Reason', 'Date', 'Time']:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=100)
 
-        self.refresh_appointments()
+        # Rows are fetched a page at a time as the list is scrolled
+        self.appointment_list = VirtualAppointmentList(self.tree, self.store, wait_for_first_page=True,
+                                                       run_db=self.run_db)
+        yscroll = ttk.Scrollbar(list_frame, orient='vertical', command=self.tree.yview)
+        yscroll.pack(side='right', fill='y')
+        self.appointment_list.scrollbar = yscroll
 
         # Add Edit and Delete buttons
         button_frame = ttk.Frame(self.schedule_tab)
         button_frame.pack(fill='x', padx=10, pady=5)
         ttk.Button(button_frame, text="Edit Selected", command=self.edit_appointment).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Delete Selected", command=self.delete_appointment).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Reschedule Selected", command=self.reschedule_appointments).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Clear Day", command=self.clear_day).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Customer History",
+                   command=self.show_selected_history).pack(side='left', padx=5)
 
         # Bind double-click on appointment to edit
         self.tree.bind('<Double-1>', lambda e: self.edit_appointment())
@@ -187,111 +594,213 @@ class TaskManager:
         self.tree.column('Phone', width=120)
         self.tree.column('Reason', width=300)  # Increased width for longer reasons
         self.tree.column('Date', width=100)
-        self.tree.column('Time', width=100)
+        self.tree.column('Time', width=150)
 
         # Add horizontal scrollbar
         xscroll = ttk.Scrollbar(self.schedule_tab, orient='horizontal', command=self.tree.xview)
         xscroll.pack(fill='x', side='bottom')
         self.tree.configure(xscrollcommand=xscroll.set)
 
-    def format_time_for_db(self, time_str):
-        """Convert any time format to consistent database format"""
-        try:
-            # Handle different possible input formats
-            if ':' in time_str:
-                if 'AM' in time_str.upper() or 'PM' in time_str.upper():
-                    # Ensure consistent format with leading zeros
-                    time_obj = datetime.strptime(time_str, '%I:%M %p')
-                    return time_obj.strftime('%I:%M %p')
-                else:
-                    # Convert 24-hour format to 12-hour
-                    time_obj = datetime.strptime(time_str, '%H:%M')
-                    return time_obj.strftime('%I:%M %p')
-            return time_str
-        except ValueError:
-            return time_str
-
-    def format_time_for_display(self, time_str):
-        """Ensure consistent time display format"""
-        try:
-            # If time is in 24-hour format, convert to 12-hour
-            if ':' in time_str:
-                if 'AM' in time_str.upper() or 'PM' in time_str.upper():
-                    # Already in 12-hour format
-                    time_obj = datetime.strptime(time_str, '%I:%M %p')
-                else:
-                    # Convert from 24-hour format
-                    time_obj = datetime.strptime(time_str, '%H:%M')
-                return time_obj.strftime('%I:%M %p')
-            return time_str
-        except ValueError:
-            return time_str
-
     def add_appointment(self):
         name = self.name_entry.get()
         phone = self.phone_entry.get()
         reason = self.reason_entry.get()
         date = self.date_entry.get()
         time = self.time_entry.get()
+        bay_id = self.chosen_bay(self.bay_entry)
+        technician_id = self.chosen_technician(self.technician_entry)
+        duration = parse_duration(self.duration_entry.get())
 
         if name and phone and reason and date and time:
-            # Validate that the selected day is not a Sunday
-            selected_date = datetime.strptime(date, '%Y-%m-%d')
-            if selected_date.weekday() == 6:  # Sunday
-                messagebox.showerror("Error", "Shop is closed on Sundays. Please select another day.")
+            if not self.is_shop_day(date):
                 return
 
-            # Format time consistently
-            formatted_time = self.format_time_for_db(time)
-            
-            self.cursor.execute('''
-                INSERT INTO appointments (customer_name, phone_number, reason, appointment_date, appointment_time)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, phone, reason, date, formatted_time))
-            self.conn.commit()
-            
-            # Clear entries
-            self.name_entry.delete(0, tk.END)
-            self.phone_entry.delete(0, tk.END)
-            self.reason_entry.set('')
-            self.time_entry.set(self.business_hours[0])
-            
-            self.refresh_appointments()
-            self.update_reason_dropdown()
-            self.update_weekly_view()
+            start_minute = parse_time(time)
+            if start_minute is None:
+                messagebox.showerror("Error", "Please enter the time like 09:00 AM.")
+                return
+            end_minute = start_minute + duration
+            if not self.within_opening_hours(start_minute, end_minute):
+                return
+
+            def insert(store):
+                return store.get_appointment(store.add_appointment(name, phone, reason, date, start_minute,
+                                                                   bay_id, technician_id, end_minute))
+
+            def inserted(appointment):
+                # Clear entries
+                self.name_entry.delete(0, tk.END)
+                self.phone_entry.delete(0, tk.END)
+                self.reason_entry.set('')
+                self.time_entry.set(self.time_labels[0])
+                self._autofilled_name = None
+
+                self.appointment_list.upsert(appointment)
+                self.customer_index.add(appointment.customer_id, appointment.customer_name, appointment.phone_number)
+                self.reason_index.add(appointment.reason)
+                self.suggest_reasons(self.reason_entry)
+                self.apply_appointment_change(new=appointment)
+                self.update_free_slots()
+
+            future = self.db.submit(insert, write=True)
+            self.dispatcher.then(future, inserted, lambda error: self.show_write_error(error, duration))
+
+    def refresh_resources(self):
+        """Refill the bay and technician fields, and redraw the weekly grid if the bays changed"""
+        self.bay_names = {bay.id: bay.name for bay in self.store.bays}
+        self.bay_entry['values'] = [ANY_BAY] + [bay.name for bay in self.store.bays]
+        self.technician_entry['values'] = [NO_TECHNICIAN] + [tech.name for tech in self.store.technicians]
+        if self.bay_entry.current() < 0:
+            self.bay_entry.current(0)
+        if self.technician_entry.current() < 0:
+            self.technician_entry.current(0)
+        if self.weekly_built and self.weekly_layout == BY_BAY_LAYOUT \
+                and list(self.bay_columns) != list(self.bay_names):
+            self.build_grid()
+            self.render_cells()
+
+    def chosen_bay(self, combobox):
+        """Bay id picked in combobox, or None for any bay"""
+        index = combobox.current()
+        return self.store.bays[index - 1].id if index > 0 else None
+
+    def chosen_technician(self, combobox):
+        index = combobox.current()
+        return self.store.technicians[index - 1].id if index > 0 else None
+
+    def add_resource(self, kind, add):
+        """Ask for a name and add a bay or technician with add(store, name)"""
+        name = simpledialog.askstring(f"Add {kind}", f"{kind} name:", parent=self.root)
+        if not name or not name.strip():
+            return
+
+        def added(resource):
+            self.store.reload_resources()
+            self.refresh_resources()
+            self.update_free_slots()
+
+        self.run_db(add, name.strip(), write=True, then=added)
+
+    def add_bay(self):
+        self.add_resource("Bay", AppointmentStore.add_bay)
+
+    def add_technician(self):
+        self.add_resource("Technician", AppointmentStore.add_technician)
+
+    def is_shop_day(self, date, parent=None):
+        """Whether date is a YYYY-MM-DD day the shop is open; explains why not in an error box"""
+        options = {} if parent is None else {'parent': parent}
+        try:
+            day = Date.fromisoformat(date)
+        except ValueError:
+            day = None
+        # fromisoformat also takes forms such as 20250307, which would be stored as typed
+        if day is None or day.isoformat() != date:
+            messagebox.showerror("Error", "Please enter the date as YYYY-MM-DD.", **options)
+            return False
+        if day.weekday() == 6:  # Sunday
+            messagebox.showerror("Error", "Shop is closed on Sundays. Please select another day.", **options)
+            return False
+        return True
+
+    def within_opening_hours(self, start_minute, end_minute, parent=None):
+        """Whether start to end fits in the shop's hours; explains why not in an error box"""
+        options = {} if parent is None else {'parent': parent}
+        if start_minute < BUSINESS_HOURS[0]:
+            messagebox.showerror("Error", f"The shop opens at {format_time(BUSINESS_HOURS[0])}. "
+                                          "Please choose a later time.", **options)
+            return False
+        if end_minute > CLOSING_MINUTE:
+            messagebox.showerror("Error", f"The shop closes at {format_time(CLOSING_MINUTE)}. "
+                                          "Please choose an earlier time or a shorter job.", **options)
+            return False
+        return True
+
+    def show_write_error(self, error, duration=DEFAULT_DURATION):
+        """Explain a failed add or edit; a double booking lists the next free slots of that length"""
+        if not isinstance(error, SlotConflictError):
+            self.show_db_error(error)
+            return
+
+        def suggest(slots):
+            message = f"{error}."
+            if slots:
+                message += "\n\nNext free slots:\n" + "\n".join(
+                    f"{day}  {format_time(minute)}  {self.bay_names.get(bay_id, '')}" for day, minute, bay_id in slots
+                )
+            messagebox.showerror("Time Slot Taken", message)
+
+        self.run_db(AppointmentStore.next_free_slots, error.date, 3, 0, duration, then=suggest)
+
+    def schedule_free_slots(self, event=None):
+        """Refresh the next free slots once typing in the date field pauses"""
+        if self._free_slots_after is not None:
+            self.root.after_cancel(self._free_slots_after)
+        self._free_slots_after = self.root.after(SEARCH_DEBOUNCE_MS, self.update_free_slots)
+
+    def update_free_slots(self):
+        """Offer the next free slots from the date being entered"""
+        self._free_slots_after = None
+        now = datetime.now(self.timezone)
+        date = self.date_entry.get().strip()
+        try:
+            Date.fromisoformat(date)
+        except ValueError:
+            return
+        earliest = 0
+        if date <= now.strftime('%Y-%m-%d'):
+            # Nothing earlier than the next hour today
+            date = now.strftime('%Y-%m-%d')
+            earliest = (now.hour + 1) * 60
+
+        def found(slots):
+            self.free_slots = slots
+            self.next_free_entry['values'] = [
+                f"{Date.fromisoformat(day).strftime('%a')} {day}  {format_time(minute)}  "
+                f"{self.bay_names.get(bay_id, '')}"
+                for day, minute, bay_id in slots
+            ]
+
+        self.run_db(AppointmentStore.next_free_slots, date, NEXT_FREE_SLOTS, earliest,
+                    parse_duration(self.duration_entry.get()), then=found)
+
+    def use_free_slot(self, event=None):
+        """Copy the chosen free slot into the date and time fields"""
+        day, minute, bay_id = self.free_slots[self.next_free_entry.current()]
+        self.date_entry.delete(0, tk.END)
+        self.date_entry.insert(0, day)
+        self.time_entry.set(format_time(minute))
+        self.bay_entry.set(self.bay_names.get(bay_id, ANY_BAY))
+
+    def schedule_search(self, event=None):
+        """Run the search once typing pauses"""
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(SEARCH_DEBOUNCE_MS, self.search_appointments)
 
     def search_appointments(self, event=None):
-        search_term = self.search_entry.get()
-        
-        # Clear the treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self._search_after = None
+        search_term = self.search_entry.get().strip()
+        # Results of a search the user has already typed past are dropped
+        self._search_generation += 1
+        generation = self._search_generation
+        if not search_term:
+            self.appointment_list.reload()
+            return
+
+        def found(appointments):
+            if generation == self._search_generation:
+                self.appointment_list.show_results(appointments)
 
         # Search the database
-        self.cursor.execute('''
-            SELECT customer_name, phone_number, reason, appointment_date, appointment_time 
-            FROM appointments 
-            WHERE reason LIKE ?
-        ''', ('%' + search_term + '%',))
-        
-        for row in self.cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        self.run_db(AppointmentStore.search, search_term, then=found)
 
     def refresh_appointments(self):
-        # Clear the treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        # Fetch all appointments
-        self.cursor.execute('''
-            SELECT customer_name, phone_number, reason, appointment_date, appointment_time 
-            FROM appointments 
-            ORDER BY appointment_date DESC, appointment_time ASC
-            LIMIT 1000
-        ''')
-        
-        for row in self.cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        """Sync the loaded rows of the appointment list with the database"""
+        if self.appointment_list.paging:
+            self.appointment_list.reload()
+        else:
+            self.search_appointments()
 
     def create_weekly_gui(self):
         """Create the weekly view interface"""
@@ -308,200 +817,529 @@ class TaskManager:
         self.week_label.pack(side='left', padx=5)
         ttk.Button(nav_frame, text="Next Week", command=self.next_week).pack(side='left', padx=5)
 
-        # Create main grid frame
+        # Layout switch; the day picker applies to the By bay layout
+        self.layout_day_entry = ttk.Combobox(nav_frame, width=5, state='readonly', values=WEEKDAY_NAMES)
+        self.layout_day_entry.current(self.layout_day)
+        self.layout_day_entry.pack(side='right', padx=5)
+        ttk.Label(nav_frame, text="Day:").pack(side='right')
+        self.layout_entry = ttk.Combobox(nav_frame, width=10, state='readonly',
+                                         values=[STACKED_LAYOUT, BY_BAY_LAYOUT])
+        self.layout_entry.set(self.weekly_layout)
+        self.layout_entry.pack(side='right', padx=5)
+        ttk.Label(nav_frame, text="Layout:").pack(side='right')
+        self.layout_entry.bind('<<ComboboxSelected>>', self.change_layout)
+        self.layout_day_entry.bind('<<ComboboxSelected>>', self.change_layout)
+
+        self.time_frame = None
+        self.build_grid()
+        self.weekly_built = True
+        self.update_weekly_view()
+
+    @timed('view.build_weekly_grid')
+    def build_grid(self):
+        """(Re)create the grid for the current layout: days or bays across, time slots down"""
+        if self.time_frame is not None:
+            self.time_frame.destroy()
         self.time_frame = ttk.Frame(self.weekly_frame)
         self.time_frame.pack(fill='both', expand=True, pady=5)
 
-        # Days of the week (Monday to Saturday)
-        days = ['Time', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-        for i, day in enumerate(days):
-            ttk.Label(self.time_frame, text=day, font=('Arial', 10, 'bold')).grid(
+        if self.weekly_layout == BY_BAY_LAYOUT:
+            # Appointments from an unknown bay land in the first column
+            self.bay_columns = {bay_id: column for column, bay_id in enumerate(self.bay_names)}
+            headings = list(self.bay_names.values())
+            self.layout_day_entry.config(state='readonly')
+        else:
+            self.bay_columns = {}
+            headings = WEEKDAY_NAMES
+            self.layout_day_entry.config(state='disabled')
+        width = 150 if len(headings) <= len(WEEKDAY_NAMES) else 100
+
+        for i, heading in enumerate(['Time'] + headings):
+            ttk.Label(self.time_frame, text=heading, font=('Arial', 10, 'bold')).grid(
                 row=0, column=i, padx=2, pady=5, sticky='nsew'
             )
             if i > 0:  # Skip time column
-                self.time_frame.grid_columnconfigure(i, weight=1, minsize=150)
+                self.time_frame.grid_columnconfigure(i, weight=1, minsize=width)
+
+        # Cell labels keyed by (column, slot index) so updates never have
+        # to search the widget tree
+        self.grid_columns = len(headings)
+        self.cell_frames = {}
+        self.cell_labels = {}
+        self.cell_text = {}
+        self.cell_ids = {}  # appointment ids shown in each cell
+        self.cell_span = {}  # grid rows each cell covers; 0 while hidden under a longer appointment
 
         # Time slots
-        for i, time in enumerate(self.business_hours, 1):
+        for i, time in enumerate(self.time_labels, 1):
             # Time column
             ttk.Label(self.time_frame, text=time, width=10).grid(
                 row=i, column=0, padx=2, pady=2, sticky='w'
             )
             
             # Appointment slots
-            for j in range(1, 7):  # Monday to Saturday
+            for j in range(1, len(headings) + 1):
                 frame = ttk.Frame(self.time_frame, relief='solid', borderwidth=1)
                 frame.grid(row=i, column=j, padx=2, pady=2, sticky='nsew')
-                label = ttk.Label(frame, wraplength=150, justify='left')
+                label = ttk.Label(frame, wraplength=width, justify='left')
                 label.pack(padx=5, pady=5, fill='both', expand=True)
+                self.cell_frames[(j - 1, i - 1)] = frame
+                self.cell_labels[(j - 1, i - 1)] = label
+                self.cell_text[(j - 1, i - 1)] = ''
+                self.cell_ids[(j - 1, i - 1)] = []
+                self.cell_span[(j - 1, i - 1)] = 1
+                label.bind('<Double-1>', lambda e, cell=(j - 1, i - 1): self.edit_cell(cell))
 
         # Configure grid
         self.time_frame.grid_columnconfigure(0, minsize=100)  # Time column width
         for i in range(len(self.business_hours) + 1):
             self.time_frame.grid_rowconfigure(i, weight=1)
 
+    def change_layout(self, event=None):
+        """Switch the weekly grid between stacked cells and a column per bay"""
+        self.weekly_layout = self.layout_entry.get()
+        self.layout_day = self.layout_day_entry.current()
+        self.build_grid()
+        self.render_cells()
+
+    def placement(self, appt):
+        """(column, first slot index, slots covered) of an appointment in the weekly grid, or None"""
+        try:
+            day_index = Date.fromisoformat(appt.appointment_date).weekday()
+        except ValueError:
+            return None
+        end = appointment_end(appt)
+        if day_index > 5 or appt.start_minute >= CLOSING_MINUTE or end <= self.business_hours[0]:
+            return None  # Sunday or outside business hours
+        first = max(0, bisect_right(self.business_hours, appt.start_minute) - 1)
+        rows = max(1, bisect_left(self.business_hours, end) - first)
+        if self.weekly_layout == BY_BAY_LAYOUT:
+            if day_index != self.layout_day:
+                return None
+            return (self.bay_columns.get(appt.bay_id, 0), first, rows)
+        return (day_index, first, rows)
+
+    @staticmethod
+    def fetch_week(store, week_start):
+        """Appointments for the week starting week_start, keyed by id"""
+        week_end = (Date.fromisoformat(week_start) + timedelta(days=6)).isoformat()
+        return {appt.id: appt for appt in store.appointments_between(week_start, week_end)}
+
+    @timed('view.render_cells')
+    def render_cells(self, columns=None, week=None):
+        """Redraw the given grid columns (all if None) from the current week
+
+        An appointment's cell stretches down over the slots it lasts,
+        until the next cell in the column with an appointment starting in
+        it. Slots after that show it as continuing.
+        """
+        if week is None:
+            week = self.week_cache.peek(self.current_week_start.strftime('%Y-%m-%d'))
+            if week is None:  # still loading; the whole grid is drawn when it arrives
+                return
+        columns = set(range(self.grid_columns) if columns is None else columns)
+        placed = {column: [] for column in columns}
+        for appt in week.values():
+            place = self.placement(appt)
+            if place is not None and place[0] in placed:
+                placed[place[0]].append((place[1], place[1] + place[2], appt))
+        for column, items in placed.items():
+            items.sort(key=lambda item: (item[0], item[2].start_minute, item[2].id))
+            starts = sorted({first for first, _, _ in items})
+            covered_until = 0
+            for slot in range(len(self.business_hours)):
+                cell = (column, slot)
+                starting = [item for item in items if item[0] == slot]
+                if slot < covered_until and not starting:
+                    self.set_cell(cell, 0)
+                    continue
+                next_start = next((later for later in starts if later > slot), len(self.business_hours))
+                reach = max([end for _, end, _ in starting], default=slot + 1)
+                covered_until = min(reach, next_start)
+                parts, ids = [], []
+                for first, end, appt in items:
+                    if first < slot < end:
+                        parts.append(f"... {appt.customer_name} until {format_time(appointment_end(appt))}")
+                        ids.append(appt.id)
+                for _, _, appt in starting:
+                    # Format: Name, Phone, and Reason, under the bay when they are stacked
+                    text = f"{appt.customer_name}\n{appt.phone_number}\n{appt.reason}"
+                    if appointment_end(appt) - appt.start_minute != DEFAULT_DURATION:
+                        text += f"\n{format_time(appt.start_minute)} - {format_time(appointment_end(appt))}"
+                    if self.weekly_layout == STACKED_LAYOUT and len(self.bay_names) > 1:
+                        text = f"{self.bay_names.get(appt.bay_id, '')}: {text}"
+                    parts.append(text)
+                    ids.append(appt.id)
+                self.cell_ids[cell] = ids
+                self.set_cell(cell, covered_until - slot, '\n\n'.join(parts))
+
+    def set_cell(self, cell, rows, text=''):
+        """Show text in cell stretched over rows grid rows, or hide the cell if rows is 0"""
+        if self.cell_span[cell] != rows:
+            frame = self.cell_frames[cell]
+            if rows:
+                frame.grid(row=cell[1] + 1, column=cell[0] + 1, rowspan=rows, padx=2, pady=2, sticky='nsew')
+            else:
+                frame.grid_remove()
+                self.cell_ids[cell] = []
+            self.cell_span[cell] = rows
+        if self.cell_text[cell] != text:
+            self.cell_labels[cell].config(text=text)
+            self.cell_text[cell] = text
+
+    def edit_cell(self, cell):
+        """Double-clicking a booked cell edits its (first) appointment"""
+        week = self.week_cache.peek(self.current_week_start.strftime('%Y-%m-%d'))
+        if week and self.cell_ids[cell]:
+            self.open_edit_window(week[self.cell_ids[cell][0]])
+
+    @timed('view.update_weekly_view')
     def update_weekly_view(self):
         """Update the weekly view with appointments"""
+        if not self.weekly_built:
+            return
         week_end = self.current_week_start + timedelta(days=6)
         self.week_label.config(text=f"Week of {self.current_week_start.strftime('%B %d')} to {week_end.strftime('%B %d, %Y')}")
+        week_start = self.current_week_start.strftime('%Y-%m-%d')
+        week = self.week_cache.lookup(week_start)
+        if week is not None:
+            self.render_cells(week=week)
+        else:
+            # Blank the grid until the database thread has loaded the week
+            self.render_cells(week={})
 
-        # Clear existing appointments
-        for widget in self.time_frame.winfo_children():
-            if isinstance(widget, ttk.Frame):
-                for label in widget.winfo_children():
-                    label.config(text='')
-
-        # Get appointments for the week - added phone_number to SELECT
-        self.cursor.execute('''
-            SELECT customer_name, phone_number, reason, appointment_date, appointment_time
-            FROM appointments
-            WHERE appointment_date BETWEEN ? AND ?
-            ORDER BY appointment_date, appointment_time
-        ''', (self.current_week_start.strftime('%Y-%m-%d'), week_end.strftime('%Y-%m-%d')))
-        
-        appointments = self.cursor.fetchall()
-        print(f"Found appointments: {appointments}")
+            def loaded(week):
+                if week_start == self.current_week_start.strftime('%Y-%m-%d'):
+                    self.render_cells(week=week)
 
-        # Update the weekly view with appointments
-        for appt in appointments:
-            try:
-                date = datetime.strptime(appt[3], '%Y-%m-%d')  # Index changed due to added phone
-                day_index = date.weekday()
-                
-                if day_index < 6:  # Skip Sunday (6)
-                    time_slot = appt[4]  # Index changed due to added phone
-                    # Ensure time slot has leading zeros
-                    if len(time_slot.split(':')[0]) == 1:
-                        hour = time_slot.split(':')[0]
-                        time_slot = f"0{time_slot}"
-                    
-                    time_index = self.business_hours.index(time_slot)
-                    
-                    # Find the frame and update its label
-                    for widget in self.time_frame.grid_slaves(row=time_index + 1, column=day_index + 1):
-                        if isinstance(widget, ttk.Frame):
-                            label = widget.winfo_children()[0]
-                            # Format: Name, Phone, and Reason
-                            label.config(text=f"{appt[0]}\n{appt[1]}\n{appt[2]}")
-                            print(f"Updated cell for {appt[0]} at {time_slot} on {date}")
-                            break
-                            
-            except Exception as e:
-                print(f"Error displaying appointment: {e}, Appointment: {appt}")
-
-    def update_reason_dropdown(self):
-        """Update dropdown with reasons from both tables"""
-        self.cursor.execute('''
-            SELECT DISTINCT reason FROM (
-                SELECT reason FROM appointments
-                UNION
-                SELECT reason FROM repair_reasons
-            )
-            ORDER BY reason
-        ''')
-        reasons = [row[0] for row in self.cursor.fetchall()]
-        self.reason_entry['values'] = reasons
-        if reasons:
-            self.reason_entry.set('')
+            self.dispatcher.then(self.week_cache.load(week_start), loaded, self.show_db_error)
+        self.week_cache.prefetch(neighbour_weeks(week_start, radius=2))
+
+    def invalidate_weeks(self, appointments):
+        """Drop the cached weeks a bulk write touched, and reload the shown week if it was one of them"""
+        dates = sorted(appt.appointment_date for appt in appointments)
+        first, last = dates[0], dates[-1]
+        try:
+            self.week_cache.invalidate_range(first, last)
+            first = week_start_for(first)
+        except ValueError:
+            # An unreadable date sorts anywhere, so the range is unknown
+            self.week_cache.invalidate_all()
+            first, last = '', '9999'
+        if first <= self.current_week_start.strftime('%Y-%m-%d') <= last:
+            self.update_weekly_view()
+
+    def apply_appointment_change(self, old=None, new=None):
+        """Patch cached weeks and repaint only the grid columns an add, edit or delete touched"""
+        current_week = self.current_week_start.strftime('%Y-%m-%d')
+        self.week_cache.apply(old, new)
+        if not self.weekly_built:
+            return
+        changed_columns = set()
+        for appt in (old, new):
+            if appt is not None and self.placement(appt) is not None \
+                    and week_start_for(appt.appointment_date) == current_week:
+                changed_columns.add(self.placement(appt)[0])
+        if changed_columns:
+            self.render_cells(changed_columns)
+
+    def load_reasons(self):
+        """(Re)build the reason autocomplete from the database"""
+        def loaded(counts):
+            self.reason_index.load(counts)
+            self.suggest_reasons(self.reason_entry)
+
+        self.run_db(AppointmentStore.reason_counts, then=loaded)
+
+    def load_customers(self):
+        """(Re)build the phone -> name lookup from the database"""
+        self.run_db(AppointmentStore.customer_names, then=self.customer_index.load)
+
+    def autofill_name(self, event=None):
+        """Fill in the name of the customer whose phone number has been typed
+
+        A name the user typed is left alone; one filled in earlier is
+        replaced or cleared as the phone number changes.
+        """
+        name = self.name_entry.get()
+        if name and name != self._autofilled_name:
+            return
+        customer = self.customer_index.lookup(self.phone_entry.get())
+        name = customer[1] if customer else ''
+        self.name_entry.delete(0, tk.END)
+        self.name_entry.insert(0, name)
+        self._autofilled_name = name or None
+
+    def show_selected_history(self):
+        """Visits of the selected appointment's customer"""
+        selected = self.selected_appointments()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select an appointment")
+            return
+        appt = selected[0]
+        self.show_customer_history(appt.customer_name, appt.phone_number, appt.customer_id)
+
+    def show_phone_history(self):
+        """Visits of the customer whose phone number is in the Schedule tab"""
+        phone = self.phone_entry.get().strip()
+        if not phone:
+            messagebox.showwarning("Warning", "Please enter a phone number")
+            return
+        self.show_customer_history(self.name_entry.get().strip(), phone)
+
+    def show_customer_history(self, name, phone, customer_id=None):
+        """Window listing a customer's appointments, newest first, archived ones included"""
+        def lookup(store):
+            if customer_id is not None:
+                customer = store.get_customer(customer_id)
+            else:
+                customer = store.find_customer(phone, name)
+            return customer, store.customer_history(customer.id) if customer else []
+
+        def found(result):
+            customer, history = result
+            if customer is None:
+                messagebox.showinfo("Customer History", f"No appointments found for {phone}.")
+                return
+            window = tk.Toplevel(self.root)
+            window.title(f"History - {customer.name}")
+            window.geometry("600x400")
+
+            count = f"latest {len(history)}" if len(history) == HISTORY_LIMIT else str(len(history))
+            ttk.Label(window, text=f"{customer.name}, {customer.phone_number}: {count} appointments",
+                      font=('Arial', 11)).pack(padx=10, pady=5, anchor='w')
+
+            frame = ttk.Frame(window)
+            frame.pack(fill='both', expand=True, padx=10, pady=5)
+            tree = ttk.Treeview(frame, columns=('Date', 'Time', 'Reason'), show='headings')
+            for column, width in (('Date', 100), ('Time', 150), ('Reason', 300)):
+                tree.heading(column, text=column)
+                tree.column(column, width=width)
+            scrollbar = ttk.Scrollbar(frame, orient='vertical', command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side='left', fill='both', expand=True)
+            scrollbar.pack(side='right', fill='y')
+            for appt in history:
+                tree.insert('', tk.END, values=(
+                    appt.appointment_date,
+                    f"{format_time(appt.start_minute)} - {format_time(appointment_end(appt))}",
+                    appt.reason))
+
+        self.run_db(lookup, then=found)
+
+    def autocomplete_reasons(self, combobox):
+        """Narrow combobox's dropdown to matching reasons as the user types"""
+        combobox.bind('<KeyRelease>', lambda e: self.suggest_reasons(combobox), add='+')
+        self.suggest_reasons(combobox)
+
+    def suggest_reasons(self, combobox):
+        combobox['values'] = self.reason_index.suggest(combobox.get())
 
     def prev_week(self):
         """Navigate to previous week"""
         self.current_week_start -= timedelta(days=7)
         self.update_weekly_view()
-        print(f"Moved to week starting {self.current_week_start.strftime('%Y-%m-%d')}")
+        logger.debug("Moved to week starting %s", self.current_week_start.strftime('%Y-%m-%d'))
 
     def next_week(self):
         """Navigate to next week"""
         self.current_week_start += timedelta(days=7)
         self.update_weekly_view()
-        print(f"Moved to week starting {self.current_week_start.strftime('%Y-%m-%d')}")
+        logger.debug("Moved to week starting %s", self.current_week_start.strftime('%Y-%m-%d'))
+
+    def selected_appointments(self):
+        """Appointments selected in the list; row iids are appointment ids"""
+        return [self.appointment_list.rows[iid][1] for iid in self.tree.selection()]
 
     def edit_appointment(self):
         """Edit selected appointment"""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        selected = self.selected_appointments()
+        if not selected:
             messagebox.showwarning("Warning", "Please select an appointment to edit")
             return
+        self.open_edit_window(selected[0])
 
-        # Get current values
-        current_values = self.tree.item(selected_item[0])['values']
-        
+    def open_edit_window(self, selected):
+        """Edit window for one appointment, saved by its id"""
         # Create edit window
         edit_window = tk.Toplevel(self.root)
         edit_window.title("Edit Appointment")
-        edit_window.geometry("400x300")
+        edit_window.geometry("400x540")
 
         # Add fields
         ttk.Label(edit_window, text="Name:").pack(pady=5)
         name_entry = ttk.Entry(edit_window)
-        name_entry.insert(0, current_values[0])
+        name_entry.insert(0, selected.customer_name)
         name_entry.pack(pady=5)
 
         ttk.Label(edit_window, text="Phone:").pack(pady=5)
         phone_entry = ttk.Entry(edit_window)
-        phone_entry.insert(0, current_values[1])
+        phone_entry.insert(0, selected.phone_number)
         phone_entry.pack(pady=5)
 
         ttk.Label(edit_window, text="Reason:").pack(pady=5)
-        reason_entry = ttk.Combobox(edit_window, values=self.reason_entry['values'])
-        reason_entry.set(current_values[2])
+        reason_entry = ttk.Combobox(edit_window)
+        reason_entry.set(selected.reason)
         reason_entry.pack(pady=5)
+        self.autocomplete_reasons(reason_entry)
 
         ttk.Label(edit_window, text="Date (YYYY-MM-DD):").pack(pady=5)
         date_entry = ttk.Entry(edit_window)
-        date_entry.insert(0, current_values[3])
+        date_entry.insert(0, selected.appointment_date)
         date_entry.pack(pady=5)
 
         ttk.Label(edit_window, text="Time:").pack(pady=5)
-        time_entry = ttk.Combobox(edit_window, values=self.business_hours)
-        time_entry.set(current_values[4])
+        time_entry = ttk.Combobox(edit_window, values=self.time_labels)
+        time_entry.set(format_time(selected.start_minute))
         time_entry.pack(pady=5)
 
+        ttk.Label(edit_window, text="Duration:").pack(pady=5)
+        length = appointment_end(selected) - selected.start_minute
+        duration_entry = ttk.Combobox(edit_window, state='readonly',
+                                      values=[format_duration(minutes) for minutes in sorted(set(DURATIONS) | {length})])
+        duration_entry.set(format_duration(length))
+        duration_entry.pack(pady=5)
+
+        ttk.Label(edit_window, text="Bay:").pack(pady=5)
+        bay_entry = ttk.Combobox(edit_window, state='readonly', values=self.bay_entry['values'])
+        bay_entry.set(self.bay_names.get(selected.bay_id, ANY_BAY))
+        bay_entry.pack(pady=5)
+
+        ttk.Label(edit_window, text="Technician:").pack(pady=5)
+        technician_entry = ttk.Combobox(edit_window, state='readonly', values=self.technician_entry['values'])
+        technician_entry.set(next((tech.name for tech in self.store.technicians if tech.id == selected.technician_id),
+                                  NO_TECHNICIAN))
+        technician_entry.pack(pady=5)
+
         def save_changes():
-            # Update database
-            self.cursor.execute('''
-                UPDATE appointments 
-                SET customer_name=?, phone_number=?, reason=?, appointment_date=?, appointment_time=?
-                WHERE customer_name=? AND appointment_date=? AND appointment_time=?
-            ''', (
-                name_entry.get(), phone_entry.get(), reason_entry.get(),
-                date_entry.get(), time_entry.get(),
-                current_values[0], current_values[3], current_values[4]
-            ))
-            self.conn.commit()
-            
-            # Refresh views
-            self.refresh_appointments()
-            self.update_weekly_view()
-            edit_window.destroy()
+            date = date_entry.get()
+            if not self.is_shop_day(date, parent=edit_window):
+                return
+            start_minute = parse_time(time_entry.get())
+            if start_minute is None:
+                messagebox.showerror("Error", "Please enter the time like 09:00 AM.", parent=edit_window)
+                return
+            duration = parse_duration(duration_entry.get())
+            if not self.within_opening_hours(start_minute, start_minute + duration, parent=edit_window):
+                return
+            bay_id = self.chosen_bay(bay_entry)
+            if bay_id == selected.bay_id:
+                # Left as it was: free to move to another bay if this one is taken at the new time
+                bay_id = None
+            values = (name_entry.get(), phone_entry.get(), reason_entry.get(), date, start_minute,
+                      bay_id, self.chosen_technician(technician_entry), start_minute + duration)
+
+            def updated(new):
+                # Refresh views
+                if new is None:
+                    self.appointment_list.remove(selected.id)
+                else:
+                    self.appointment_list.upsert(new)
+                    self.customer_index.add(new.customer_id, new.customer_name, new.phone_number)
+                    if new.reason != selected.reason:
+                        self.reason_index.add(new.reason)
+                self.apply_appointment_change(selected, new)
+                self.update_free_slots()
+                edit_window.destroy()
+
+            future = self.db.submit(AppointmentStore.update_appointment, selected.id, *values, write=True)
+            self.dispatcher.then(future, updated, lambda error: self.show_write_error(error, duration))
 
         ttk.Button(edit_window, text="Save Changes", command=save_changes).pack(pady=20)
 
+    def apply_deletions(self, deleted):
+        """Remove deleted appointments from the list and the weekly grid"""
+        for old in deleted:
+            self.appointment_list.remove(old.id)
+            self.apply_appointment_change(old=old)
+        self.update_free_slots()
+
     def delete_appointment(self):
-        """Delete selected appointment"""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        """Delete selected appointments"""
+        selected = self.selected_appointments()
+        if not selected:
             messagebox.showwarning("Warning", "Please select an appointment to delete")
             return
 
-        if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this appointment?"):
-            values = self.tree.item(selected_item[0])['values']
-            self.cursor.execute('''
-                DELETE FROM appointments 
-                WHERE customer_name=? AND appointment_date=? AND appointment_time=?
-            ''', (values[0], values[3], values[4]))
-            self.conn.commit()
-            
-            # Refresh views
-            self.refresh_appointments()
-            self.update_weekly_view()
+        question = ("Are you sure you want to delete this appointment?" if len(selected) == 1
+                    else f"Are you sure you want to delete these {len(selected)} appointments?")
+        if messagebox.askyesno("Confirm Delete", question):
+            # One transaction for the whole selection
+            self.run_db(AppointmentStore.delete_appointments, [appt.id for appt in selected],
+                        write=True, then=self.apply_deletions)
+
+    def reschedule_appointments(self):
+        """Move the selected appointments to another day, keeping their times"""
+        selected = self.selected_appointments()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select the appointments to reschedule")
+            return
+        date = simpledialog.askstring("Reschedule", "Move the selected appointments to (YYYY-MM-DD):",
+                                      initialvalue=selected[0].appointment_date, parent=self.root)
+        if not date or not self.is_shop_day(date):
+            return
+
+        def rescheduled(changes):
+            for old, new in changes:
+                self.appointment_list.upsert(new)
+                self.apply_appointment_change(old, new)
+            self.update_free_slots()
+
+        # All or nothing: a clash on any of them leaves every appointment where it was
+        future = self.db.submit(AppointmentStore.reschedule_appointments, [appt.id for appt in selected],
+                                date, write=True)
+        self.dispatcher.then(future, rescheduled, self.show_write_error)
+
+    def clear_day(self):
+        """Delete every appointment on a day the shop has to cancel"""
+        date = simpledialog.askstring("Clear Day", "Cancel every appointment on (YYYY-MM-DD):",
+                                      initialvalue=self.date_entry.get(), parent=self.root)
+        # A mistyped date would delete nothing after the user had confirmed
+        if not date or not self.is_shop_day(date):
+            return
+        if messagebox.askyesno("Confirm Clear Day", f"Delete every appointment on {date}?"):
+            self.run_db(AppointmentStore.delete_day, date, write=True, then=self.apply_deletions)
+
+    def close(self):
+        """Let queued database writes finish, then close the window"""
+        self.db.shutdown(wait=True)
+        self.store.close()
+        if self.timings_file:
+            timings.dump(self.timings_file, self.diagnostics())
+        self.root.destroy()
 
     def run(self):
-        # Clean old appointments every time the app starts
-        self.clean_old_appointments()
         self.root.mainloop()
 
 if __name__ == "__main__":
-    app = TaskManager()
+    parser = argparse.ArgumentParser(description="Mechanic Shop Task Manager")
+    parser.add_argument('--wal', action='store_true',
+                        help="use write-ahead logging so several workstations on this machine can share the database")
+    parser.add_argument('--startup-timing', action='store_true',
+                        help="log how long import, database open, widget build and first paint took")
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="DEBUG logs the time of every database job and view refresh")
+    parser.add_argument('--log-file', help="write the log here instead of to the console")
+    parser.add_argument('--timings-file', help="write latency histograms here as JSON on exit")
+    parser.add_argument('--serve', action='store_true',
+                        help="run the HTTP/JSON API for other shop devices instead of the window")
+    parser.add_argument('--host', help="address the API listens on; 0.0.0.0 for the whole shop network")
+    parser.add_argument('--port', type=int, help="port the API listens on")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, filename=args.log_file,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.startup_timing:
+        logger.setLevel(min(logger.getEffectiveLevel(), logging.INFO))
+    if args.serve:
+        # Imported here so the window does not pay for asyncio at startup
+        import api_server
+        api_logger = logging.getLogger(api_server.__name__)
+        api_logger.setLevel(min(api_logger.getEffectiveLevel(), logging.INFO))
+        api_server.serve(resource_path('mechanic_appointments.db'), args.host or api_server.DEFAULT_HOST,
+                         args.port or api_server.DEFAULT_PORT, wal=args.wal)
+        if args.timings_file:
+            timings.dump(args.timings_file)
+        sys.exit()
+    app = TaskManager(wal=args.wal, startup_timing=args.startup_timing, timings_file=args.timings_file)
     app.run()
 
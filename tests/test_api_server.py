@@ -0,0 +1,152 @@
+"""AppointmentServer on a free local port, driven by a plain HTTP client.
+
+    python -m pytest tests
+"""
+import asyncio
+import http.client
+import json
+import os
+import sys
+from datetime import date as Date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server  # noqa: E402
+from api_server import AppointmentServer  # noqa: E402
+from appointment_store import SHOP_TIMEZONE  # noqa: E402
+from week_cache import week_start_for  # noqa: E402
+
+
+def next_weekday():
+    day = Date.today() + timedelta(days=7)
+    return (day + timedelta(days=1) if day.weekday() == 6 else day).isoformat()
+
+
+def request(port, method, path, body=None, headers=None):
+    """(status, headers, decoded JSON or None) for one request"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=data, headers={'Content-Type': 'application/json', **(headers or {})})
+        response = conn.getresponse()
+        payload = response.read()
+        return response.status, dict(response.getheaders()), json.loads(payload) if payload else None
+    finally:
+        conn.close()
+
+
+def run_with_server(tmp_path, check):
+    """Start a server on port 0 over a new database, call check(port) off the loop, shut down; returns the server"""
+    async def main():
+        server = AppointmentServer(str(tmp_path / 'api.db'))
+        await server.start('127.0.0.1', 0)
+        try:
+            await asyncio.to_thread(check, server.port())
+        finally:
+            await server.close()
+        return server
+
+    return asyncio.run(main())
+
+
+def test_booking_lifecycle(tmp_path):
+    day = next_weekday()
+    booking = {'customer_name': 'Ada Test', 'phone_number': '416-555-0199', 'reason': 'Brake pads',
+               'appointment_date': day, 'start_time': '9:00 AM', 'end_time': '10:30 AM'}
+
+    def check(port):
+        status, headers, created = request(port, 'POST', '/appointments', booking)
+        assert status == 201
+        assert headers['Location'] == f"/appointments/{created['id']}"
+        assert (created['start_minute'], created['end_minute']) == (540, 630)
+
+        # Same time, and the shop's only bay is taken
+        status, _, error = request(port, 'POST', '/appointments', booking)
+        assert status == 409 and 'error' in error
+
+        # Moving the start keeps the 90 minute length
+        status, _, moved = request(port, 'PUT', f"/appointments/{created['id']}", {'start_time': '1:00 PM'})
+        assert status == 200
+        assert (moved['start_minute'], moved['end_minute']) == (780, 870)
+
+        status, _, deleted = request(port, 'DELETE', f"/appointments/{created['id']}")
+        assert status == 200 and deleted['id'] == created['id']
+        status, _, _ = request(port, 'DELETE', f"/appointments/{created['id']}")
+        assert status == 404
+
+    run_with_server(tmp_path, check)
+
+
+def test_week_not_modified(tmp_path):
+    day = next_weekday()
+    week = f'/weeks/{week_start_for(day)}'
+
+    def check(port):
+        status, headers, _ = request(port, 'GET', week)
+        assert status == 200
+        etag = headers['ETag']
+
+        status, _, body = request(port, 'GET', week, headers={'If-None-Match': etag})
+        assert status == 304 and body is None
+
+        # A booking in the week changes the tag
+        request(port, 'POST', '/appointments', {'customer_name': 'Ada Test', 'phone_number': '416-555-0199',
+                                                'reason': 'Oil change', 'appointment_date': day,
+                                                'start_time': '08:00'})
+        status, headers, _ = request(port, 'GET', week, headers={'If-None-Match': etag})
+        assert status == 200 and headers['ETag'] != etag
+
+    run_with_server(tmp_path, check)
+
+
+def test_availability_today_starts_from_now(tmp_path, monkeypatch):
+    day = Date.fromisoformat(next_weekday())
+    now = datetime(day.year, day.month, day.day, 10, 17, tzinfo=SHOP_TIMEZONE)
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(api_server, 'datetime', Clock)
+
+    def check(port):
+        # Starts are offered on the hour, so the first one left today is 11:00
+        status, _, slots = request(port, 'GET', '/availability?count=2')
+        assert status == 200
+        assert [(slot['appointment_date'], slot['start_minute']) for slot in slots] == \
+            [(day.isoformat(), 11 * 60), (day.isoformat(), 12 * 60)]
+
+        # Another day starts at opening
+        later = day + timedelta(days=2 if day.weekday() == 5 else 1)
+        status, _, slots = request(port, 'GET', f'/availability?count=1&from={later}')
+        assert (slots[0]['appointment_date'], slots[0]['start_minute']) == (later.isoformat(), 8 * 60)
+
+    run_with_server(tmp_path, check)
+
+
+def test_week_versions_stay_bounded_without_stale_tags(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_server, 'WEEK_VERSIONS_SIZE', 2)
+    first = Date.fromisoformat(next_weekday())
+    days = [(first + timedelta(weeks=n)).isoformat() for n in range(3)]
+    week = f'/weeks/{week_start_for(days[0])}'
+
+    def book(port, day, time):
+        status, _, _ = request(port, 'POST', '/appointments', {
+            'customer_name': 'Ada Test', 'phone_number': '416-555-0199', 'reason': 'Oil change',
+            'appointment_date': day, 'start_time': time})
+        assert status == 201
+
+    def check(port):
+        book(port, days[0], '08:00')
+        _, headers, _ = request(port, 'GET', week)
+        etag = headers['ETag']
+        # The week changes after the client took its tag, then drops out of week_versions
+        book(port, days[0], '09:00')
+        book(port, days[1], '08:00')
+        book(port, days[2], '08:00')
+        status, _, body = request(port, 'GET', week, headers={'If-None-Match': etag})
+        assert status == 200 and len(body['appointments']) == 2
+
+    server = run_with_server(tmp_path, check)
+    assert len(server.week_versions) == 2
@@ -0,0 +1,84 @@
+"""CSV import and export through appointment_io.
+
+    python -m pytest tests
+"""
+import csv
+import os
+import sys
+from datetime import date as Date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_io import export_file, import_file  # noqa: E402
+from appointment_store import AppointmentStore  # noqa: E402
+
+
+def weekday(offset_days):
+    day = Date.today() + timedelta(days=offset_days)
+    return (day + timedelta(days=1) if day.weekday() == 6 else day).isoformat()
+
+
+def write_rows(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['customer_name', 'phone_number', 'reason', 'appointment_date', 'appointment_time'])
+        writer.writerows(rows)
+
+
+def test_past_clashes_import_but_future_ones_are_rejected(tmp_path, capsys):
+    store = AppointmentStore(str(tmp_path / 'io.db'))
+    past, future = weekday(-60), weekday(30)
+    store.add_appointments([('Old', '416-555-0100', 'Oil change', past, 540),
+                            ('Booked', '416-555-0101', 'Oil change', future, 540)])
+    path = tmp_path / 'in.csv'
+    write_rows(path, [('History', '416-555-0102', 'Brakes', past, '09:00 AM'),
+                      ('Clash', '416-555-0103', 'Brakes', future, '09:00 AM')])
+
+    assert import_file(store, str(path), 'csv') == (1, 1)
+    assert 'line 3' in capsys.readouterr().err
+    assert sorted(appt.customer_name for appt in store.iter_appointments(past, past)) == ['History', 'Old']
+    store.close()
+
+
+def test_slot_booked_elsewhere_during_import_skips_only_that_row(tmp_path, capsys):
+    db_path = str(tmp_path / 'io.db')
+    store = AppointmentStore(db_path)
+    day = weekday(30)
+    path = tmp_path / 'in.csv'
+    write_rows(path, [(f'Customer {n}', f'416-555-01{n:02d}', 'Oil change', day, time)
+                      for n, time in enumerate(['08:00 AM', '09:00 AM', '10:00 AM'])])
+
+    add_appointments = store.add_appointments
+
+    def booked_elsewhere_first(rows):
+        # Another workstation takes 9:00 after the rows were checked against the SlotIndex
+        if len(rows) > 1:
+            other = AppointmentStore(db_path)
+            other.add_appointment('Walk-in', '905-555-0000', 'Tires', day, 540)
+            other.close()
+        return add_appointments(rows)
+
+    store.add_appointments = booked_elsewhere_first
+    assert import_file(store, str(path), 'csv') == (2, 1)
+    assert 'line 3' in capsys.readouterr().err
+    names = sorted(appt.customer_name for appt in store.iter_appointments(day, day))
+    assert names == ['Customer 0', 'Customer 2', 'Walk-in']
+    store.close()
+
+
+def test_export_includes_archived_months(tmp_path):
+    store = AppointmentStore(str(tmp_path / 'io.db'))
+    old, recent = weekday(-120), weekday(-1)
+    store.add_appointments([('Archived', '416-555-0100', 'Oil change', old, 540),
+                            ('Hot', '416-555-0101', 'Brakes', recent, 600)])
+    while store.archive_old_appointments(weekday(-30)):
+        pass
+    assert store.archive_months()
+
+    for file_format in ('csv', 'ics'):
+        path = str(tmp_path / f'out.{file_format}')
+        assert export_file(store, path, file_format, old, recent) == 2
+    with open(tmp_path / 'out.csv', newline='') as f:
+        assert [row['customer_name'] for row in csv.DictReader(f)] == ['Archived', 'Hot']
+    assert export_file(store, str(tmp_path / 'old.csv'), 'csv', old, old) == 1
+    store.close()
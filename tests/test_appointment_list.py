@@ -0,0 +1,135 @@
+"""VirtualAppointmentList against an in-memory stand-in for the Treeview.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import Appointment, AppointmentStore  # noqa: E402
+from taskmanager import VirtualAppointmentList, list_values  # noqa: E402
+
+
+class FakeTree:
+    """The part of ttk.Treeview VirtualAppointmentList uses, without a display"""
+
+    def __init__(self):
+        self.order = []
+        self.values = {}
+
+    def configure(self, **options):
+        pass
+
+    def after_idle(self, fn):
+        fn()
+
+    def insert(self, parent, index, iid, values):
+        self.order.insert(len(self.order) if index == 'end' else index, iid)
+        self.values[iid] = tuple(values)
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.order.remove(iid)
+            del self.values[iid]
+
+    def index(self, iid):
+        return self.order.index(iid)
+
+    def item(self, iid, values):
+        self.values[iid] = tuple(values)
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def get_children(self):
+        return tuple(self.order)
+
+
+def appointment(appointment_id, name, date='2026-03-02', start=540):
+    return Appointment(appointment_id, name, '416-555-0199', 'Oil change', date, start, 1, None, start + 60)
+
+
+def test_upsert_updates_a_search_result_in_place():
+    tree = FakeTree()
+    view = VirtualAppointmentList(tree, store=None)
+    results = [appointment(7, 'Ada'), appointment(3, 'Grace', '2026-01-05'), appointment(9, 'Linus')]
+    view.show_results(results)
+
+    edited = results[1]._replace(customer_name='Grace Hopper', appointment_date='2026-04-01')
+    view.upsert(edited)
+
+    assert tree.get_children() == ('7', '3', '9')
+    assert tree.values['3'] == tuple(list_values(edited))
+    assert view.rows['3'][1] == edited
+
+
+def test_upsert_while_searching_ignores_rows_not_shown():
+    tree = FakeTree()
+    view = VirtualAppointmentList(tree, store=None)
+    view.show_results([appointment(7, 'Ada')])
+
+    view.upsert(appointment(8, 'New booking'))
+
+    assert tree.get_children() == ('7',)
+
+
+class DeferredDB:
+    """run_db stand-in that holds jobs until run() is called, as if the database thread were busy"""
+
+    def __init__(self, store):
+        self.store = store
+        self.jobs = []
+
+    def __call__(self, fn, *args, then):
+        self.jobs.append((fn, args, then))
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args, then in jobs:
+            then(fn(self.store, *args))
+
+
+def filled_store(tmp_path, count):
+    store = AppointmentStore(str(tmp_path / 'list.db'))
+    store.add_appointments((f'Customer {n}', '416-555-0199', 'Oil change', f'2020-01-{n % 28 + 1:02d}',
+                            480 + n % 10 * 60) for n in range(count))
+    return store
+
+
+def test_pages_load_through_run_db(tmp_path):
+    store = filled_store(tmp_path, 25)
+    db = DeferredDB(store)
+    tree = FakeTree()
+    view = VirtualAppointmentList(tree, store, page_size=10, run_db=db)
+
+    view.reload()
+    assert tree.get_children() == ()  # nothing read on the Tk thread
+    db.run()
+    assert len(tree.get_children()) == 10
+
+    # Scrolled near the bottom twice while the next page is loading
+    view._on_yscroll('0.5', '0.95')
+    view._on_yscroll('0.6', '1.0')
+    assert len(db.jobs) == 1
+    db.run()
+    view._on_yscroll('0.7', '1.0')
+    db.run()
+    assert len(tree.get_children()) == 25 and view.exhausted
+    assert [view.rows[iid][0] for iid in tree.get_children()] == sorted(view.keys)
+    store.close()
+
+
+def test_reload_overtaken_by_search_is_dropped(tmp_path):
+    store = filled_store(tmp_path, 5)
+    db = DeferredDB(store)
+    tree = FakeTree()
+    view = VirtualAppointmentList(tree, store, run_db=db)
+
+    view.reload()
+    view.show_results([appointment(99, 'Found')])
+    db.run()
+
+    assert tree.get_children() == ('99',) and not view.paging
+    store.close()
@@ -0,0 +1,55 @@
+"""normalise_phone edge cases and CustomerIndex lookups.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from customer_index import CustomerIndex, normalise_phone  # noqa: E402
+
+
+@pytest.mark.parametrize('typed', [
+    '4165550199', '(416) 555-0199', '416.555.0199', '1-416-555-0199', '+1 416 555 0199',
+    '011 1 416 555 0199', '416-555-0199 x12', '416 555 0199 ext. 7', '416-555-0199 #3', ' 416 555 0199 ',
+])
+def test_north_american_forms(typed):
+    assert normalise_phone(typed) == '+14165550199'
+
+
+@pytest.mark.parametrize('typed', [
+    '+44 20 7946 0958', '011 44 20 7946 0958', '0044 20 7946 0958', '+44 20 7946 0958 extension 21',
+])
+def test_international_forms(typed):
+    assert normalise_phone(typed) == '+442079460958'
+
+
+def test_trunk_zero_dropped_for_a_non_north_american_shop():
+    assert normalise_phone('020 7946 0958', country_code='44') == '+442079460958'
+    assert normalise_phone('+1 416 555 0199', country_code='44') == '+14165550199'
+
+
+@pytest.mark.parametrize('typed', [
+    None, '', 'call me', '555-0199',  # too short
+    '416-555-01999',  # too long
+    '123-555-0199', '016-555-0199',  # area codes never start with 0 or 1
+    '+0 416 555 0199', '+1234567890123456',
+])
+def test_not_a_phone(typed):
+    assert normalise_phone(typed) is None
+
+
+def test_customer_index_lookup_as_typed():
+    customers = CustomerIndex([(1, 'Ada Lovelace', '(416) 555-0199'), (2, 'Not a phone', 'n/a'),
+                               (None, 'Unsaved', '416-555-0100')])
+
+    assert len(customers) == 1
+    assert customers.lookup('+1 416 555 0199') == (1, 'Ada Lovelace')
+    assert customers.lookup('416-555-0100') is None
+    assert customers.lookup('') is None
+
+    customers.add(1, 'Ada King', '416.555.0199')
+    assert customers.lookup('4165550199') == (1, 'Ada King')
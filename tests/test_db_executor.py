@@ -0,0 +1,116 @@
+"""DBExecutor write batching and failure fan-out.
+
+Each test holds the executor's thread on a read job until every write is
+queued, so the writes are taken from the queue together.
+
+    python -m pytest tests
+"""
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import AppointmentStore  # noqa: E402
+from db_executor import DBExecutor  # noqa: E402
+
+TIMEOUT = 10
+
+
+class CountingStore(AppointmentStore):
+    """AppointmentStore that counts its outermost transactions"""
+
+    begun = 0
+
+    @contextmanager
+    def transaction(self):
+        if self._transaction_depth == 0:
+            self.begun += 1
+        with super().transaction():
+            yield
+
+
+class LockedStore:
+    """Store whose outermost transaction fails to commit once commit_fails is set"""
+
+    def __init__(self):
+        self.depth = 0
+        self.commit_fails = False
+
+    @contextmanager
+    def transaction(self):
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+        if self.depth == 0 and self.commit_fails:
+            raise sqlite3.OperationalError('database is locked')
+
+    def close(self):
+        pass
+
+
+def held(executor):
+    """Event that lets the executor's thread go on once set"""
+    gate = threading.Event()
+    executor.submit(lambda store: gate.wait(TIMEOUT))
+    return gate
+
+
+def book(store, name, time):
+    return store.add_appointment(name, '416-555-0199', 'Oil change', '2026-03-02', time)
+
+
+def fails_after_booking(store):
+    book(store, 'Rolled back', 600)
+    raise ValueError('bad row')
+
+
+def test_queued_writes_share_one_transaction(tmp_path):
+    opened = []
+
+    def open_store():
+        opened.append(CountingStore(str(tmp_path / 'batch.db')))
+        return opened[0]
+
+    executor = DBExecutor(open_store)
+    gate = held(executor)
+    first = executor.submit(book, 'Ada', 480, write=True)
+    failing = executor.submit(fails_after_booking, write=True)
+    second = executor.submit(book, 'Grace', 540, write=True)
+    names = executor.submit(lambda store: [a.customer_name for a in store.iter_appointments()])
+    gate.set()
+
+    assert first.result(TIMEOUT) and second.result(TIMEOUT)
+    with pytest.raises(ValueError):
+        failing.result(TIMEOUT)
+    # The failed write's booking was rolled back to its savepoint, the others kept
+    assert names.result(TIMEOUT) == ['Ada', 'Grace']
+    executor.shutdown()
+    assert opened[0].begun == 1
+
+
+def test_failed_commit_fails_every_write_in_the_batch():
+    store = LockedStore()
+    executor = DBExecutor(lambda: store)
+    gate = held(executor)
+
+    def lock(store):
+        store.commit_fails = True
+        return 'written'
+
+    writes = [executor.submit(lock, write=True), executor.submit(lambda store: 'also written', write=True)]
+    after = executor.submit(lambda store: store.depth)
+    gate.set()
+
+    for future in writes:
+        with pytest.raises(sqlite3.OperationalError):
+            future.result(TIMEOUT)
+    # The read queued behind the batch still runs
+    assert after.result(TIMEOUT) == 0
+    executor.shutdown()
@@ -0,0 +1,84 @@
+"""Opening a database written by the original single-file app migrates it to the current schema.
+
+    python -m pytest tests
+"""
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import SCHEMA_VERSION, AppointmentStore  # noqa: E402
+
+# The tables as the original app created them, with times stored as text
+BASELINE_SCHEMA = '''
+    CREATE TABLE appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_name TEXT NOT NULL,
+        phone_number TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        appointment_date TEXT NOT NULL,
+        appointment_time TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE repair_reasons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reason TEXT UNIQUE NOT NULL
+    );
+'''
+
+BASELINE_ROWS = [
+    ('Ada Lovelace', '(416) 555-0199', 'Brake pads', '2020-03-02', '01:00 PM'),
+    ('Grace Hopper', '416.555.0123', 'Oil change', '2020-03-02', '08:00 AM'),
+    # The original app allowed double bookings; history keeps them
+    ('Linus Pauling', '+1 416 555 0123', 'Oil change', '2020-03-02', '08:00 AM'),
+    ('Alan Turing', '905-555-0100', 'Winter tires', '2020-03-03', 'noonish'),
+]
+
+
+def baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO appointments (customer_name, phone_number, reason, appointment_date, '
+                     'appointment_time) VALUES (?, ?, ?, ?, ?)', BASELINE_ROWS)
+    conn.execute("INSERT INTO repair_reasons (reason) VALUES ('Timing belt')")
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_migrated(tmp_path, caplog):
+    path = str(tmp_path / 'mechanic_appointments.db')
+    baseline_db(path)
+
+    with caplog.at_level(logging.WARNING):
+        store = AppointmentStore(path)
+    try:
+        assert SCHEMA_VERSION == 10
+        assert store.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert 'noonish' in caplog.text
+
+        rows = {appt.customer_name: appt for appt in store.iter_appointments()}
+        assert len(rows) == 4
+        assert (rows['Ada Lovelace'].start_minute, rows['Ada Lovelace'].end_minute) == (780, 840)
+        assert (rows['Grace Hopper'].start_minute, rows['Linus Pauling'].start_minute) == (480, 480)
+        assert (rows['Alan Turing'].start_minute, rows['Alan Turing'].end_minute) == (0, 60)
+        assert {appt.bay_id for appt in rows.values()} == {store.bays[0].id}
+        assert ('Timing belt', 0) in store.reason_counts()
+
+        # The search index was built from the old rows, phone tails included
+        assert [appt.customer_name for appt in store.search('555-0199')] == ['Ada Lovelace']
+        assert [appt.customer_name for appt in store.search('hopper')] == ['Grace Hopper']
+
+        # Old rows are linked to customers afterwards, one per phone however it was typed
+        assert store.link_customers() == 4
+        rows = {appt.customer_name: appt for appt in store.iter_appointments()}
+        assert rows['Grace Hopper'].customer_id == rows['Linus Pauling'].customer_id
+        assert rows['Ada Lovelace'].customer_id != rows['Grace Hopper'].customer_id
+    finally:
+        store.close()
+
+    # Opening it again finds nothing left to do
+    store = AppointmentStore(path)
+    assert len(list(store.iter_appointments())) == 4
+    store.close()
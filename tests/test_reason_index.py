@@ -0,0 +1,62 @@
+"""ReasonIndex prefix, word and fuzzy suggestions.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reason_index  # noqa: E402
+from reason_index import ReasonIndex  # noqa: E402
+
+COUNTS = [('Brake pads', 40), ('Brake fluid flush', 12), ('brake  PADS ', 2), ('Front brake rotors', 30),
+          ('Oil change', 90), ('Winter tires', 25), ('Tire rotation', 20), ('', 5)]
+
+
+def test_reasons_are_merged_case_and_space_insensitively():
+    index = ReasonIndex(COUNTS)
+
+    assert len(index) == 6
+    assert index.suggest('BRAKE P') == ['Brake pads']
+    assert index.count['brake pads'] == 42
+
+
+def test_prefix_matches_come_before_word_matches():
+    index = ReasonIndex(COUNTS)
+
+    # Front brake rotors is used more than Brake fluid flush but only has brake as its second word
+    assert index.suggest('brake') == ['Brake pads', 'Brake fluid flush', 'Front brake rotors']
+    assert index.suggest('ro') == ['Front brake rotors', 'Tire rotation']
+    assert index.suggest('ti rot') == ['Tire rotation']
+    assert index.suggest('brake', limit=1) == ['Brake pads']
+
+
+def test_nothing_typed_shows_the_most_used():
+    index = ReasonIndex(COUNTS)
+
+    assert index.suggest('', limit=3) == ['Oil change', 'Brake pads', 'Front brake rotors']
+
+
+def test_typo_in_the_last_word_is_forgiven():
+    index = ReasonIndex(COUNTS)
+
+    assert index.suggest('wintr') == ['Winter tires']
+    assert index.suggest('front braek') == ['Front brake rotors']
+    assert index.suggest('oul') == []  # too far from oil
+    assert index.suggest('xq') == []
+
+
+def test_add_updates_suggestions_and_top(monkeypatch):
+    monkeypatch.setattr(reason_index, 'SUGGESTIONS', 2)
+    index = ReasonIndex(COUNTS)
+    assert index.top == ['oil change', 'brake pads']
+
+    index.add('Timing belt', 100)
+    index.add('  timing BELT')
+    assert index.top == ['timing belt', 'oil change']
+    assert index.suggest('', limit=2) == ['Timing belt', 'Oil change']
+    assert index.suggest('belt') == ['Timing belt']
+    assert index.count['timing belt'] == 101
+    index.add('   ')
+    assert len(index) == 7
@@ -0,0 +1,92 @@
+"""Intervals and SlotIndex over an in-memory week loader.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slot_index import Intervals, SlotIndex  # noqa: E402
+
+MONDAY = '2026-03-02'
+SUNDAY = '2026-03-08'
+SLOTS = range(480, 1140, 60)  # 8:00 to 18:00, closing at 19:00
+
+
+def index(bookings, bays=2):
+    """SlotIndex over bookings, a list of (date, start, end, bay); remembers which weeks were loaded"""
+    loaded = []
+
+    def load_week(week_start):
+        loaded.append(week_start)
+        return bookings
+
+    slot_index = SlotIndex(SLOTS, load_week, bays=bays)
+    slot_index.loaded = loaded
+    return slot_index
+
+
+def test_intervals_overlap_uses_the_furthest_reach():
+    intervals = Intervals([(600, 660), (480, 720)])
+    intervals.add(900, 960)
+
+    assert intervals.overlaps(690, 750)  # only the long 8:00 job reaches past 11:30
+    assert not intervals.overlaps(720, 900)  # touching ends are not overlaps
+    assert intervals.overlaps(930, 990)
+    assert len(intervals) == 3
+
+
+def test_intervals_gaps():
+    intervals = Intervals([(540, 600), (570, 630), (900, 960)])
+
+    assert list(intervals.gaps(480, 1140)) == [(480, 540), (630, 900), (960, 1140)]
+    assert list(Intervals().gaps(480, 1140)) == [(480, 1140)]
+    assert list(Intervals([(420, 1200)]).gaps(480, 1140)) == []
+
+
+def test_is_free_and_free_bay():
+    slot_index = index([(MONDAY, 540, 600, 0), (MONDAY, 540, 660, 1)])
+
+    assert slot_index.is_free(MONDAY, 600, 660, bay=0)
+    assert not slot_index.is_free(MONDAY, 600, 660, bay=1)
+    assert not slot_index.is_free(MONDAY, 570, 630)
+    assert slot_index.free_bay(MONDAY, 600, 660) == 0
+    assert slot_index.free_bay(MONDAY, 660, 720) == 0
+    assert slot_index.free_bay(MONDAY, 570, 600) is None
+    assert slot_index.loaded == ['2026-03-02']  # the week is read once
+
+
+def test_bookings_without_a_bay_take_the_first_free():
+    slot_index = index([(MONDAY, 540, 600, None), (MONDAY, 540, 600, None)])
+
+    assert slot_index.gaps(MONDAY, 0) == [(480, 540), (600, 1140)]
+    assert slot_index.gaps(MONDAY, 1) == [(480, 540), (600, 1140)]
+    assert slot_index.free_bay(MONDAY, 540, 600) is None
+
+
+def test_occupy_then_gaps():
+    slot_index = index([])
+
+    assert slot_index.occupy(MONDAY, 480, 540)
+    assert slot_index.occupy(MONDAY, 480, 540)  # goes to the second bay
+    assert not slot_index.occupy(MONDAY, 510, 570)
+    assert not slot_index.occupy(MONDAY, 480, 600, bay=0)
+    assert slot_index.gaps(MONDAY, 1) == [(540, 1140)]
+
+
+def test_sundays_and_unreadable_dates():
+    slot_index = index([])
+
+    assert slot_index.is_free(SUNDAY, 540, 600)
+    assert slot_index.free_bay(SUNDAY, 540, 600) is None
+    assert slot_index.gaps(SUNDAY, 0) == []
+    assert slot_index.free_bay('2026-3-2', 540, 600) is None
+    assert slot_index.loaded == []
+
+
+def test_next_free_skips_sundays_and_earliest():
+    slot_index = index([], bays=1)
+
+    found = slot_index.next_free('2026-03-07', 3, earliest=1020)
+    assert found == [('2026-03-07', 1020, 0), ('2026-03-07', 1080, 0), ('2026-03-09', 480, 0)]
@@ -0,0 +1,100 @@
+"""WeekCache eviction, invalidation and patching with a submit that runs loads inline.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appointment_store import Appointment  # noqa: E402
+from week_cache import WeekCache, neighbour_weeks, week_start_for  # noqa: E402
+
+WEEKS = ['2026-03-02', '2026-03-09', '2026-03-16', '2026-03-23']
+
+
+class Loads:
+    """load_week and submit for a WeekCache; submit holds jobs until run() if deferred"""
+
+    def __init__(self, deferred=False):
+        self.deferred = deferred
+        self.weeks = []
+        self.pending = []
+
+    def load_week(self, week_start):
+        self.weeks.append(week_start)
+        return {}
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.pending.append((future, fn, args))
+        if not self.deferred:
+            self.run()
+        return future
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for future, fn, args in pending:
+            future.set_result(fn(*args))
+
+
+def test_week_helpers():
+    assert week_start_for('2026-03-08') == '2026-03-02'  # Sunday belongs to the week before
+    assert neighbour_weeks('2026-03-09', radius=2) == ['2026-03-16', '2026-03-02', '2026-03-23', '2026-02-23']
+
+
+def test_least_recently_used_week_is_evicted():
+    loads = Loads()
+    cache = WeekCache(loads.load_week, loads.submit, capacity=2)
+    cache.load(WEEKS[0])
+    cache.load(WEEKS[1])
+    assert cache.lookup(WEEKS[0]) == {}  # now the most recently used
+
+    cache.load(WEEKS[2])
+
+    assert list(cache.weeks) == [WEEKS[0], WEEKS[2]]
+    assert cache.lookup(WEEKS[1]) is None
+    assert cache.stats()['evictions'] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_a_week_is_loaded_once_while_in_flight():
+    loads = Loads(deferred=True)
+    cache = WeekCache(loads.load_week, loads.submit)
+    first = cache.load(WEEKS[0])
+    cache.prefetch([WEEKS[0], WEEKS[1]])
+    assert cache.load(WEEKS[0]) is first
+
+    loads.run()
+    cache.load(WEEKS[0])
+
+    assert loads.weeks == [WEEKS[0], WEEKS[1]]
+    assert cache.stats()['prefetched'] == 1
+
+
+def test_invalidate_range_drops_overlapping_weeks():
+    loads = Loads()
+    cache = WeekCache(loads.load_week, loads.submit)
+    cache.prefetch(WEEKS)
+
+    # From a Sunday, so the week it belongs to goes too; the range ends on a Monday
+    cache.invalidate_range('2026-03-08', '2026-03-16')
+
+    assert list(cache.weeks) == [WEEKS[3]]
+    cache.invalidate_all()
+    assert not cache.weeks
+
+
+def test_apply_patches_cached_weeks():
+    loads = Loads()
+    cache = WeekCache(loads.load_week, loads.submit)
+    cache.load(WEEKS[0])
+    booked = Appointment(1, 'Ada', '416-555-0199', 'Oil change', '2026-03-03', 540, 1, None, 600)
+    moved = booked._replace(appointment_date='2026-03-10')
+
+    assert cache.apply(new=booked) == [WEEKS[0]]
+    assert cache.peek(WEEKS[0]) == {1: booked}
+    assert cache.apply(booked, moved) == [WEEKS[0], WEEKS[1]]
+    assert cache.peek(WEEKS[0]) == {} and cache.peek(WEEKS[1]) is None
+    assert cache.apply(new=moved._replace(appointment_date='soon')) == []
@@ -0,0 +1,144 @@
+"""LRU cache of weekly appointment snapshots with background prefetch."""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date as Date, timedelta
+
+
+def week_start_for(date_str):
+    """Monday of the week containing date_str, as YYYY-MM-DD"""
+    day = Date.fromisoformat(date_str)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def neighbour_weeks(week_start, radius=1):
+    """Week starts within radius weeks of week_start, nearest first"""
+    start = Date.fromisoformat(week_start)
+    weeks = []
+    for distance in range(1, radius + 1):
+        weeks.append((start + timedelta(days=7 * distance)).isoformat())
+        weeks.append((start - timedelta(days=7 * distance)).isoformat())
+    return weeks
+
+
+class WeekCache:
+    """Week start (YYYY-MM-DD) -> {appointment id: appointment}, least recently used evicted first
+
+    Weeks are loaded with submit(load_week, week_start), which must return
+    a concurrent.futures.Future; DBExecutor.submit fits. Loads and writes
+    run in submission order on the executor's one thread, so a loaded
+    snapshot already includes every write submitted before it.
+    """
+
+    def __init__(self, load_week, submit, capacity=16):
+        self.load_week = load_week
+        self.submit = submit
+        self.capacity = capacity
+        self.weeks = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evictions = 0
+        self._loading = {}
+
+    def _store(self, week_start, snapshot):
+        self.weeks[week_start] = snapshot
+        self.weeks.move_to_end(week_start)
+        while len(self.weeks) > self.capacity:
+            self.weeks.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, week_start):
+        """Cached snapshot for week_start or None, counting a hit or miss"""
+        with self.lock:
+            snapshot = self.weeks.get(week_start)
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.weeks.move_to_end(week_start)
+                self.hits += 1
+            return snapshot
+
+    def peek(self, week_start):
+        """Cached snapshot for week_start or None, without counting a hit or miss"""
+        with self.lock:
+            return self.weeks.get(week_start)
+
+    def load(self, week_start, prefetch=False):
+        """Future for week_start's snapshot, cached once it is loaded"""
+        with self.lock:
+            snapshot = self.weeks.get(week_start)
+            if snapshot is not None:
+                future = Future()
+                future.set_result(snapshot)
+                return future
+            if week_start in self._loading:
+                return self._loading[week_start]
+            future = self.submit(self.load_week, week_start)
+            self._loading[week_start] = future
+
+        def loaded(done):
+            with self.lock:
+                self._loading.pop(week_start, None)
+                if done.cancelled() or done.exception() is not None:
+                    return
+                if week_start not in self.weeks:
+                    self._store(week_start, done.result())
+                    if prefetch:
+                        self.prefetched += 1
+
+        future.add_done_callback(loaded)
+        return future
+
+    def prefetch(self, week_starts):
+        """Start loading any of week_starts that are not cached"""
+        for week_start in week_starts:
+            self.load(week_start, prefetch=True)
+
+    def apply(self, old=None, new=None):
+        """Patch cached snapshots for an appointment that was added, changed or deleted
+
+        Returns the week starts of old and new, so the caller knows which
+        weeks to repaint. Appointments with an unreadable date are skipped.
+        """
+        touched = []
+        with self.lock:
+            for appt, keep in ((old, False), (new, True)):
+                if appt is None:
+                    continue
+                try:
+                    week_start = week_start_for(appt.appointment_date)
+                except ValueError:
+                    continue
+                touched.append(week_start)
+                snapshot = self.weeks.get(week_start)
+                if snapshot is not None:
+                    snapshot.pop(appt.id, None)
+                    if keep:
+                        snapshot[appt.id] = appt
+        return touched
+
+    def invalidate_range(self, start_date, end_date):
+        """Drop cached weeks overlapping start_date..end_date (inclusive)"""
+        first = week_start_for(start_date)
+        with self.lock:
+            for week_start in [w for w in self.weeks if first <= w <= end_date]:
+                del self.weeks[week_start]
+
+    def invalidate_all(self):
+        with self.lock:
+            self.weeks.clear()
+
+    def stats(self):
+        """Counters for a debug panel"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'prefetched': self.prefetched,
+                'evictions': self.evictions,
+                'cached_weeks': len(self.weeks),
+            }